@@ -1,5 +1,6 @@
-import keyboard
-from langchain.memory import ConversationBufferMemory
+from contextlib import nullcontext
+from typing import Optional
+
 from langchain_community.vectorstores import FAISS
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, GoogleGenerativeAI
 from langchain.chains import RetrievalQA,ConversationalRetrievalChain
@@ -7,24 +8,12 @@ from langchain.prompts import PromptTemplate
 from langchain_huggingface import HuggingFaceEmbeddings
 
 from GetApikey import loadapi
+from embedding_batcher import get_shared_batcher
+from rolling_memory import RollingSummaryMemory
+from tracing import Tracer
 
-API_KEY=loadapi()
-
-# Embeddings Google
-embeddings = HuggingFaceEmbeddings(model_name="intfloat/multilingual-e5-large-instruct")
-
-# Load FAISS database đã lưu
-db = FAISS.load_local("vector_db2chunk_nltk", embeddings, allow_dangerous_deserialization=True)
-
-# Tạo retriever từ FAISS
-retriever = db.as_retriever(search_kwargs={"k": 5})
-
-# LLM Google Gemini (text-only)
-llm = GoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=API_KEY,
-    temperature=0.5
-)
+KNOWLEDGE_DB = "vector_db2chunk_nltk"
+TRACE_PATH = "outputs/rag_traces.jsonl"
 
 # Prompt cho RAG
 prompt_template = """
@@ -43,34 +32,74 @@ prompt = PromptTemplate(
     input_variables=["context", "question"]
 )
 
-# Memory lưu lịch sử hội thoại
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    return_messages=True
-)
-
-
-# Tạo RetrievalQA chain
-qa_chain = ConversationalRetrievalChain.from_llm(
-    llm=llm,
-    retriever=retriever,
-    memory=memory,
-    combine_docs_chain_kwargs={"prompt": prompt}
-)
-
-# Vòng lặp chat
-print("💬 Chat với Java RAG Bot (gõ 'exit' để thoát)\n")
-while True:
-    query = input("❓Bạn: ")
-    if query.lower() in ["exit", "quit"]:
-        print("👋 Kết thúc chat.")
-        break
-    # exit khi nhấn 'Esc'
-    if keyboard.is_pressed('esc'):
-        print("👋 Kết thúc chat.")
-        break
-
-    result = qa_chain.invoke({"question": query})
-    print("🤖 Bot:", result["answer"])
-
 
+def load_db(db_path: str = KNOWLEDGE_DB):
+    """Load FAISS database đã lưu (embedding qua batcher dùng chung để gom các truy vấn đồng thời)"""
+    embeddings = get_shared_batcher(HuggingFaceEmbeddings(model_name="intfloat/multilingual-e5-large-instruct"))
+    return FAISS.load_local(db_path, embeddings, allow_dangerous_deserialization=True)
+
+
+def build_llm(temperature: float = 0.5):
+    """LLM Google Gemini (text-only)"""
+    return GoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=loadapi(),
+        temperature=temperature
+    )
+
+
+def build_chain(llm, db, k: int = 5):
+    """Tạo ConversationalRetrievalChain với memory giới hạn token"""
+    # Memory lưu lịch sử hội thoại: giới hạn token + tóm tắt dần các lượt cũ,
+    # bỏ qua bước viết lại câu hỏi khi lịch sử trống hoặc câu hỏi tự đủ nghĩa
+    memory = RollingSummaryMemory(
+        llm=llm,
+        memory_key="chat_history",
+        max_token_limit=800,
+        max_summary_tokens=300,
+        skip_condense=True
+    )
+
+    return ConversationalRetrievalChain.from_llm(
+        llm=llm,
+        retriever=db.as_retriever(search_kwargs={"k": k}),
+        memory=memory,
+        combine_docs_chain_kwargs={"prompt": prompt}
+    )
+
+
+def _esc_pressed() -> bool:
+    # keyboard cần quyền root hoặc màn hình; không có thì chỉ thoát bằng 'exit'
+    try:
+        import keyboard
+        return keyboard.is_pressed('esc')
+    except Exception:
+        return False
+
+
+def chat(qa_chain, tracer: Optional[Tracer] = None):
+    """Vòng lặp chat"""
+    # Callback ghi span cho từng lần truy vấn retriever và gọi LLM trong chain
+    config = {"callbacks": [tracer.callback_handler()]} if tracer else {}
+    print("💬 Chat với Java RAG Bot (gõ 'exit' để thoát)\n")
+    while True:
+        query = input("❓Bạn: ")
+        if query.lower() in ["exit", "quit"]:
+            print("👋 Kết thúc chat.")
+            break
+        # exit khi nhấn 'Esc'
+        if _esc_pressed():
+            print("👋 Kết thúc chat.")
+            break
+
+        with tracer.span("rag.turn") if tracer else nullcontext():
+            result = qa_chain.invoke({"question": query}, config=config)
+        print("🤖 Bot:", result["answer"])
+
+    if tracer:
+        tracer.export(TRACE_PATH)
+        print(f"🧭 Trace: {TRACE_PATH}")
+
+
+if __name__ == "__main__":
+    chat(build_chain(build_llm(), load_db()), Tracer("ragtest"))
@@ -0,0 +1,295 @@
+import sys
+import json
+import time
+import math
+import argparse
+from pathlib import Path
+from statistics import NormalDist
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from interview import STATUS_BANDS, interview_status
+from results_store import DEFAULT_DB, ResultsStore
+
+# Phỏng vấn thích ứng: thay vì hỏi cố định 7 câu + câu sáng tạo, chọn câu tiếp theo trong bộ câu hỏi đã tạo
+# theo loại (lần lượt phủ các loại) và độ khó (gần với năng lực ước lượng từ điểm đã có), dừng sớm khi
+# khoảng tin cậy của điểm trung bình nằm gọn trong một mức đánh giá (STATUS_BANDS).
+# Câu sáng tạo vẫn chỉ được hỏi khi điểm trung bình ≥ 8.0 và là câu cuối.
+#   python interview.py --adaptive
+#   python adaptive_interview.py --simulate                  # ước lượng số câu/lời gọi chấm điểm tiết kiệm được
+#   python adaptive_interview.py --simulate --synthetic 5000
+
+CORE_CATEGORIES = ("behavioral", "technical", "cv_based")
+CREATIVE_THRESHOLD = 8.0
+
+
+def status_of(average: float) -> str:
+    return interview_status([average], average)
+
+
+def default_difficulty(pool: Sequence[Dict[str, Any]]) -> List[float]:
+    """Độ khó mặc định (0-1) khi chưa có lịch sử: trong mỗi loại, câu sau khó hơn câu trước (0.3 → 0.7)"""
+    positions: Dict[str, List[int]] = {}
+    for i, question in enumerate(pool):
+        positions.setdefault(question.get("category", ""), []).append(i)
+    difficulty = [0.5] * len(pool)
+    for category, indexes in positions.items():
+        if category == "creative":
+            for i in indexes:
+                difficulty[i] = 0.9
+            continue
+        for rank, i in enumerate(indexes):
+            difficulty[i] = 0.3 + 0.4 * rank / (len(indexes) - 1) if len(indexes) > 1 else 0.5
+    return difficulty
+
+
+def load_difficulty(results_db: str, position: Optional[str] = None, min_answers: int = 5) -> Dict[str, float]:
+    """Độ khó của các câu đã được hỏi đủ min_answers lần: 1 - điểm trung bình / 10"""
+    if not results_db or not Path(results_db).exists():
+        return {}
+    columns = ResultsStore(results_db).answer_columns(("question", "score"), position=position)
+    totals: Dict[str, List[float]] = {}
+    for question, score in zip(columns["question"], columns["score"]):
+        if score is not None:
+            entry = totals.setdefault(question, [0.0, 0])
+            entry[0] += score
+            entry[1] += 1
+    return {q: round(1 - total / count / 10, 3) for q, (total, count) in totals.items() if count >= min_answers}
+
+
+class AdaptivePlanner:
+    """Chọn câu hỏi tiếp theo và quyết định dừng dựa trên điểm đã chấm"""
+
+    def __init__(self, pool: Sequence[Dict[str, Any]], difficulty: Optional[Dict[str, float]] = None,
+                 min_questions: int = 3, confidence: float = 0.9, prior_sd: float = 2.0):
+        self.pool = list(pool)
+        # Độ khó lấy từ lịch sử (theo nội dung câu hỏi) nếu có, không thì theo thứ tự trong loại
+        defaults = default_difficulty(self.pool)
+        difficulty = difficulty or {}
+        self.difficulty = [difficulty.get(q.get("question", ""), d) for q, d in zip(self.pool, defaults)]
+        self.core = [i for i, q in enumerate(self.pool) if q.get("category") != "creative"]
+        self.min_questions = min_questions
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+        # Độ lệch chuẩn tiên nghiệm (tính như 1 câu trả lời) để 2-3 điểm giống nhau không làm khoảng tin cậy quá hẹp
+        self.prior_sd = prior_sd
+        self.asked: List[int] = []
+        self.scores: List[Optional[float]] = []
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def answered(self) -> List[float]:
+        return [s for s in self.scores if s is not None]
+
+    @property
+    def average(self) -> float:
+        answered = self.answered
+        return sum(answered) / len(answered) if answered else 0.0
+
+    def interval(self) -> tuple:
+        """Khoảng tin cậy của điểm trung bình nếu hỏi hết bộ câu hỏi (có hiệu chỉnh tổng thể hữu hạn)"""
+        scores = self.answered
+        n = len(scores)
+        if not n:
+            return 0.0, 10.0
+        mean = sum(scores) / n
+        variance = sum((s - mean) ** 2 for s in scores) / (n - 1) if n > 1 else 0.0
+        sd = math.sqrt((self.prior_sd ** 2 + (n - 1) * variance) / n)
+        total = len(self.core)
+        remaining = max(0, total - n)
+        half_width = self.z * sd / math.sqrt(n) * math.sqrt(remaining / (total - 1)) if total > 1 else 0.0
+        return max(0.0, mean - half_width), min(10.0, mean + half_width)
+
+    def settled(self) -> Optional[str]:
+        """Mức đánh giá nếu cả hai đầu khoảng tin cậy thuộc cùng một mức, ngược lại None"""
+        if len(self.answered) < self.min_questions:
+            return None
+        low, high = self.interval()
+        status = status_of(low)
+        return status if status == status_of(high) else None
+
+    def _target_difficulty(self) -> float:
+        # Câu hỏi cho lượng thông tin nhiều nhất khi điểm kỳ vọng gần năng lực hiện tại
+        if self.answered:
+            return 1 - self.average / 10
+        return float(np.median([self.difficulty[i] for i in self.core])) if self.core else 0.5
+
+    def next_question(self) -> Optional[Dict[str, Any]]:
+        """Câu hỏi tiếp theo, hoặc None khi dừng (xem stop_reason)"""
+        if self.stop_reason is not None:
+            return None
+        remaining = [i for i in self.core if i not in self.asked]
+        settled = self.settled()
+        if settled is not None or not remaining:
+            creative = [i for i, q in enumerate(self.pool) if q.get("category") == "creative" and i not in self.asked]
+            if creative and self.answered and self.average >= CREATIVE_THRESHOLD:
+                return self._ask(creative[0])
+            self.stop_reason = "settled" if settled is not None and remaining else "exhausted"
+            return None
+
+        # Loại được hỏi ít nhất (theo tỷ lệ số câu có trong bộ), hòa thì theo thứ tự CORE_CATEGORIES
+        def coverage(category):
+            available = [i for i in self.core if self.pool[i].get("category") == category]
+            asked = sum(1 for i in self.asked if i in available)
+            order = CORE_CATEGORIES.index(category) if category in CORE_CATEGORIES else len(CORE_CATEGORIES)
+            return asked / len(available), order
+
+        category = min({self.pool[i].get("category") for i in remaining}, key=coverage)
+        target = self._target_difficulty()
+        choice = min((i for i in remaining if self.pool[i].get("category") == category),
+                     key=lambda i: (abs(self.difficulty[i] - target), i))
+        return self._ask(choice)
+
+    def _ask(self, index: int) -> Dict[str, Any]:
+        self.asked.append(index)
+        self.scores.append(None)
+        return self.pool[index]
+
+    def record(self, question: Dict[str, Any], score: Optional[float]):
+        """Ghi điểm của câu vừa hỏi (None nếu thí sinh bỏ qua)"""
+        position = next(k for k in range(len(self.asked) - 1, -1, -1) if self.pool[self.asked[k]] is question)
+        self.scores[position] = score
+
+    def ordered_questions(self) -> List[Dict[str, Any]]:
+        """Bộ câu hỏi theo thứ tự: câu đã trả lời (đúng thứ tự hỏi), câu bỏ qua, câu chưa hỏi"""
+        answered = [i for i, s in zip(self.asked, self.scores) if s is not None]
+        skipped = [i for i, s in zip(self.asked, self.scores) if s is None]
+        rest = [i for i in range(len(self.pool)) if i not in self.asked]
+        return [self.pool[i] for i in answered + skipped + rest]
+
+    def summary(self) -> Dict[str, Any]:
+        low, high = self.interval()
+        return {
+            "pool_size": len(self.pool),
+            "asked": len(self.asked),
+            "answered": len(self.answered),
+            "stop_reason": self.stop_reason,
+            "confidence": self.confidence,
+            "interval": [round(low, 2), round(high, 2)],
+            "settled_status": self.settled()
+        }
+
+
+def simulate(sessions: Sequence[Dict[str, Any]], difficulty: Optional[Dict[str, float]] = None,
+             **planner_kwargs) -> Dict[str, Any]:
+    """Phát lại các phiên đã chấm qua AdaptivePlanner (điểm của mỗi câu lấy từ lần chấm đã ghi).
+
+    Mỗi phiên là {"questions": [{"category", "question"}], "scores": [...]}; so sánh số câu đã hỏi và
+    mức đánh giá với khi hỏi hết các câu đã ghi."""
+    full_questions = asked_questions = early = agree = 0
+    by_status: Dict[str, Dict[str, int]] = {}
+    for session in sessions:
+        questions, scores = session["questions"], session["scores"]
+        if not scores:
+            continue
+        planner = AdaptivePlanner(questions, difficulty, **planner_kwargs)
+        while True:
+            question = planner.next_question()
+            if question is None:
+                break
+            planner.record(question, scores[planner.asked[-1]])
+
+        full_status = status_of(sum(scores) / len(scores))
+        adaptive_status = status_of(planner.average)
+        full_questions += len(scores)
+        asked_questions += len(planner.asked)
+        early += planner.stop_reason == "settled"
+        agree += full_status == adaptive_status
+        entry = by_status.setdefault(full_status, {"sessions": 0, "full_questions": 0, "asked": 0, "agree": 0})
+        entry["sessions"] += 1
+        entry["full_questions"] += len(scores)
+        entry["asked"] += len(planner.asked)
+        entry["agree"] += full_status == adaptive_status
+
+    count = sum(e["sessions"] for e in by_status.values())
+    rank = {status: i for i, (_, status) in enumerate(STATUS_BANDS)}
+    return {
+        "sessions": count,
+        "full_questions": full_questions,
+        "asked_questions": asked_questions,
+        # Mỗi câu không hỏi là một lời gọi LLM chấm điểm (và một lượt trả lời) tiết kiệm được
+        "scoring_calls_saved": full_questions - asked_questions,
+        "saved_rate": round(1 - asked_questions / full_questions, 4) if full_questions else 0.0,
+        "early_stop_rate": round(early / count, 4) if count else 0.0,
+        "status_agreement": round(agree / count, 4) if count else 0.0,
+        "by_status": {
+            status: {
+                "sessions": e["sessions"],
+                "avg_full_questions": round(e["full_questions"] / e["sessions"], 2),
+                "avg_asked": round(e["asked"] / e["sessions"], 2),
+                "status_agreement": round(e["agree"] / e["sessions"], 4)
+            }
+            for status, e in sorted(by_status.items(), key=lambda item: rank.get(item[0], len(rank)))
+        }
+    }
+
+
+def sessions_from_cohort(cohort) -> List[Dict[str, Any]]:
+    """Tách Cohort (analytics.py) thành danh sách phiên theo thứ tự câu trả lời đã ghi"""
+    order = np.argsort(cohort.session, kind="stable")
+    bounds = np.cumsum(np.bincount(cohort.session, minlength=cohort.n_sessions))
+    sessions, start = [], 0
+    for end in bounds:
+        rows = order[start:end]
+        start = end
+        sessions.append({
+            "questions": [{"category": cohort.category_labels[cohort.category[r]],
+                           "question": cohort.question_labels[cohort.question[r]]} for r in rows],
+            "scores": [float(cohort.scores[r]) for r in rows]
+        })
+    return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mô phỏng phỏng vấn thích ứng trên điểm đã ghi")
+    parser.add_argument("--simulate", action="store_true", help="Chạy mô phỏng")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Kho kết quả SQLite")
+    parser.add_argument("--files", nargs="+", help="Đọc các file JSON kết quả thay vì kho (chấp nhận glob)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Số phiên giả lập")
+    parser.add_argument("--position")
+    parser.add_argument("--confidence", type=float, default=0.9)
+    parser.add_argument("--min-questions", type=int, default=3)
+    parser.add_argument("--min-answers", type=int, default=5, help="Số lượt trả lời tối thiểu để dùng độ khó lịch sử")
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    if not args.simulate:
+        parser.print_help()
+        return
+
+    from analytics import Cohort, question_difficulty, synthetic_cohort
+    started = time.perf_counter()
+    if args.synthetic:
+        cohort = synthetic_cohort(args.synthetic)
+    elif args.files:
+        paths = [p for pattern in args.files for p in (sorted(Path().glob(pattern)) or [Path(pattern)])]
+        cohort = Cohort.from_files(paths)
+    else:
+        if not Path(args.db).exists():
+            print(f"❌ Không có kho kết quả {args.db} (chạy: python results_store.py migrate)")
+            sys.exit(1)
+        cohort = Cohort.from_store(ResultsStore(args.db), position=args.position)
+    # Độ khó tính trên cùng dữ liệu được phát lại (đủ để so sánh thứ tự câu, không phải ước lượng ngoài mẫu)
+    difficulty = {item["question"]: item["difficulty"]
+                  for item in question_difficulty(cohort, args.min_answers, top=None)}
+    result = simulate(sessions_from_cohort(cohort), difficulty,
+                      min_questions=args.min_questions, confidence=args.confidence)
+    elapsed = time.perf_counter() - started
+
+    print(f"📊 {result['sessions']} phiên, độ tin cậy {args.confidence:.0%} ({elapsed:.2f}s)")
+    print(f"❓ Số câu: {result['asked_questions']}/{result['full_questions']} "
+          f"(bớt {result['scoring_calls_saved']} lời gọi chấm điểm, {result['saved_rate']:.1%})")
+    print(f"⏹️ Dừng sớm: {result['early_stop_rate']:.1%} phiên")
+    print(f"🎯 Cùng mức đánh giá với khi hỏi hết: {result['status_agreement']:.1%}")
+    for status, stats in result["by_status"].items():
+        print(f"  {status:32} {stats['sessions']:>7} phiên  "
+              f"{stats['avg_asked']:.1f}/{stats['avg_full_questions']:.1f} câu  khớp {stats['status_agreement']:.1%}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n💾 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from interview import STATUS_BANDS, FAIL_STATUS
+from results_store import DEFAULT_DB, ResultsStore
+
+# Phân tích theo nhóm (cohort) trên kết quả phỏng vấn: phân bố điểm theo vị trí, loại câu hỏi và từng câu hỏi.
+# Mỗi câu trả lời là 1 phần tử trong các mảng cột NumPy; các phép gom nhóm dùng bincount/lexsort
+# nên 100.000 phiên (~800.000 câu trả lời) xử lý trong vài giây.
+#   python analytics.py                                  # đọc kho results.db
+#   python analytics.py --files "interview_results/*.json" interview_results.json
+#   python analytics.py --synthetic 100000               # đo tốc độ với dữ liệu giả lập
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+def _encode(values: Sequence[Any]) -> tuple:
+    """Mã hóa chuỗi thành số nguyên: (nhãn, mã của từng phần tử)"""
+    # Dùng dict thay vì np.unique: câu hỏi là chuỗi dài, mảng unicode độ rộng cố định tốn hàng trăm MB
+    index: Dict[Any, int] = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=len(values))
+    return ["" if label is None else str(label) for label in index], codes
+
+
+class Cohort:
+    """Các câu trả lời dạng cột: phiên, vị trí, loại câu hỏi, câu hỏi (mã số) và điểm"""
+
+    def __init__(self, session_ids: Sequence[Any], positions: Sequence[Any], categories: Sequence[Any],
+                 questions: Sequence[Any], scores: Sequence[float]):
+        self.scores = np.asarray(scores, dtype=np.float64)
+        _, self.session = np.unique(np.asarray(session_ids), return_inverse=True)
+        self.session = self.session.astype(np.int64)
+        self.position_labels, self.position = _encode(positions)
+        self.category_labels, self.category = _encode(categories)
+        self.question_labels, self.question = _encode(questions)
+
+        # Cấp phiên: điểm trung bình và vị trí của từng phiên
+        self.n_sessions = int(self.session.max()) + 1 if self.session.size else 0
+        answered = np.bincount(self.session, minlength=self.n_sessions)
+        self.session_average = np.bincount(self.session, weights=self.scores, minlength=self.n_sessions) / np.maximum(answered, 1)
+        self.session_position = np.zeros(self.n_sessions, dtype=np.int64)
+        self.session_position[self.session] = self.position
+
+    def __len__(self) -> int:
+        return int(self.scores.size)
+
+    @classmethod
+    def from_store(cls, store: ResultsStore, **filters) -> "Cohort":
+        """Đọc từ kho kết quả (lọc theo candidate, position, since, until, min_score, max_score)"""
+        columns = store.answer_columns(**filters)
+        return cls(columns["session_id"], columns["position"], columns["category"],
+                   columns["question"], columns["score"])
+
+    @classmethod
+    def from_results(cls, results: Sequence[Dict[str, Any]]) -> "Cohort":
+        """Từ các kết quả phỏng vấn theo định dạng export_interview_results (dict đã load)"""
+        session_ids, positions, categories, questions, scores = [], [], [], [], []
+        for i, data in enumerate(results):
+            position = data.get("candidate_info", {}).get("position", "")
+            for qa in data.get("questions_and_answers", []):
+                session_ids.append(i)
+                positions.append(position)
+                categories.append(qa.get("question_category"))
+                questions.append(qa.get("question"))
+                scores.append(qa.get("score", 0.0))
+        return cls(session_ids, positions, categories, questions, scores)
+
+    @classmethod
+    def from_files(cls, paths: Sequence[Path]) -> "Cohort":
+        results = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                results.append(json.load(f))
+        return cls.from_results(results)
+
+
+def grouped_percentiles(groups: np.ndarray, values: np.ndarray, n_groups: int,
+                        percentiles: Sequence[float] = PERCENTILES) -> np.ndarray:
+    """Phân vị của values theo từng nhóm (nội suy tuyến tính như np.percentile), shape (n_groups, len(percentiles))"""
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full((n_groups, len(percentiles)), np.nan)
+    present = counts > 0
+    for j, p in enumerate(percentiles):
+        rank = (counts[present] - 1) * (p / 100.0)
+        lower = np.floor(rank).astype(np.int64)
+        upper = np.minimum(lower + 1, counts[present] - 1)
+        fraction = rank - lower
+        base = starts[present]
+        result[present, j] = (sorted_values[base + lower] * (1 - fraction)
+                              + sorted_values[base + upper] * fraction)
+    return result
+
+
+def _group_stats(groups: np.ndarray, values: np.ndarray, labels: List[str]) -> Dict[str, Dict[str, Any]]:
+    n = len(labels)
+    counts = np.bincount(groups, minlength=n)
+    sums = np.bincount(groups, weights=values, minlength=n)
+    squares = np.bincount(groups, weights=values * values, minlength=n)
+    means = sums / np.maximum(counts, 1)
+    stds = np.sqrt(np.maximum(squares / np.maximum(counts, 1) - means * means, 0))
+    quantiles = grouped_percentiles(groups, values, n)
+    stats = {}
+    for i, label in enumerate(labels):
+        if not counts[i]:
+            continue
+        stats[label] = {
+            "count": int(counts[i]),
+            "mean": round(float(means[i]), 3),
+            "std": round(float(stds[i]), 3),
+            **{f"p{p}": round(float(quantiles[i, j]), 3) for j, p in enumerate(PERCENTILES)}
+        }
+    return stats
+
+
+def category_stats(cohort: Cohort, by_position: bool = False) -> Dict[str, Any]:
+    """Điểm trung bình, độ lệch chuẩn và phân vị theo loại câu hỏi (tùy chọn: tách theo vị trí)"""
+    if not by_position:
+        return _group_stats(cohort.category, cohort.scores, cohort.category_labels)
+    n_categories = len(cohort.category_labels)
+    combined = cohort.position * n_categories + cohort.category
+    labels = [f"{p}|{c}" for p in cohort.position_labels for c in cohort.category_labels]
+    result: Dict[str, Dict[str, Any]] = {}
+    for key, stats in _group_stats(combined, cohort.scores, labels).items():
+        position, category = key.split("|", 1)
+        result.setdefault(position or "-", {})[category] = stats
+    return result
+
+
+def status_bands(averages: np.ndarray) -> np.ndarray:
+    """Chỉ số mức đánh giá (0 = cao nhất, len(STATUS_BANDS) = FAIL_STATUS) cho từng điểm trung bình"""
+    thresholds = np.array([threshold for threshold, _ in STATUS_BANDS])
+    # Số ngưỡng mà điểm chưa đạt tới = chỉ số mức trong STATUS_BANDS
+    return (averages[:, None] < thresholds[None, :]).sum(axis=1)
+
+
+def pass_rates(cohort: Cohort, pass_threshold: float = 6.0) -> Dict[str, Any]:
+    """Tỷ lệ phiên rơi vào từng mức của interview_status, tổng và theo vị trí"""
+    names = [status for _, status in STATUS_BANDS] + [FAIL_STATUS]
+    bands = status_bands(cohort.session_average)
+    passed = cohort.session_average >= pass_threshold
+
+    def rates(mask: np.ndarray) -> Dict[str, Any]:
+        total = int(mask.sum())
+        counts = np.bincount(bands[mask], minlength=len(names))
+        return {
+            "sessions": total,
+            "pass_rate": round(float(passed[mask].mean()), 4) if total else None,
+            "bands": {name: round(float(c / total), 4) if total else 0.0 for name, c in zip(names, counts)}
+        }
+
+    everyone = np.ones(cohort.n_sessions, dtype=bool)
+    return {
+        "overall": rates(everyone),
+        "by_position": {(label or "-"): rates(cohort.session_position == i)
+                        for i, label in enumerate(cohort.position_labels)
+                        if (cohort.session_position == i).any()}
+    }
+
+
+def question_difficulty(cohort: Cohort, min_answers: int = 5, top: Optional[int] = 20) -> List[Dict[str, Any]]:
+    """Câu hỏi khó nhất: điểm trung bình thấp, tỷ lệ dưới 4 điểm cao (chỉ tính câu có đủ min_answers lượt)"""
+    n = len(cohort.question_labels)
+    counts = np.bincount(cohort.question, minlength=n)
+    means = np.bincount(cohort.question, weights=cohort.scores, minlength=n) / np.maximum(counts, 1)
+    low = np.bincount(cohort.question, weights=(cohort.scores < STATUS_BANDS[-1][0]).astype(np.float64),
+                      minlength=n) / np.maximum(counts, 1)
+    # Loại câu hỏi của mỗi câu (lấy từ lần xuất hiện cuối, một câu hỏi thuộc một loại)
+    question_category = np.zeros(n, dtype=np.int64)
+    question_category[cohort.question] = cohort.category
+
+    eligible = np.flatnonzero(counts >= min_answers)
+    ranked = eligible[np.argsort(means[eligible], kind="stable")]
+    if top:
+        ranked = ranked[:top]
+    return [{
+        "question": cohort.question_labels[i],
+        "category": cohort.category_labels[question_category[i]],
+        "answers": int(counts[i]),
+        "mean_score": round(float(means[i]), 3),
+        "difficulty": round(1 - float(means[i]) / 10, 3),
+        "low_score_rate": round(float(low[i]), 4)
+    } for i in ranked]
+
+
+def report(cohort: Cohort, min_answers: int = 5, top: int = 20) -> Dict[str, Any]:
+    return {
+        "sessions": cohort.n_sessions,
+        "answers": len(cohort),
+        "mean_score": round(float(cohort.scores.mean()), 3) if len(cohort) else None,
+        "categories": category_stats(cohort),
+        "categories_by_position": category_stats(cohort, by_position=True),
+        "pass_rates": pass_rates(cohort),
+        "hardest_questions": question_difficulty(cohort, min_answers, top)
+    }
+
+
+def synthetic_cohort(sessions: int, seed: int = 0) -> Cohort:
+    """Dữ liệu giả lập để đo tốc độ: 8 câu mỗi phiên, 3 vị trí, 200 câu hỏi"""
+    rng = np.random.default_rng(seed)
+    categories = np.array(["behavioral"] * 2 + ["technical"] * 3 + ["cv_based"] * 2 + ["creative"])
+    session_ids = np.repeat(np.arange(sessions), len(categories))
+    ability = rng.normal(6.5, 1.5, sessions)
+    scores = np.clip(np.repeat(ability, len(categories)) + rng.normal(0, 1.2, session_ids.size), 0, 10).round(1)
+    positions = np.array(["Intern Marketing", "Marketing Executive", "Data Analyst"])[session_ids % 3]
+    questions = np.char.add("q", (rng.integers(0, 200, session_ids.size)).astype(str))
+    return Cohort(session_ids, positions, np.tile(categories, sessions), questions, scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phân tích điểm phỏng vấn theo vị trí, loại câu hỏi và câu hỏi")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Kho kết quả SQLite")
+    parser.add_argument("--files", nargs="+", help="Đọc các file JSON kết quả thay vì kho (chấp nhận glob)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Số phiên giả lập (đo tốc độ)")
+    parser.add_argument("--position")
+    parser.add_argument("--since", help="YYYY-MM-DD")
+    parser.add_argument("--until", help="YYYY-MM-DD")
+    parser.add_argument("--min-answers", type=int, default=5, help="Số lượt trả lời tối thiểu để xếp hạng độ khó")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.synthetic:
+        cohort = synthetic_cohort(args.synthetic)
+    elif args.files:
+        paths = [p for pattern in args.files for p in (sorted(Path().glob(pattern)) or [Path(pattern)])]
+        cohort = Cohort.from_files(paths)
+    else:
+        if not Path(args.db).exists():
+            print(f"❌ Không có kho kết quả {args.db} (chạy: python results_store.py migrate)")
+            sys.exit(1)
+        cohort = Cohort.from_store(ResultsStore(args.db), position=args.position, since=args.since, until=args.until)
+    loaded = time.perf_counter()
+    result = report(cohort, args.min_answers, args.top)
+    computed = time.perf_counter()
+
+    print(f"📊 {result['sessions']} phiên, {result['answers']} câu trả lời, điểm TB {result['mean_score']}")
+    print(f"⏱️ Load {loaded - started:.3f}s, tính toán {computed - loaded:.3f}s")
+    print("\n📋 Theo loại câu hỏi:")
+    for category, stats in result["categories"].items():
+        print(f"  {category:12} n={stats['count']:<8} TB={stats['mean']:.2f}  "
+              f"p25={stats['p25']:.1f} p50={stats['p50']:.1f} p75={stats['p75']:.1f} p90={stats['p90']:.1f}")
+    print("\n🎯 Tỷ lệ đạt (TB ≥ 6):")
+    for position, rates in result["pass_rates"]["by_position"].items():
+        print(f"  {position:24} {rates['sessions']:>8} phiên  đạt {rates['pass_rate']:.1%}")
+    print("\n🧗 Câu hỏi khó nhất:")
+    for item in result["hardest_questions"][:10]:
+        print(f"  {item['mean_score']:.2f} ({item['answers']} lượt, {item['category']}) {item['question'][:80]}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n💾 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_worker_pool import QUERIES, SyntheticEmbeddings
+from federated_retriever import FederatedRetriever, VectorStoreSource
+
+# So sánh truy vấn tuần tự (mỗi store tự embed rồi search, lần lượt) với FederatedRetriever
+# (embed chung một lần, các store search song song) trên CV + knowledge chia thành nhiều shard.
+# Đồng thời kiểm tra top-k gộp từ các shard trùng với top-k của một index nguyên khối.
+
+
+def build_stores(embeddings, docs: int, shards: int):
+    from langchain_community.vectorstores import FAISS
+    cv_texts = [f"kinh nghiệm {i}: dự án, kỹ năng làm việc nhóm" for i in range(max(20, docs // 20))]
+    knowledge_texts = [f"đoạn kiến thức số {i} về marketing và tư duy phản biện" for i in range(docs)]
+    cv = FAISS.from_texts(cv_texts, embeddings)
+    full = FAISS.from_texts(knowledge_texts, embeddings)
+    size = -(-len(knowledge_texts) // shards)
+    parts = {f"knowledge_{i}": FAISS.from_texts(knowledge_texts[i * size:(i + 1) * size], embeddings)
+             for i in range(shards)}
+    return cv, full, parts
+
+
+def sequential(cv, shards, queries, k: int):
+    """Cách cũ: mỗi store tự embed câu truy vấn và search lần lượt"""
+    results = list(cv.similarity_search_with_score(queries["cv"], k=k))
+    for store in shards.values():
+        results += store.similarity_search_with_score(queries["knowledge"], k=k)
+    return results
+
+
+def measure(fn, repeat: int) -> float:
+    times = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark truy vấn song song nhiều vector store")
+    parser.add_argument("--docs", type=int, default=4000, help="Số đoạn kiến thức (tổng các shard)")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3000, help="Độ tốn CPU của embedding giả lập")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    embeddings = SyntheticEmbeddings(rounds=args.rounds)
+    print(f"🔧 Tạo {args.shards} shard kiến thức ({args.docs} đoạn) + CV...")
+    cv, full, shards = build_stores(embeddings, args.docs, args.shards)
+    sources = [VectorStoreSource("cv", cv, group="cv")]
+    sources += [VectorStoreSource(name, store, group="knowledge") for name, store in shards.items()]
+    federated = FederatedRetriever(sources, embeddings)
+
+    def queries(i):
+        return {"cv": f"{QUERIES[i % len(QUERIES)]} {i}", "knowledge": f"{QUERIES[(i + 1) % len(QUERIES)]} {i}"}
+
+    sequential_ms = measure(lambda i: sequential(cv, shards, queries(i), args.k), args.repeat)
+    federated_ms = measure(lambda i: federated.search(queries(i), k=2 * args.k,
+                                                      quota={"cv": args.k, "knowledge": args.k}), args.repeat)
+    _, stats = federated.search(queries(0), k=2 * args.k, quota={"cv": args.k, "knowledge": args.k})
+
+    # Top-k gộp từ các shard phải trùng với index nguyên khối (điểm cùng thang cosine)
+    matched = 0
+    for i in range(args.repeat):
+        query = queries(i)["knowledge"]
+        expected = [doc.page_content for doc, _ in full.similarity_search_with_score(query, k=args.k)]
+        got = [doc.page_content for doc, _, _ in federated.search({"knowledge": query}, k=args.k)[0]]
+        matched += sum(1 for text in got if text in expected)
+    overlap = matched / (args.repeat * args.k)
+
+    report = {
+        "docs": args.docs,
+        "shards": args.shards,
+        "sequential_ms": round(sequential_ms, 2),
+        "federated_ms": round(federated_ms, 2),
+        "speedup": round(sequential_ms / federated_ms, 2),
+        "shard_merge_overlap": round(overlap, 3),
+        "stats": stats,
+    }
+    print(f"⏱️ Tuần tự: {sequential_ms:.1f}ms | Song song: {federated_ms:.1f}ms (x{sequential_ms / federated_ms:.2f})")
+    print(f"🎯 Top-{args.k} gộp từ shard trùng index nguyên khối: {overlap:.0%}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
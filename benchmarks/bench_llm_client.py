@@ -0,0 +1,95 @@
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fake_llm import FakeLLM, FaultyLLM
+from llm_client import ResilientLLM
+
+# So sánh gọi LLM trực tiếp với ResilientLLM khi model chính bị chèn lỗi (FaultyLLM):
+# tỷ lệ lời gọi thành công, độ trễ p50/p95/p99 và thống kê retry/hedge/fallback.
+#   python benchmarks/bench_llm_client.py
+#   python benchmarks/bench_llm_client.py --error-rate 0.3 --hang-rate 0.05 --requests 400
+
+PROMPT = "Hãy chấm điểm câu trả lời sau theo 5 tiêu chí."
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+
+def run(llm, requests: int, concurrency: int) -> Dict[str, Any]:
+    def call(_):
+        started = time.perf_counter()
+        try:
+            llm.invoke(PROMPT)
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    latencies = [latency for ok, latency in results if ok]
+    return {
+        "success_rate": round(sum(ok for ok, _ in results) / requests, 4),
+        "p50_s": round(_percentile(latencies, 50), 3),
+        "p95_s": round(_percentile(latencies, 95), 3),
+        "p99_s": round(_percentile(latencies, 99), 3),
+        "wall_s": round(time.perf_counter() - started, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ResilientLLM với LLM giả lập bị chèn lỗi")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Độ trễ bình thường của model chính")
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--hang-rate", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=2.0, help="Deadline mỗi lần gọi của ResilientLLM")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    def faulty():
+        # Cùng seed cho cả hai lần chạy để chuỗi lỗi giống nhau
+        return FaultyLLM(FakeLLM(latency=args.latency, seed=None), error_rate=args.error_rate,
+                         slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                         hang_rate=args.hang_rate, hang_latency=args.timeout * 5, seed=0)
+
+    report = {"config": vars(args)}
+    print(f"🧪 {args.requests} lời gọi, {args.concurrency} luồng, lỗi {args.error_rate:.0%}, "
+          f"chậm {args.slow_rate:.0%} ({args.slow_latency}s), treo {args.hang_rate:.0%}")
+
+    report["direct"] = run(faulty(), args.requests, args.concurrency)
+    resilient = ResilientLLM(faulty(), fallback=FakeLLM(latency=args.latency * 2, seed=None),
+                             timeout=args.timeout, backoff=0.05, max_backoff=0.5,
+                             hedge=True, hedge_min_delay=args.latency * 2, seed=0)
+    report["resilient"] = run(resilient, args.requests, args.concurrency)
+    report["resilient"]["metrics"] = resilient.metrics()
+
+    for name in ("direct", "resilient"):
+        row = report[name]
+        print(f"  {name:10} thành công {row['success_rate']:.1%}  p50={row['p50_s']:.3f}s  "
+              f"p95={row['p95_s']:.3f}s  p99={row['p99_s']:.3f}s  ({row['wall_s']}s)")
+    for model, stats in report["resilient"]["metrics"].items():
+        counters = ", ".join(f"{k}={v}" for k, v in stats.items() if not k.startswith("p") and k != "samples")
+        print(f"  📊 {model}: {counters}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
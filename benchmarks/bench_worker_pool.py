@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain_core.embeddings import Embeddings
+
+from worker_pool import SharedIndexPool
+
+# Benchmark khả năng mở rộng của SharedIndexPool: đo số truy vấn (embed + search)/giây
+# với 1, 2, 4, ... worker. Chế độ --synthetic dùng embedding thuần Python (giữ GIL)
+# để kiểm tra mà không cần tải model e5.
+
+QUERIES = [
+    "marketing mix gồm những gì",
+    "chiến lược giá thâm nhập thị trường",
+    "kỹ năng làm việc nhóm và giao tiếp",
+    "phân khúc thị trường mục tiêu",
+    "đo lường hiệu quả chiến dịch quảng cáo",
+    "kinh nghiệm dự án nghiên cứu thị trường",
+]
+
+
+class SyntheticEmbeddings(Embeddings):
+    """Embedding giả lập tốn CPU và giữ GIL (băm lặp nhiều vòng), vector đã chuẩn hóa"""
+
+    def __init__(self, dim: int = 256, rounds: int = 3000):
+        self.dim = dim
+        self.rounds = rounds
+
+    def _embed(self, text: str) -> List[float]:
+        digest = text.encode("utf-8")
+        values = []
+        for _ in range(self.rounds):
+            digest = hashlib.sha256(digest).digest()
+        while len(values) < self.dim:
+            digest = hashlib.sha256(digest).digest()
+            values.extend(b / 255.0 - 0.5 for b in digest)
+        values = values[:self.dim]
+        norm = sum(v * v for v in values) ** 0.5 or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def load_stores(synthetic: bool):
+    from langchain_community.vectorstores import FAISS
+    if synthetic:
+        embeddings = SyntheticEmbeddings()
+        texts = [f"đoạn văn số {i} về marketing và kinh nghiệm" for i in range(2000)]
+        store = FAISS.from_texts(texts, embeddings)
+        return embeddings, {"knowledge": store}
+
+    from interview import InterviewResources
+    resources = InterviewResources()
+    return resources.embeddings, {"cv": resources.cv_db, "knowledge": resources.knowledge_db}
+
+
+def run(pool: SharedIndexPool, requests: int, clients: int) -> float:
+    """Gửi requests truy vấn từ clients thread song song, trả về số truy vấn/giây"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(
+            lambda i: pool.search_with_scores("knowledge", f"{QUERIES[i % len(QUERIES)]} {i}", 3),
+            range(requests)
+        ))
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker pool (embed + search) theo số core")
+    parser.add_argument("--synthetic", action="store_true", help="Dùng embedding giả lập thay cho model e5")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    embeddings, stores = load_stores(args.synthetic)
+
+    counts = []
+    n = 1
+    while n <= args.max_workers:
+        counts.append(n)
+        n *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    results = []
+    baseline = None
+    for workers in counts:
+        pool = SharedIndexPool(embeddings, stores, workers=workers)
+        try:
+            run(pool, workers * 4, workers * 2)  # làm nóng từng worker
+            qps = run(pool, args.requests, workers * 2)
+        finally:
+            pool.close()
+        baseline = baseline or qps
+        speedup = qps / baseline
+        results.append({
+            "workers": workers,
+            "queries_per_second": round(qps, 2),
+            "speedup": round(speedup, 2),
+            # 1.0 = tăng tuyến tính hoàn hảo theo số core
+            "scaling_efficiency": round(speedup / workers, 2)
+        })
+        print(f"👷 {workers} worker: {qps:.1f} truy vấn/giây (x{speedup:.2f}, hiệu suất {speedup / workers:.0%})")
+
+    report = {"synthetic": args.synthetic, "cpu_count": os.cpu_count(), "results": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
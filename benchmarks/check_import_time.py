@@ -0,0 +1,95 @@
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Kiểm tra thời gian khởi động của các entry point bằng `python -X importtime`:
+# các lệnh nhẹ (--help, --replay) không được import thư viện nặng và phải chạy xong dưới ngân sách.
+#   python benchmarks/check_import_time.py
+#   python benchmarks/check_import_time.py --budget 0.5 --top 10
+
+# Thư viện nặng chỉ được import trên nhánh code thật sự cần (load model, gọi Gemini, build index)
+HEAVY_MODULES = (
+    "torch", "transformers", "sentence_transformers", "faiss",
+    "langchain", "langchain_core", "langchain_community", "langchain_huggingface", "langchain_google_genai",
+    "google.generativeai",
+)
+
+CHECKS = [
+    ("import interview", ["-c", "import interview"]),
+    ("interview.py --help", ["interview.py", "--help"]),
+    ("interview.py --replay", ["interview.py", "--replay", "interview_results.json"]),
+    ("vectodbofkn.py --help", ["vectodbofkn.py", "--help"]),
+    ("vectodbofcv.py --help", ["vectodbofcv.py", "--help"]),
+]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Danh sách (module, self_us, cumulative_us) từ output của -X importtime"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            imports.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue  # dòng tiêu đề "self [us] | cumulative | imported package"
+    return imports
+
+
+def run_check(name: str, argv: List[str]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    imports = parse_importtime(proc.stderr)
+    heavy = sorted({module for module, _, _ in imports
+                    if any(module == h or module.startswith(h + ".") for h in HEAVY_MODULES)})
+    return {
+        "name": name,
+        "returncode": proc.returncode,
+        "wall_s": round(wall, 3),
+        "import_s": round(sum(self_us for _, self_us, _ in imports) / 1e6, 3),
+        "modules": len(imports),
+        "heavy": heavy,
+        "slowest": sorted(imports, key=lambda item: item[2], reverse=True)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra thời gian import của các entry point")
+    parser.add_argument("--budget", type=float, default=1.0, help="Thời gian tối đa (giây) cho mỗi lệnh")
+    parser.add_argument("--top", type=int, default=5, help="Số import chậm nhất in ra khi vượt ngân sách")
+    args = parser.parse_args()
+
+    failed = False
+    for name, argv in CHECKS:
+        result = run_check(name, argv)
+        problems = []
+        if result["returncode"] != 0:
+            problems.append(f"thoát với mã {result['returncode']}")
+        if result["wall_s"] > args.budget:
+            problems.append(f"{result['wall_s']}s > {args.budget}s")
+        if result["heavy"]:
+            top_level = sorted({m.split(".")[0] for m in result["heavy"]})
+            problems.append(f"import thư viện nặng: {', '.join(top_level)}")
+
+        icon = "❌" if problems else "✅"
+        print(f"{icon} {name}: {result['wall_s']}s (import {result['import_s']}s, {result['modules']} module)")
+        if problems:
+            failed = True
+            for problem in problems:
+                print(f"   - {problem}")
+            for module, _, cumulative_us in result["slowest"][:args.top]:
+                print(f"     {cumulative_us / 1000:8.1f} ms  {module}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
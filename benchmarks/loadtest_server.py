@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from typing import List, Dict, Any
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Load test cho interview_server.py: chạy server với LLM giả lập trong tiến trình con,
+# mô phỏng nhiều thí sinh đồng thời và đo số phiên trên mỗi core (theo CPU time của server).
+
+ANSWER = ("Trong dự án gần nhất, tôi phụ trách phân tích khách hàng mục tiêu, lên kế hoạch nội dung "
+          "và đo lường hiệu quả chiến dịch bằng các chỉ số cụ thể.")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            try:
+                async with http.get(f"{base_url}/metrics") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server không khởi động kịp")
+
+
+async def _run_candidate(http: aiohttp.ClientSession, base_url: str, latencies: List[float], errors: Dict[str, int]) -> bool:
+    """Một thí sinh ảo: tạo phiên rồi trả lời đến khi kết thúc"""
+    payload = {"candidate_info": {"name": "Load Test", "position": "Intern Marketing"}}
+    while True:
+        async with http.post(f"{base_url}/sessions", json=payload) as resp:
+            if resp.status in (429, 503):
+                errors[str(resp.status)] = errors.get(str(resp.status), 0) + 1
+                await asyncio.sleep(0.05)
+                continue
+            if resp.status != 201:
+                errors[str(resp.status)] = errors.get(str(resp.status), 0) + 1
+                return False
+            session_id = (await resp.json())["session_id"]
+            break
+
+    while True:
+        started = time.perf_counter()
+        async with http.post(f"{base_url}/sessions/{session_id}/answer", json={"answer": ANSWER}) as resp:
+            if resp.status == 503:
+                errors["503"] = errors.get("503", 0) + 1
+                await asyncio.sleep(0.05)
+                continue
+            if resp.status != 200:
+                errors[str(resp.status)] = errors.get(str(resp.status), 0) + 1
+                return False
+            data = await resp.json()
+        latencies.append(time.perf_counter() - started)
+        if data.get("finished"):
+            return True
+
+
+async def _drive(base_url: str, concurrency: int, total_sessions: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    remaining = total_sessions
+    completed = 0
+
+    async def worker(http):
+        nonlocal remaining, completed
+        while remaining > 0:
+            remaining -= 1
+            if await _run_candidate(http, base_url, latencies, errors):
+                completed += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency * 2)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        async with http.get(f"{base_url}/metrics") as resp:
+            cpu_before = (await resp.json())["process_cpu_seconds"]
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(http) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+        async with http.get(f"{base_url}/metrics") as resp:
+            metrics = await resp.json()
+
+    latencies.sort()
+    return {
+        "completed_sessions": completed,
+        # CPU time của server chỉ trong khoảng đo (không tính lúc import/khởi động)
+        "server_cpu_seconds": round(metrics["process_cpu_seconds"] - cpu_before, 3),
+        "wall_seconds": round(wall, 3),
+        "answers": len(latencies),
+        "answer_latency_p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "answer_latency_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2) if latencies else None,
+        "errors": errors,
+        "server_metrics": metrics
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test server phỏng vấn với LLM giả lập")
+    parser.add_argument("--sessions", type=int, default=200, help="Tổng số phiên cần hoàn thành")
+    parser.add_argument("--concurrency", type=int, default=50, help="Số thí sinh ảo đồng thời")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="Độ trễ LLM giả lập (giây)")
+    parser.add_argument("--max-sessions", type=int, default=100)
+    parser.add_argument("--max-inflight-llm", type=int, default=32)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0, help="Tỷ lệ lỗi chèn vào LLM giả lập")
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    results_dir = tempfile.mkdtemp(prefix="loadtest_results_")
+    server = subprocess.Popen([
+        sys.executable, str(ROOT / "interview_server.py"),
+        "--host", "127.0.0.1", "--port", str(port), "--fake-llm",
+        "--fake-latency", str(args.fake_latency),
+        "--max-sessions", str(args.max_sessions),
+        "--max-inflight-llm", str(args.max_inflight_llm),
+        "--fake-error-rate", str(args.fake_error_rate),
+        "--results-db", str(Path(results_dir) / "results.db")
+    ], cwd=str(ROOT), stdout=subprocess.DEVNULL)
+
+    try:
+        asyncio.run(_wait_ready(base_url))
+        report = asyncio.run(_drive(base_url, args.concurrency, args.sessions))
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait()
+
+    cpu_seconds = report["server_cpu_seconds"]
+    report.update({
+        "concurrency": args.concurrency,
+        "fake_llm_latency": args.fake_latency,
+        "sessions_per_second": round(report["completed_sessions"] / report["wall_seconds"], 2),
+        # Số phiên một core xử lý được mỗi giây nếu server bị giới hạn bởi CPU
+        "sessions_per_core": round(report["completed_sessions"] / cpu_seconds, 2) if cpu_seconds else None,
+        "cpu_count": os.cpu_count()
+    })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Benchmark end-to-end các bước chính của pipeline với LLM giả lập (fake_llm.FakeLLM):
+# OCR, đọc PDF, chia chunk NLTK, embedding, FAISS build/search, khởi động InterviewSystem,
+# tạo câu hỏi và chấm điểm. Kết quả ghi ra JSON kèm commit để so sánh giữa các commit:
+#   python benchmarks/run_benchmarks.py --embeddings synthetic
+#   python benchmarks/run_benchmarks.py --compare benchmarks/results/<commit cũ>.json
+
+ANSWER = ("Trong dự án gần nhất, tôi phụ trách phân tích khách hàng mục tiêu, lên kế hoạch nội dung "
+          "và đo lường hiệu quả chiến dịch bằng các chỉ số cụ thể.")
+QUERIES = [
+    "marketing mix gồm những gì",
+    "chiến lược giá thâm nhập thị trường",
+    "phân khúc thị trường mục tiêu",
+    "đo lường hiệu quả chiến dịch quảng cáo",
+]
+
+
+class SkipStage(Exception):
+    """Bỏ qua một bước khi thiếu dữ liệu hoặc công cụ (vd: chưa cài Tesseract)"""
+
+
+def _timed(fn: Callable, repeat: int = 1) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def _latency_stats(durations: List[float], prefix: str = "") -> Dict[str, float]:
+    values = sorted(d * 1000 for d in durations)
+    return {
+        f"{prefix}p50_ms": round(statistics.median(values), 3),
+        f"{prefix}p95_ms": round(values[min(len(values) - 1, int(0.95 * len(values)))], 3),
+        f"{prefix}mean_ms": round(statistics.fmean(values), 3)
+    }
+
+
+def git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+class BenchmarkSuite:
+    """Chạy lần lượt các bước, bước sau dùng lại dữ liệu của bước trước (text PDF, chunk, vector)"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.results: Dict[str, Any] = {}
+        self.pdf_text = ""
+        self.chunks: List[str] = []
+        self.embeddings = None
+        self.vectors: List[List[float]] = []
+        self.store = None
+
+    def run_stage(self, name: str, fn: Callable[[], Dict[str, Any]]):
+        print(f"⏱️ {name}...")
+        try:
+            result = {"status": "ok", **fn()}
+        except SkipStage as e:
+            result = {"status": "skipped", "reason": str(e)}
+        except Exception as e:
+            result = {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+        self.results[name] = result
+        print(f"   {result}")
+
+    def ocr(self) -> Dict[str, Any]:
+        from vectodbofcv import extract_text_from_images, find_files_in_cv_folder
+        import pytesseract
+        try:
+            pytesseract.get_tesseract_version()
+        except Exception:
+            raise SkipStage("Tesseract chưa được cài đặt")
+
+        images, _ = find_files_in_cv_folder(ROOT / "CV")
+        if not images:
+            raise SkipStage("Không có ảnh CV trong CV/")
+        durations = [d for p in images for d in _timed(lambda: extract_text_from_images([p], preprocess=True),
+                                                        self.args.repeat)]
+        regions = [d for p in images for d in _timed(lambda: extract_text_from_images([p], regions=True),
+                                                     self.args.repeat)]
+        raw = [d for p in images for d in _timed(lambda: extract_text_from_images([p]), self.args.repeat)]
+        return {
+            "pages": len(images),
+            "chars": len(extract_text_from_images(images, preprocess=True)),
+            "regions_chars": len(extract_text_from_images(images, regions=True)),
+            "raw_chars": len(extract_text_from_images(images)),
+            **_latency_stats(durations, "page_"),
+            **_latency_stats(regions, "regions_page_"),
+            **_latency_stats(raw, "raw_page_")
+        }
+
+    def pdf(self) -> Dict[str, Any]:
+        import fitz
+        from vectodbofcv import extract_text_from_pdfs
+        pdf_path = ROOT / self.args.pdf
+        if not pdf_path.exists():
+            raise SkipStage(f"Không tìm thấy {pdf_path.name}")
+
+        with fitz.open(pdf_path) as doc:
+            pages = doc.page_count
+        durations = _timed(lambda: setattr(self, "pdf_text", extract_text_from_pdfs([pdf_path])), self.args.repeat)
+        return {
+            "pages": pages,
+            "chars": len(self.pdf_text),
+            "total_ms": round(statistics.median(durations) * 1000, 3),
+            "per_page_ms": round(statistics.median(durations) * 1000 / max(pages, 1), 3)
+        }
+
+    def split(self) -> Dict[str, Any]:
+        if not self.pdf_text:
+            raise SkipStage("Chưa có text PDF")
+        from langchain.text_splitter import NLTKTextSplitter
+        from nltk_resources import ensure_punkt
+        splitter = NLTKTextSplitter(chunk_size=1600, chunk_overlap=400, separator="\n\n")
+        try:
+            ensure_punkt()
+            durations = _timed(lambda: setattr(self, "chunks", splitter.split_text(self.pdf_text)), self.args.repeat)
+        except LookupError:
+            raise SkipStage("Thiếu dữ liệu NLTK punkt")
+        seconds = statistics.median(durations)
+
+        from chunking import ParallelNLTKTextSplitter
+        parallel = ParallelNLTKTextSplitter(chunk_size=1600, chunk_overlap=400, separator="\n\n",
+                                            min_parallel_chars=0)
+        parallel_chunks = parallel.split_text(self.pdf_text)  # khởi động process pool
+        parallel_seconds = statistics.median(_timed(lambda: parallel.split_text(self.pdf_text), self.args.repeat))
+        return {
+            "chunks": len(self.chunks),
+            "total_ms": round(seconds * 1000, 3),
+            "chars_per_second": round(len(self.pdf_text) / seconds, 1),
+            "parallel_total_ms": round(parallel_seconds * 1000, 3),
+            "parallel_workers": parallel.workers,
+            "parallel_matches": parallel_chunks == self.chunks
+        }
+
+    def nltk_bootstrap(self) -> Dict[str, Any]:
+        """Thời gian khởi động phần NLTK: ensure_punkt (dữ liệu cục bộ), kèm nltk.download (cách cũ) nếu có --network"""
+        def run(code: str, timeout: float = 60):
+            started = time.perf_counter()
+            try:
+                proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, timeout=timeout)
+                status = "ok" if proc.returncode == 0 else "error"
+            except subprocess.TimeoutExpired:
+                status = "timeout"
+            return round(time.perf_counter() - started, 3), status
+
+        import_s, _ = run("import nltk")
+        local_s, local_status = run("from nltk_resources import ensure_punkt; ensure_punkt()")
+        result = {
+            "import_nltk_s": import_s,
+            "ensure_punkt_startup_s": local_s,
+            "ensure_punkt_status": local_status
+        }
+        if self.args.network:
+            # Tải vào thư mục tạm (không ghi vào ~/nltk_data); quiet=True trả về False khi lỗi nên phải tự kiểm tra
+            import shutil
+            import tempfile
+            target = tempfile.mkdtemp(prefix="nltk_bench_")
+            try:
+                result["download_startup_s"], result["download_status"] = run(
+                    f"import sys, nltk; ok = all(nltk.download(p, download_dir={target!r}, quiet=True) "
+                    f"for p in ('punkt', 'punkt_tab')); sys.exit(0 if ok else 1)"
+                )
+            finally:
+                shutil.rmtree(target, ignore_errors=True)
+        return result
+
+    def _load_embeddings(self):
+        if self.args.embeddings == "synthetic":
+            from bench_worker_pool import SyntheticEmbeddings
+            return SyntheticEmbeddings(rounds=200)
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name="intfloat/multilingual-e5-large-instruct",
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"normalize_embeddings": True}
+        )
+
+    def embedding(self) -> Dict[str, Any]:
+        if not self.chunks:
+            # Bước chia chunk bị bỏ qua: chia theo độ dài cố định để các bước sau vẫn chạy được
+            text = self.pdf_text or " ".join(QUERIES) * 200
+            self.chunks = [text[i:i + 1600] for i in range(0, len(text), 1200)]
+
+        chunks = self.chunks[:self.args.max_chunks]
+        started = time.perf_counter()
+        self.embeddings = self._load_embeddings()
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self.vectors = self.embeddings.embed_documents(chunks)
+        seconds = time.perf_counter() - started
+        query_durations = [d for q in QUERIES for d in _timed(lambda: self.embeddings.embed_query(q), self.args.repeat)]
+        return {
+            "model": self.args.embeddings,
+            "model_load_s": round(load_seconds, 3),
+            "documents": len(chunks),
+            "documents_per_second": round(len(chunks) / seconds, 2),
+            **_latency_stats(query_durations, "query_")
+        }
+
+    def faiss(self) -> Dict[str, Any]:
+        if not self.vectors:
+            raise SkipStage("Chưa có vector embedding")
+        from langchain_community.vectorstores import FAISS
+        pairs = list(zip(self.chunks, self.vectors))
+
+        durations = _timed(lambda: setattr(self, "store", FAISS.from_embeddings(pairs, self.embeddings)), self.args.repeat)
+        query_vectors = [self.embeddings.embed_query(q) for q in QUERIES]
+        search_durations = [
+            d for v in query_vectors
+            for d in _timed(lambda: self.store.similarity_search_with_score_by_vector(v, k=3), self.args.repeat * 10)
+        ]
+        return {
+            "vectors": len(pairs),
+            "build_ms": round(statistics.median(durations) * 1000, 3),
+            **_latency_stats(search_durations, "search_")
+        }
+
+    def _fake_llm(self):
+        from fake_llm import FakeLLM
+        return FakeLLM(latency=self.args.llm_latency)
+
+    def _resources(self):
+        """Tài nguyên cho InterviewSystem: FAISS vừa build + LLM giả lập (không gọi mạng)"""
+        from fake_llm import FakeResources
+        resources = FakeResources(llm=self._fake_llm())
+        if self.store is not None:
+            resources.embeddings = self.embeddings
+            resources.cv_db = resources.knowledge_db = self.store
+            resources.cv_retriever = resources.knowledge_retriever = self.store.as_retriever(search_kwargs={"k": 3})
+        return resources
+
+    def cold_start(self) -> Dict[str, Any]:
+        # Import trong tiến trình mới để đo đúng thời gian import lần đầu
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import interview"], cwd=ROOT, check=True, capture_output=True)
+        import_seconds = time.perf_counter() - started
+
+        from interview import InterviewSystem
+        resources = self._resources()
+        durations = _timed(lambda: InterviewSystem(question_bank_dir=None, resources=resources), self.args.repeat)
+        result = {
+            "import_s": round(import_seconds, 3),
+            "construct_ms": round(statistics.median(durations) * 1000, 3)
+        }
+        if self.args.embeddings == "e5":
+            # Khởi động thật: load model e5 + 2 vector database từ đĩa
+            from interview import InterviewResources
+            started = time.perf_counter()
+            InterviewResources(llm=self._fake_llm())
+            result["resources_load_s"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def _system(self, prescore: bool = False):
+        from fake_llm import _CANDIDATE
+        from interview import InterviewSystem
+        system = InterviewSystem(question_bank_dir=None, prefetch_scoring=False, resources=self._resources(),
+                                 prescore=prescore)
+        system.candidate_info.update(_CANDIDATE)
+        return system
+
+    def question_generation(self) -> Dict[str, Any]:
+        system = self._system()
+        calls_before = system.llm.calls
+        durations = _timed(system.generate_questions, self.args.repeat)
+        return {
+            "questions": len(system.questions),
+            "llm_calls": (system.llm.calls - calls_before) // self.args.repeat,
+            "total_ms": round(statistics.median(durations) * 1000, 3)
+        }
+
+    def scoring(self) -> Dict[str, Any]:
+        system = self._system()
+        questions = system.generate_questions()
+        durations = [d for q in questions for d in _timed(lambda: system._score_answer(q, ANSWER), self.args.repeat)]
+        result = {"answers": len(durations), **_latency_stats(durations, "answer_")}
+
+        # Chấm sơ bộ bằng embedding (quyết định chấm ở máy hay gửi LLM), không tính thời gian LLM
+        prescorer = self._system(prescore=True).prescorer
+        if prescorer is not None:
+            context = "\n".join(d.page_content for d in self.store.similarity_search(QUERIES[0], k=3))
+            durations = [d for q in questions
+                         for d in _timed(lambda: prescorer.prescore(q["question"], ANSWER, context), self.args.repeat)]
+            result.update(_latency_stats(durations, "prescore_"))
+        return result
+
+    def long_session(self) -> Dict[str, Any]:
+        # Phiên chat dài như RAGtest.py (condense câu hỏi + trả lời theo context) với RollingSummaryMemory:
+        # token prompt và độ trễ mỗi lượt ở cuối phiên phải xấp xỉ đầu phiên
+        from fake_llm import FakeLLM
+        from rolling_memory import RollingSummaryMemory
+        from token_utils import estimate_tokens
+
+        llm = FakeLLM(latency=self.args.llm_latency, responses={"text": " ".join([ANSWER] * 3)})
+        memory = RollingSummaryMemory(llm=llm, max_token_limit=800, max_summary_tokens=300, skip_condense=True)
+        context = "\n".join([ANSWER] * 5)
+        prompt_tokens: List[int] = []
+        durations: List[float] = []
+        unbounded_tokens = 0
+        for turn in range(self.args.turns):
+            query = QUERIES[turn % len(QUERIES)]
+            # Xen kẽ câu hỏi tiếp nối (cần lịch sử) và câu hỏi tự đủ nghĩa
+            question = f"Vậy {query} thì thế nào?" if turn % 2 else query
+            started = time.perf_counter()
+            history = memory.load_memory_variables({"question": question})["chat_history"]
+            tokens = 0
+            if history:
+                condense = "\n".join(f"{m.type}: {m.content}" for m in history) + f"\nCâu hỏi: {question}"
+                tokens += estimate_tokens(condense)
+                question = llm.invoke(condense)
+            prompt = f"{context}\nCâu hỏi: {question}"
+            tokens += estimate_tokens(prompt)
+            answer = llm.invoke(prompt)
+            memory.save_context({"question": question}, {"answer": answer})
+            durations.append(time.perf_counter() - started)
+            prompt_tokens.append(tokens)
+            # Đối chiếu: memory giữ toàn bộ lịch sử sẽ gửi kèm mọi lượt trước đó
+            unbounded_tokens += estimate_tokens(question) + estimate_tokens(answer)
+        memory.wait_for_summary()
+
+        window = min(10, len(durations))
+        first_ms = statistics.fmean(durations[:window]) * 1000
+        last_ms = statistics.fmean(durations[-window:]) * 1000
+        return {
+            "turns": len(durations),
+            "first_prompt_tokens": round(statistics.fmean(prompt_tokens[:window]), 1),
+            "last_prompt_tokens": round(statistics.fmean(prompt_tokens[-window:]), 1),
+            "max_prompt_tokens": max(prompt_tokens),
+            "unbounded_history_tokens": unbounded_tokens,
+            "summary_tokens": estimate_tokens(memory.summary),
+            "first_turns_ms": round(first_ms, 3),
+            "last_turns_ms": round(last_ms, 3),
+            "latency_ratio": round(last_ms / first_ms, 3) if first_ms else None,
+            **_latency_stats(durations, "turn_")
+        }
+
+    def run(self) -> Dict[str, Any]:
+        stages = [
+            ("ocr", self.ocr),
+            ("pdf_extraction", self.pdf),
+            ("nltk_bootstrap", self.nltk_bootstrap),
+            ("nltk_split", self.split),
+            ("embedding", self.embedding),
+            ("faiss", self.faiss),
+            ("cold_start", self.cold_start),
+            ("question_generation", self.question_generation),
+            ("scoring", self.scoring),
+            ("long_session", self.long_session),
+        ]
+        for name, fn in stages:
+            if self.args.only and name not in self.args.only:
+                continue
+            self.run_stage(name, fn)
+
+        return {
+            **git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "embeddings": self.args.embeddings,
+                "llm_latency": self.args.llm_latency,
+                "repeat": self.args.repeat,
+                "max_chunks": self.args.max_chunks,
+                "turns": self.args.turns,
+                "network": self.args.network
+            },
+            "stages": self.results
+        }
+
+
+def _metric_direction(name: str) -> Optional[int]:
+    """+1 nếu giá trị lớn hơn là tốt hơn, -1 nếu nhỏ hơn là tốt hơn, None nếu không so sánh"""
+    if name.endswith("_per_second"):
+        return 1
+    if name.endswith("_ms") or name.endswith("_s"):
+        return -1
+    return None
+
+
+def compare(base: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.2) -> List[str]:
+    """In bảng so sánh 2 lần chạy, trả về danh sách metric chậm đi quá threshold"""
+    print(f"🔍 So sánh {str(base.get('commit'))[:8]} → {str(current.get('commit'))[:8]}")
+    regressions = []
+    for stage, metrics in current.get("stages", {}).items():
+        old_metrics = base.get("stages", {}).get(stage, {})
+        for name, value in metrics.items():
+            direction = _metric_direction(name)
+            old = old_metrics.get(name)
+            if direction is None or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = -change * direction > threshold
+            flag = "❌" if worse else "✅"
+            print(f"   {flag} {stage}.{name}: {old} → {value} ({change:+.1%})")
+            if worse:
+                regressions.append(f"{stage}.{name}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end pipeline phỏng vấn với LLM giả lập")
+    parser.add_argument("--embeddings", choices=["e5", "synthetic"], default="e5",
+                        help="e5: model thật; synthetic: embedding giả lập, không cần tải model")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Độ trễ (giây) mỗi lời gọi LLM giả lập")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp mỗi phép đo")
+    parser.add_argument("--max-chunks", type=int, default=200, help="Số chunk tối đa dùng cho embedding/FAISS")
+    parser.add_argument("--turns", type=int, default=150, help="Số lượt chat của phiên dài (bước long_session)")
+    parser.add_argument("--network", action="store_true",
+                        help="Đo thêm nltk.download (cách cũ, cần mạng) trong bước nltk_bootstrap")
+    parser.add_argument("--pdf", default="marketing.pdf")
+    parser.add_argument("--only", nargs="*", default=None, help="Chỉ chạy các bước này")
+    parser.add_argument("--output", default=None, help="Mặc định: benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", nargs="+", default=None, metavar="RESULT",
+                        help="1 file: so với lần chạy hiện tại; 2 file: so sánh 2 kết quả có sẵn")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Ngưỡng chậm đi bị coi là regression")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        base, current = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        sys.exit(1 if compare(base, current, args.threshold) else 0)
+
+    report = BenchmarkSuite(args).run()
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"{(report['commit'] or 'unknown')[:12]}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 Kết quả: {output}")
+
+    if args.compare:
+        base = json.loads(Path(args.compare[0]).read_text(encoding="utf-8"))
+        regressions = compare(base, report, args.threshold)
+        if regressions:
+            print(f"⚠️ Chậm đi: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import re
+import sys
+import time
+import argparse
+import functools
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Optional
+
+from langchain.text_splitter import NLTKTextSplitter
+
+from nltk_resources import ensure_punkt
+
+# Chia câu song song cho corpus lớn: text được cắt thành các đoạn (ưu tiên ranh giới trang/đoạn văn),
+# mỗi đoạn được Punkt tách câu trong một process pool, sau đó câu ở mỗi chỗ nối giữa 2 đoạn được
+# tách lại trên text gốc. Punkt quyết định ranh giới câu dựa trên cặp token liền kề nên kết quả
+# giống hệt NLTKTextSplitter chạy trên toàn bộ text (kiểm tra bằng: python chunking.py --check marketing.pdf).
+
+Span = Tuple[int, int]
+
+_WHITESPACE = re.compile(r"\s")
+_POOLS: Dict[Tuple[int, str], ProcessPoolExecutor] = {}
+
+
+@functools.lru_cache(maxsize=None)
+def load_punkt(language: str = "english"):
+    """Load model Punkt một lần cho mỗi tiến trình (tiến trình chính và từng worker)"""
+    ensure_punkt(language)
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+        return PunktTokenizer(language)
+    except ImportError:
+        # NLTK < 3.8.2 chỉ có bản pickle
+        import nltk
+        return nltk.data.load(f"tokenizers/punkt/{language}.pickle")
+
+
+def _span_tokenize(args: Tuple[str, str]) -> List[Span]:
+    language, segment = args
+    return list(load_punkt(language).span_tokenize(segment))
+
+
+def _get_pool(workers: int, language: str) -> ProcessPoolExecutor:
+    key = (workers, language)
+    if key not in _POOLS:
+        # fork nếu có (worker không cần import lại script gọi), spawn trên Windows
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        _POOLS[key] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=load_punkt,
+            initargs=(language,)
+        )
+    return _POOLS[key]
+
+
+def split_segments(text: str, segment_chars: int) -> List[Span]:
+    """Cắt text thành các đoạn khoảng segment_chars ký tự, chỉ cắt tại khoảng trắng (ưu tiên '\\n\\n', rồi '\\n')"""
+    bounds = []
+    start, n = 0, len(text)
+    while start < n:
+        end = start + segment_chars
+        if end >= n:
+            bounds.append((start, n))
+            break
+        lower = start + segment_chars // 2
+        cut = max(text.rfind("\n\n", lower, end), text.rfind("\n", lower, end))
+        if cut <= start:
+            cut = text.rfind(" ", lower, end)
+        if cut <= start:
+            # Không có khoảng trắng phía trước: cắt ở khoảng trắng kế tiếp để không tách đôi token
+            match = _WHITESPACE.search(text, end)
+            cut = match.start() if match else n
+        bounds.append((start, cut))
+        start = cut
+    return bounds
+
+
+def merge_segment_spans(text: str, segment_spans: List[List[Span]], language: str = "english") -> List[Span]:
+    """Nối câu của các đoạn; câu cuối đoạn trước + câu đầu đoạn sau được tách lại trên text gốc"""
+    tokenizer = load_punkt(language)
+    spans: List[Span] = []
+    for current in segment_spans:
+        current = [span for span in current if span[1] > span[0]]
+        if not current:
+            continue
+        if not spans:
+            spans.extend(current)
+            continue
+        window_start, window_end = spans.pop()[0], current[0][1]
+        spans.extend((window_start + s, window_start + e)
+                     for s, e in tokenizer.span_tokenize(text[window_start:window_end]))
+        spans.extend(current[1:])
+    return spans
+
+
+class ParallelNLTKTextSplitter(NLTKTextSplitter):
+    """NLTKTextSplitter với bước tách câu chạy song song; cùng chunk_size/chunk_overlap và cùng kết quả"""
+
+    def __init__(self, separator: str = "\n\n", language: str = "english", *, workers: Optional[int] = None,
+                 segment_chars: int = 50_000, min_parallel_chars: int = 200_000, **kwargs):
+        super().__init__(separator=separator, language=language, **kwargs)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.segment_chars = segment_chars
+        # Text ngắn tách câu trực tiếp, không đáng chi phí gửi sang process pool
+        self.min_parallel_chars = min_parallel_chars
+
+    def sentence_spans(self, text: str) -> List[Span]:
+        """Vị trí (start, end) của từng câu trong text"""
+        if len(text) < self.min_parallel_chars or self.workers < 2 or not text.strip():
+            return list(load_punkt(self._language).span_tokenize(text))
+
+        bounds = split_segments(text, self.segment_chars)
+        pool = _get_pool(self.workers, self._language)
+        results = pool.map(_span_tokenize, ((self._language, text[s:e]) for s, e in bounds))
+        segment_spans = [[(start + s, start + e) for s, e in spans]
+                         for (start, _), spans in zip(bounds, results)]
+        return merge_segment_spans(text, segment_spans, self._language)
+
+    def split_text(self, text: str) -> List[str]:
+        if self._use_span_tokenize:
+            return super().split_text(text)
+        splits = [text[s:e] for s, e in self.sentence_spans(text)]
+        return self._merge_splits(splits, self._separator)
+
+
+def _read_text(path: Path) -> str:
+    if path.suffix.lower() == ".pdf":
+        from langchain_community.document_loaders import PyPDFLoader
+        return "\n".join(p.page_content for p in PyPDFLoader(str(path)).load())
+    return path.read_text(encoding="utf-8")
+
+
+def check_equivalence(text: str, chunk_size: int, chunk_overlap: int, **kwargs) -> bool:
+    """So sánh chunk và thời gian với NLTKTextSplitter gốc"""
+    ensure_punkt()
+    started = time.perf_counter()
+    expected = NLTKTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                separator="\n\n").split_text(text)
+    baseline = time.perf_counter() - started
+
+    splitter = ParallelNLTKTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                        separator="\n\n", **kwargs)
+    splitter.split_text(text)  # khởi động process pool
+    started = time.perf_counter()
+    actual = splitter.split_text(text)
+    parallel = time.perf_counter() - started
+
+    print(f"📄 {len(text)} ký tự, {len(expected)} chunk")
+    print(f"⏱️ NLTKTextSplitter: {baseline:.3f}s, ParallelNLTKTextSplitter ({splitter.workers} worker): "
+          f"{parallel:.3f}s (x{baseline / parallel:.2f})")
+    if actual == expected:
+        print("✅ Kết quả giống hệt NLTKTextSplitter")
+        return True
+    mismatch = next((i for i, (a, b) in enumerate(zip(actual, expected)) if a != b), min(len(actual), len(expected)))
+    print(f"❌ Khác nhau từ chunk {mismatch} ({len(actual)} so với {len(expected)} chunk)")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra ParallelNLTKTextSplitter so với NLTKTextSplitter")
+    parser.add_argument("--check", required=True, help="File PDF hoặc text để so sánh")
+    parser.add_argument("--chunk-size", type=int, default=1600)
+    parser.add_argument("--chunk-overlap", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--segment-chars", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=1, help="Nhân bản text để mô phỏng corpus lớn")
+    args = parser.parse_args()
+
+    text = "\n".join([_read_text(Path(args.check))] * args.repeat)
+    ok = check_equivalence(text, args.chunk_size, args.chunk_overlap, workers=args.workers,
+                           segment_chars=args.segment_chars, min_parallel_chars=0)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
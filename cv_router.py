@@ -0,0 +1,272 @@
+import os
+import json
+import math
+import hashlib
+import argparse
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ocr_preprocess import estimate_dpi, otsu_threshold, ink_runs
+
+# Chọn cách đọc CV cho từng file trước khi gọi Gemini (generate_questions.py):
+#   - "text":   PDF có lớp text → đọc text, gửi prompt text (rẻ nhất, không cần chọn)
+#   - "ocr":    OCR ảnh/PDF scan bằng Tesseract rồi gửi prompt text
+#   - "vision": gửi thẳng ảnh cho Gemini, bỏ qua OCR
+# Giữa "ocr" và "vision" chọn đường có độ trễ dự đoán thấp hơn. Dự đoán dựa trên thăm dò nhanh
+# (kích thước ảnh, số trang, số dòng chữ ước lượng trên ảnh thu nhỏ); lúc đầu dùng giá trị mặc định,
+# đủ mẫu thì hồi quy tuyến tính theo độ trễ đo được. Ảnh DPI quá thấp hoặc gần như không có chữ
+# đi thẳng "vision" vì OCR không đọc được. Quyết định được cache theo mã băm nội dung file:
+#   python cv_router.py CV/                         # xem quyết định cho từng file (không gọi LLM)
+#   python cv_router.py CV/ --state outputs/cv_routes.json
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif"}
+# Gemini chia ảnh lớn thành các ô 768x768, mỗi ô ~258 token
+VISION_TILE = 768
+VISION_TOKENS_PER_TILE = 258
+# Độ trễ mặc định (giây) = a + b * đơn vị, trước khi có số đo:
+#   ocr: đơn vị = số dòng chữ ước lượng (Tesseract + prompt text dài hơn), vision: đơn vị = số ô ảnh
+PRIORS = {"ocr": (3.0, 0.04), "vision": (6.0, 0.05)}
+PROBE_WIDTH = 400
+# PDF scan: trang đầu được render ở PROBE_DPI để thăm dò, gửi Gemini ở VISION_PDF_DPI
+PROBE_DPI = 40
+VISION_PDF_DPI = 150
+
+
+def file_hash(path: Path) -> str:
+    """Mã băm nội dung file (đổi tên file vẫn dùng lại được quyết định cũ)"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def text_density(img: Image.Image) -> Dict[str, Any]:
+    """Tỷ lệ điểm mực và số dòng chữ ước lượng trên ảnh thu nhỏ (vài ms mỗi trang)"""
+    gray = img.convert("L")
+    gray.thumbnail((PROBE_WIDTH, PROBE_WIDTH * 4))
+    pixels = np.asarray(gray)
+    ink = pixels < otsu_threshold(pixels)
+    # Dòng chữ: đoạn hàng có mực cao ≥ 2 điểm (bỏ đường kẻ ngang)
+    lines = [r for r in ink_runs(ink.sum(axis=1) > 0.01 * ink.shape[1], 0) if r[1] - r[0] >= 2]
+    return {"ink_ratio": round(float(ink.mean()), 4), "text_lines": len(lines)}
+
+
+def vision_tiles(width: int, height: int) -> int:
+    if max(width, height) <= 384:
+        return 1
+    return math.ceil(width / VISION_TILE) * math.ceil(height / VISION_TILE)
+
+
+def probe(path: Path, pdf_renderer=None) -> Dict[str, Any]:
+    """Đặc trưng của file: loại, số trang, kích thước, DPI, lớp text (PDF), số dòng chữ, số ô ảnh Gemini"""
+    suffix = path.suffix.lower()
+    features: Dict[str, Any] = {"bytes": path.stat().st_size}
+    if suffix in IMAGE_EXTS:
+        with Image.open(path) as img:
+            features.update({"kind": "image", "pages": 1, "width": img.width, "height": img.height,
+                             "dpi": round(estimate_dpi(img)), "tiles": vision_tiles(*img.size)})
+            img.draft("L", (PROBE_WIDTH, PROBE_WIDTH * 4))
+            features.update(text_density(img))
+        return features
+    if suffix != ".pdf":
+        raise ValueError(f"Unsupported file type: {suffix}")
+
+    features["kind"] = "pdf"
+    try:
+        from pypdf import PdfReader
+        reader = PdfReader(str(path))
+        features["pages"] = len(reader.pages)
+        first = (reader.pages[0].extract_text() or "") if reader.pages else ""
+        features["text_layer"] = len(first.strip()) >= 50
+    except Exception:
+        features.update({"pages": 1, "text_layer": False})
+    if not features["text_layer"] and pdf_renderer is not None:
+        # PDF scan: thăm dò trang đầu ở độ phân giải thấp, nhân theo số trang
+        page = pdf_renderer(path, PROBE_DPI)
+        if page is not None:
+            density = text_density(page)
+            scale = VISION_PDF_DPI / PROBE_DPI
+            features.update({"width": round(page.width * scale), "height": round(page.height * scale),
+                             "dpi": VISION_PDF_DPI, "ink_ratio": density["ink_ratio"],
+                             "text_lines": density["text_lines"] * features["pages"]})
+            features["tiles"] = vision_tiles(features["width"], features["height"]) * features["pages"]
+    return features
+
+
+class RouteStats:
+    """Độ trễ đo được (đơn vị, giây) của một đường; dự đoán bằng hồi quy tuyến tính khi đủ mẫu"""
+
+    def __init__(self, prior: Tuple[float, float], min_samples: int = 5, window: int = 200):
+        self.prior = prior
+        self.min_samples = min_samples
+        self.samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, units: float, seconds: float):
+        with self._lock:
+            self.samples.append((float(units), float(seconds)))
+
+    def predict(self, units: float) -> float:
+        with self._lock:
+            samples = list(self.samples)
+        if len(samples) < self.min_samples:
+            a, b = self.prior
+            return a + b * units
+        x, y = np.array(samples).T
+        if np.ptp(x) == 0:
+            return float(np.median(y))
+        b, a = np.polyfit(x, y, 1)
+        # Hệ số âm do nhiễu: coi độ trễ không phụ thuộc kích thước
+        return float(a + b * units) if b >= 0 else float(np.median(y))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            seconds = sorted(s for _, s in self.samples)
+        if not seconds:
+            return {"samples": 0}
+        return {"samples": len(seconds), "p50_s": round(float(np.percentile(seconds, 50)), 3),
+                "p95_s": round(float(np.percentile(seconds, 95)), 3)}
+
+
+class CVRouter:
+    """Chọn "text"/"ocr"/"vision" cho từng file, cache quyết định theo mã băm và học độ trễ từng đường"""
+
+    def __init__(self, state_path: Optional[str] = None, min_ocr_dpi: float = 100, min_text_lines: int = 3,
+                 min_samples: int = 5, explore_margin: float = 1.3, pdf_renderer=None):
+        self.state_path = Path(state_path) if state_path else None
+        # OCR không đọc được chữ quá nhỏ (ảnh chụp màn hình thu nhỏ, ảnh DPI thấp)
+        self.min_ocr_dpi = min_ocr_dpi
+        self.min_text_lines = min_text_lines
+        # Đường còn ít mẫu được thử khi dự đoán chỉ chậm hơn tối đa explore_margin lần
+        self.explore_margin = explore_margin
+        # pdf_renderer(path, dpi) -> PIL.Image trang đầu (None: không render được PDF, PDF scan chỉ đi "ocr")
+        self.pdf_renderer = pdf_renderer
+        self.stats = {route: RouteStats(prior, min_samples) for route, prior in PRIORS.items()}
+        self.decisions: Dict[str, Dict[str, Any]] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if self.state_path is None or not self.state_path.exists():
+            return
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self.decisions = state.get("decisions", {})
+        for route, samples in state.get("latencies", {}).items():
+            if route in self.stats:
+                for units, seconds in samples:
+                    self.stats[route].add(units, seconds)
+
+    def save(self):
+        if self.state_path is None:
+            return
+        with self._lock:
+            state = {"decisions": self.decisions,
+                     "latencies": {route: list(stats.samples) for route, stats in self.stats.items()}}
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def units(route: str, features: Dict[str, Any]) -> float:
+        return features.get("text_lines", 0) if route == "ocr" else features.get("tiles", features.get("pages", 1))
+
+    def predict(self, features: Dict[str, Any]) -> Dict[str, float]:
+        return {route: round(stats.predict(self.units(route, features)), 3) for route, stats in self.stats.items()}
+
+    def _vision_available(self, features: Dict[str, Any]) -> bool:
+        return features["kind"] == "image" or self.pdf_renderer is not None
+
+    def choose(self, path: Path, force: Optional[str] = None) -> Dict[str, Any]:
+        """{"route", "reason", "hash", "features", "predicted", "cached"}; force: bỏ qua cache và dự đoán"""
+        key = file_hash(path)
+        with self._lock:
+            cached = self.decisions.get(key)
+        if cached is not None and force is None:
+            if cached["route"] != "vision" or self._vision_available(cached["features"]):
+                return self._count({**cached, "hash": key, "cached": True})
+            # Quyết định cũ gửi ảnh PDF nhưng máy này không render được PDF (thiếu pdf2image): chọn lại
+            print(f"⚠️ {path.name}: không render được PDF để gửi ảnh, bỏ quyết định đã cache")
+
+        features = probe(path, self.pdf_renderer)
+        decision: Dict[str, Any] = {"hash": key, "features": features, "cached": False}
+        if force == "vision" and not self._vision_available(features):
+            print(f"⚠️ {path.name}: không render được PDF để gửi ảnh, dùng đường text/OCR")
+            force = None
+        if force is not None:
+            return self._count({**decision, "route": force, "reason": "Chọn bằng tham số", "forced": True})
+        if features["kind"] == "pdf" and features.get("text_layer"):
+            return self._count({**decision, "route": "text", "reason": "PDF có lớp text"})
+        if not self._vision_available(features):
+            return self._count({**decision, "route": "ocr", "reason": "Không render được PDF để gửi ảnh"})
+        if features.get("dpi", self.min_ocr_dpi) < self.min_ocr_dpi:
+            return self._count({**decision, "route": "vision", "reason": f"DPI thấp ({features['dpi']})"})
+        if features.get("text_lines", self.min_text_lines) < self.min_text_lines:
+            return self._count({**decision, "route": "vision", "reason": "Gần như không có dòng chữ"})
+
+        predicted = self.predict(features)
+        route = min(("ocr", "vision"), key=predicted.get)
+        other = "vision" if route == "ocr" else "ocr"
+        reason = "Độ trễ dự đoán thấp hơn"
+        if (len(self.stats[other].samples) < self.stats[other].min_samples
+                and predicted[other] <= predicted[route] * self.explore_margin):
+            route, reason = other, "Thử đường còn ít số đo"
+        return self._count({**decision, "route": route, "reason": reason, "predicted": predicted})
+
+    def _count(self, decision: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.counts[decision["route"]] = self.counts.get(decision["route"], 0) + 1
+        return decision
+
+    def record(self, decision: Dict[str, Any], route: str, seconds: Optional[float] = None):
+        """Ghi đường thực sự dùng (vd: OCR ra rỗng → vision) và độ trễ của nó; file giống hệt lần sau đi thẳng đường này"""
+        features = decision["features"]
+        if seconds is not None and route in self.stats:
+            self.stats[route].add(self.units(route, features), seconds)
+        if decision.get("forced"):
+            # Chỉ lấy số đo, không ghi đè quyết định tự động đã cache
+            self.save()
+            return
+        with self._lock:
+            self.decisions[decision["hash"]] = {"route": route, "features": features,
+                                                "reason": decision["reason"] if route == decision["route"]
+                                                else f"{decision['route']} thất bại"}
+        self.save()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"routes": dict(self.counts),
+                "latency": {route: stats.snapshot() for route, stats in self.stats.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xem đường đọc CV (text/ocr/vision) được chọn cho từng file")
+    parser.add_argument("cv_dir", nargs="?", default="CV")
+    parser.add_argument("--state", help="File trạng thái (quyết định đã cache và độ trễ đã đo)")
+    args = parser.parse_args()
+
+    router = CVRouter(args.state)
+    files = sorted(p for p in Path(args.cv_dir).iterdir() if p.suffix.lower() in IMAGE_EXTS | {".pdf"})
+    for path in files:
+        decision = router.choose(path)
+        features = decision["features"]
+        predicted = decision.get("predicted")
+        estimate = f", dự đoán ocr {predicted['ocr']}s / vision {predicted['vision']}s" if predicted else ""
+        cached = " (cache)" if decision["cached"] else ""
+        print(f"🧭 {path.name}: {decision['route']}{cached} — {decision['reason']}{estimate}")
+        print(f"   {features.get('pages')} trang, {features.get('width')}x{features.get('height')}, "
+              f"DPI {features.get('dpi')}, {features.get('text_lines')} dòng chữ, "
+              f"~{(features.get('tiles') or 0) * VISION_TOKENS_PER_TILE} token nếu gửi ảnh")
+    print(json.dumps(router.metrics(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import time
+import queue
+import bisect
+import threading
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+
+class Histogram:
+    """Histogram đơn giản với các ngưỡng cố định (giá trị > ngưỡng cuối rơi vào bucket '+Inf')"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Ước lượng phân vị bằng cận trên của bucket chứa nó"""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b:g}" for b in self.bounds] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "mean": round(self.sum / self.total, 3) if self.total else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3)
+        }
+
+
+class BatchingEmbeddings(Embeddings):
+    """Gom các lời gọi embed_query đến gần nhau (vài ms) thành 1 batch chạy qua model"""
+
+    def __init__(self, base: Embeddings, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.base = base
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_latency_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100, 250])
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Thread được tạo khi có yêu cầu đầu tiên (an toàn khi fork worker pool trước đó)
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, daemon=True, name="embedding-batcher")
+                    self._thread.start()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # Giữ đúng tham số encode của truy vấn nếu model phân biệt query/document
+        query_kwargs = getattr(self.base, "query_encode_kwargs", None)
+        if query_kwargs and hasattr(self.base, "_embed"):
+            return self.base._embed(texts, query_kwargs)
+        return self.base.embed_documents(texts)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch:
+                # Lấy ngay các yêu cầu đã xếp hàng (trong lúc batch trước đang chạy),
+                # chỉ chờ thêm khi hàng đợi trống và chưa quá max_wait
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining <= 0:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_latency_ms.observe((started - enqueued_at) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            try:
+                vectors = self._embed_batch([text for text, _, _ in batch])
+                for (_, future, _), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Danh sách tài liệu đã là một batch, không cần qua hàng đợi
+        return self.base.embed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size": self.batch_sizes.to_dict(),
+            "queue_latency_ms": self.queue_latency_ms.to_dict()
+        }
+
+    def report(self):
+        """In thống kê kích thước batch và độ trễ hàng đợi"""
+        stats = self.stats()
+        print("📦 EMBEDDING BATCHER")
+        print(f"   Số batch: {stats['batch_size']['count']}, kích thước TB: {stats['batch_size']['mean']}")
+        print(f"   Phân bố kích thước batch: {stats['batch_size']['buckets']}")
+        print(f"   Độ trễ hàng đợi (ms): p50={stats['queue_latency_ms']['p50']}, p99={stats['queue_latency_ms']['p99']}")
+
+
+_SHARED_BATCHERS: Dict[int, BatchingEmbeddings] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def get_shared_batcher(base: Embeddings, max_batch: int = 32, max_wait_ms: float = 5.0) -> BatchingEmbeddings:
+    """Trả về batcher dùng chung cho một embedding model (InterviewSystem, server và RAGtest.py dùng chung)"""
+    with _SHARED_LOCK:
+        batcher = _SHARED_BATCHERS.get(id(base))
+        if batcher is None:
+            batcher = BatchingEmbeddings(base, max_batch=max_batch, max_wait_ms=max_wait_ms)
+            _SHARED_BATCHERS[id(base)] = batcher
+        return batcher
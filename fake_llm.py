@@ -0,0 +1,226 @@
+import json
+import time
+import random
+import zlib
+import threading
+from typing import List, Dict, Any, Optional, Iterator
+
+# LLM giả lập Gemini để chạy load test / benchmark không cần mạng và API key.
+# Phản hồi được chọn theo loại prompt (nhận diện bằng từ khóa) và hoàn toàn tất định.
+
+_BEHAVIORAL = [
+    {"id": 1, "question": "Hãy kể về một lần bạn làm việc nhóm để vượt qua một thử thách khó.",
+     "category": "behavioral", "purpose": "Đánh giá kỹ năng làm việc nhóm", "related_to": "Câu hỏi 2"},
+    {"id": 2, "question": "Điều gì tạo động lực cho bạn khi nhóm gặp khó khăn?",
+     "category": "behavioral", "purpose": "Đánh giá động lực làm việc", "related_to": "Câu hỏi 1"},
+]
+_TECHNICAL = [
+    {"id": 3, "question": "Marketing mix (4P) gồm những thành phần nào?",
+     "category": "technical", "purpose": "Kiểm tra hiểu biết về khái niệm cơ bản", "related_to": "Câu hỏi 4,5",
+     "key_points": ["Sản phẩm", "Giá", "Phân phối", "Xúc tiến"]},
+    {"id": 4, "question": "Bạn áp dụng 4P cho một sản phẩm mới như thế nào?",
+     "category": "technical", "purpose": "Kiểm tra khả năng áp dụng kiến thức", "related_to": "Câu hỏi 3,5",
+     "key_points": ["Xác định khách hàng mục tiêu", "Định giá theo giá trị", "Chọn kênh phân phối",
+                    "Kế hoạch xúc tiến"]},
+    {"id": 5, "question": "So sánh chiến lược giá thâm nhập và giá hớt váng.",
+     "category": "technical", "purpose": "Kiểm tra khả năng phân tích và đánh giá", "related_to": "Câu hỏi 3,4",
+     "key_points": ["Giá thâm nhập: giá thấp để chiếm thị phần", "Giá hớt váng: giá cao lúc đầu",
+                    "Điều kiện áp dụng của từng chiến lược"]},
+]
+_PROJECT = [
+    {"id": 6, "question": "Hãy chia sẻ về dự án nổi bật nhất trong CV của bạn.",
+     "category": "cv_based", "purpose": "Hiểu rõ kinh nghiệm dự án", "related_to": "Câu hỏi 7"},
+    {"id": 7, "question": "Kết quả đo lường được của dự án đó là gì?",
+     "category": "cv_based", "purpose": "Đánh giá thành tích", "related_to": "Câu hỏi 6"},
+]
+_CREATIVE = {"id": 8, "question": "Nếu ngân sách marketing bị cắt 50%, bạn sẽ ưu tiên điều gì?",
+             "category": "creative", "purpose": "Kiểm tra khả năng giải quyết vấn đề và tư duy phản biện",
+             "related_to": "Kết hợp kiến thức từ CV và technical knowledge"}
+_CANDIDATE = {
+    "name": "Nguyen Van A", "email": "a@example.com", "phone": "", "position": "Intern Marketing",
+    "experience_years": 0, "education": "Đại học", "skills": ["Giao tiếp", "SEO"],
+    "summary": "Ứng viên giả lập cho kiểm thử hiệu năng."
+}
+_CORPUS = [
+    "Marketing mix gồm 4 thành phần: sản phẩm, giá, phân phối và xúc tiến.",
+    "Chiến lược giá thâm nhập đặt giá thấp để nhanh chóng chiếm thị phần.",
+    "Ứng viên tham gia dự án nghiên cứu thị trường và chiến dịch mạng xã hội.",
+    "Kỹ năng: giao tiếp, làm việc nhóm, thuyết trình, SEO cơ bản.",
+    "Phân khúc thị trường giúp doanh nghiệp tập trung vào nhóm khách hàng mục tiêu.",
+]
+
+
+def _fenced(obj: Any) -> str:
+    return "```json\n" + json.dumps(obj, ensure_ascii=False, indent=2) + "\n```"
+
+
+class FakeLLM:
+    """LLM giả lập với độ trễ cấu hình được và phản hồi JSON dựng sẵn (cùng interface invoke/stream)"""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, token_latency: float = 0.0,
+                 chunk_size: int = 16, seed: Optional[int] = 0, responses: Optional[Dict[str, str]] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.chunk_size = chunk_size
+        self.responses = responses or {}
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def kind(self, prompt: str) -> str:
+        """Nhận diện loại prompt dựa trên từ khóa trong prompt của hệ thống"""
+        text = prompt.lower()
+        if "chấm điểm câu trả lời" in text:
+            return "score"
+        if "trích xuất thông tin cá nhân" in text:
+            return "extract"
+        if "tạo 8 câu hỏi" in text:
+            return "full_set"
+        if "câu hỏi hành vi" in text:
+            return "behavioral"
+        if "câu hỏi kiểm tra kiến thức" in text:
+            return "technical"
+        if "dự án/kinh nghiệm" in text:
+            return "project"
+        if "câu hỏi sáng tạo" in text:
+            return "creative"
+        return "text"
+
+    def respond(self, prompt: str) -> str:
+        """Phản hồi dựng sẵn cho prompt (không có độ trễ)"""
+        kind = self.kind(prompt)
+        if kind in self.responses:
+            return self.responses[kind]
+        if kind == "score":
+            # Điểm tất định theo nội dung prompt để mỗi câu trả lời có điểm khác nhau
+            seed = zlib.crc32(prompt.encode("utf-8"))
+            criteria = [round(4 + ((seed >> (i * 4)) % 51) / 10, 1) for i in range(5)]
+            return _fenced({
+                **{f"criteria_{i + 1}": c for i, c in enumerate(criteria)},
+                "total": round(sum(criteria) / 5, 1),
+                "feedback": "Câu trả lời có cấu trúc rõ ràng, nên bổ sung thêm ví dụ cụ thể và số liệu."
+            })
+        if kind == "extract":
+            return _fenced(_CANDIDATE)
+        if kind == "full_set":
+            return _fenced(_BEHAVIORAL + _TECHNICAL + _PROJECT + [_CREATIVE])
+        if kind == "behavioral":
+            return _fenced(_BEHAVIORAL)
+        if kind == "technical":
+            return _fenced(_TECHNICAL)
+        if kind == "project":
+            return _fenced(_PROJECT)
+        if kind == "creative":
+            return _fenced(_CREATIVE)
+        return "Theo tài liệu, marketing mix gồm sản phẩm, giá, phân phối và xúc tiến."
+
+    def _sleep(self):
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def invoke(self, prompt: str, *args, **kwargs) -> str:
+        self.calls += 1
+        self._sleep()
+        return self.respond(prompt)
+
+    def stream(self, prompt: str, *args, **kwargs) -> Iterator[str]:
+        self.calls += 1
+        self._sleep()
+        text = self.respond(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield text[i:i + self.chunk_size]
+
+
+class FaultyLLM:
+    """Bọc một LLM (mặc định FakeLLM) và chèn lỗi tất định: ném lỗi, chậm bất thường hoặc treo (kiểm thử ResilientLLM)"""
+
+    def __init__(self, inner: Optional[Any] = None, error_rate: float = 0.1, slow_rate: float = 0.05,
+                 slow_latency: float = 5.0, hang_rate: float = 0.0, hang_latency: float = 300.0,
+                 fail_first: int = 0, seed: Optional[int] = 0):
+        self.inner = inner or FakeLLM()
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.hang_rate = hang_rate
+        self.hang_latency = hang_latency
+        # fail_first: các lời gọi đầu tiên luôn lỗi (mô phỏng model bị sập để kiểm tra circuit breaker)
+        self.fail_first = fail_first
+        self.calls = 0
+        self.injected: Dict[str, int] = {"error": 0, "slow": 0, "hang": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _fault(self) -> Optional[str]:
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.fail_first:
+                fault = "error"
+            else:
+                draw = self._rng.random()
+                if draw < self.error_rate:
+                    fault = "error"
+                elif draw < self.error_rate + self.hang_rate:
+                    fault = "hang"
+                elif draw < self.error_rate + self.hang_rate + self.slow_rate:
+                    fault = "slow"
+                else:
+                    fault = None
+            if fault:
+                self.injected[fault] += 1
+        if fault == "error":
+            raise ConnectionError("FaultyLLM: lỗi giả lập (503)")
+        if fault == "hang":
+            time.sleep(self.hang_latency)
+        elif fault == "slow":
+            time.sleep(self.slow_latency)
+        return fault
+
+    def invoke(self, prompt: str, *args, **kwargs) -> str:
+        self._fault()
+        return self.inner.invoke(prompt, *args, **kwargs)
+
+    def stream(self, prompt: str, *args, **kwargs) -> Iterator[str]:
+        self._fault()
+        yield from self.inner.stream(prompt, *args, **kwargs)
+
+
+class FakeDocument:
+    """Document tối giản (page_content + metadata) giống langchain Document"""
+
+    def __init__(self, page_content: str, metadata: Optional[Dict[str, Any]] = None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
+class FakeRetriever:
+    """Retriever giả lập trả về k đoạn văn từ một corpus nhỏ, có độ trễ cấu hình được"""
+
+    def __init__(self, corpus: Optional[List[str]] = None, k: int = 3, latency: float = 0.0):
+        self.corpus = corpus or _CORPUS
+        self.k = k
+        self.latency = latency
+
+    def get_relevant_documents(self, query: str, *args, **kwargs) -> List[FakeDocument]:
+        if self.latency:
+            time.sleep(self.latency)
+        start = zlib.crc32(query.encode("utf-8")) % len(self.corpus)
+        picked = [(start + i) % len(self.corpus) for i in range(min(self.k, len(self.corpus)))]
+        return [FakeDocument(self.corpus[i], {"source": f"fake_chunk_{i}"}) for i in picked]
+
+    invoke = get_relevant_documents
+
+
+class FakeResources:
+    """Bộ tài nguyên giả lập thay cho InterviewResources (không load model, không gọi mạng)"""
+
+    def __init__(self, llm_latency: float = 0.05, retrieval_latency: float = 0.0, llm: Optional[Any] = None):
+        self.api_key = ""
+        self.embeddings = None
+        self.cv_db = None
+        self.knowledge_db = None
+        self.llm = llm or FakeLLM(latency=llm_latency)
+        self.cv_retriever = FakeRetriever(latency=retrieval_latency)
+        self.knowledge_retriever = FakeRetriever(latency=retrieval_latency)
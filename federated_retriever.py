@@ -0,0 +1,283 @@
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+# Truy vấn song song nhiều nguồn (CV, các shard kiến thức, câu hỏi đã dùng) rồi gộp thành một top-k:
+#   - các câu truy vấn khác nhau được embed một lần (một batch), mọi FAISS store dùng chung vector đó
+#   - các nguồn chạy đồng thời trên thread pool: độ trễ cộng thêm ≈ nguồn chậm nhất thay vì tổng các nguồn
+#   - điểm được đưa về cùng thang cosine (FAISS L2 trên vector đã chuẩn hóa: cos = 1 - d/2);
+#     nguồn không trả điểm (retriever thường) được gán điểm theo thứ hạng; normalize="minmax" chuẩn hóa riêng từng nguồn
+#   - hạn mức theo nguồn: reserve = số kết quả tối thiểu luôn giữ, quota = tối đa trong top-k gộp
+#   - nguồn quá timeout bị bỏ qua, ghi vào thống kê trả về cùng kết quả (một instance dùng chung cho mọi phiên)
+#   python benchmarks/bench_federated.py
+
+Scored = Tuple[Any, float]
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    # Dùng chung cho mọi phiên; FAISS nhả GIL khi search nên các nguồn chạy song song thật sự
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="federated")
+        return _EXECUTOR
+
+
+def _distance_to_similarity(store, score: float) -> float:
+    """Khoảng cách/điểm thô của FAISS store → cosine (vector đã chuẩn hóa)"""
+    strategy = str(getattr(store, "distance_strategy", "EUCLIDEAN_DISTANCE"))
+    if "EUCLIDEAN" in strategy.upper():
+        # IndexFlatL2 trả về bình phương khoảng cách: ||a - b||² = 2 - 2cos
+        return 1.0 - float(score) / 2.0
+    return float(score)
+
+
+class Source:
+    """Một nguồn truy vấn; group dùng để chọn câu truy vấn và gom kết quả (vd: nhiều shard cùng group "knowledge")"""
+
+    # True: cần vector truy vấn đã embed sẵn (dùng chung giữa các nguồn)
+    needs_vector = False
+
+    def __init__(self, name: str, group: Optional[str] = None, k: int = 3, reserve: int = 0,
+                 quota: Optional[int] = None):
+        self.name = name
+        self.group = group or name
+        self.k = k
+        self.reserve = reserve
+        self.quota = quota
+
+    def search(self, query: str, vector: Optional[List[float]], k: int) -> List[Scored]:
+        raise NotImplementedError
+
+
+class VectorStoreSource(Source):
+    """FAISS store của LangChain: search bằng vector dùng chung; store chỉ có similarity_search_with_score
+    (vd: PoolRetriever của worker_pool) thì tự embed trong store"""
+
+    def __init__(self, name: str, store, **kwargs):
+        super().__init__(name, **kwargs)
+        self.store = store
+        self.needs_vector = hasattr(store, "similarity_search_with_score_by_vector")
+
+    def search(self, query: str, vector: Optional[List[float]], k: int) -> List[Scored]:
+        if self.needs_vector:
+            results = self.store.similarity_search_with_score_by_vector(vector, k=k)
+        else:
+            results = self.store.similarity_search_with_score(query, k=k)
+        return [(doc, _distance_to_similarity(self.store, score)) for doc, score in results]
+
+
+class RetrieverSource(Source):
+    """Retriever chỉ trả về Document theo thứ tự (không có điểm): điểm giảm dần theo thứ hạng"""
+
+    def __init__(self, name: str, retriever, top_score: float = 0.9, step: float = 0.02, **kwargs):
+        super().__init__(name, **kwargs)
+        self.retriever = retriever
+        self.top_score = top_score
+        self.step = step
+
+    def search(self, query: str, vector: Optional[List[float]], k: int) -> List[Scored]:
+        docs = self.retriever.get_relevant_documents(query)[:k]
+        return [(doc, self.top_score - self.step * rank) for rank, doc in enumerate(docs)]
+
+
+class QuestionBankSource(Source):
+    """Các câu hỏi đã lưu trong ngân hàng câu hỏi (vector .npy do question_dedup ghi cạnh file JSON).
+
+    Đọc lại khi file trong thư mục thay đổi (ngân hàng lớn dần trong lúc server chạy)."""
+
+    needs_vector = True
+
+    def __init__(self, root: str, name: str = "past_questions", category: Optional[str] = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.root = Path(root)
+        self.category = category
+        self.texts: List[Dict[str, Any]] = []
+        self.vectors = None
+        self._signature: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def _current_signature(self) -> tuple:
+        if not self.root.exists():
+            return ()
+        return tuple((path.name, path.stat().st_mtime_ns) for path in sorted(self.root.glob("*.npy")))
+
+    def refresh(self):
+        import numpy as np
+        from question_dedup import load_vectors
+
+        signature = self._current_signature()
+        with self._lock:
+            if signature == self._signature:
+                return
+            texts, blocks = [], []
+            for name, _ in signature:
+                path = (self.root / name).with_suffix(".json")
+                if not path.exists():
+                    continue
+                entry = json.loads(path.read_text(encoding="utf-8"))
+                if self.category and entry.get("key", {}).get("category") != self.category:
+                    continue
+                questions = entry.get("questions", [])
+                vectors = load_vectors(path.with_suffix(".npy"))
+                # Vector chỉ được ghi cho câu giữ lại sau khi lọc trùng: lệch số lượng thì bỏ qua khóa này
+                if vectors is None or len(vectors) != len(questions):
+                    continue
+                texts += [{"question": q.get("question", ""), "category": q.get("category", "")} for q in questions]
+                blocks.append(vectors)
+            self.texts = texts
+            self.vectors = np.concatenate(blocks).astype(np.float32) if blocks else None
+            self._signature = signature
+
+    def search(self, query: str, vector: Optional[List[float]], k: int) -> List[Scored]:
+        self.refresh()
+        texts, vectors = self.texts, self.vectors
+        if vectors is None or vector is None:
+            return []
+        import numpy as np
+        from langchain.schema import Document
+        query_vector = np.asarray(vector, dtype=np.float32)
+        # Vector của ngân hàng đã chuẩn hóa L2: tích vô hướng với vector truy vấn đã chuẩn hóa = cosine
+        similarities = vectors @ (query_vector / max(float(np.linalg.norm(query_vector)), 1e-12))
+        top = np.argsort(-similarities)[:k]
+        return [(Document(page_content=texts[i]["question"],
+                          metadata={"source": self.name, "category": texts[i]["category"]}),
+                 float(similarities[i])) for i in top]
+
+
+class FederatedRetriever:
+    """Fan-out song song tới các nguồn, chuẩn hóa điểm, gộp top-k theo hạn mức từng nguồn"""
+
+    def __init__(self, sources: List[Source], embeddings=None, timeout: float = 10.0, normalize: str = "cosine"):
+        self.sources = sources
+        self.embeddings = embeddings
+        self.timeout = timeout
+        self.normalize = normalize
+
+    def _embed(self, queries: List[str]) -> Dict[str, List[float]]:
+        distinct = list(dict.fromkeys(queries))
+        if not distinct or self.embeddings is None:
+            return {}
+        return dict(zip(distinct, self.embeddings.embed_documents(distinct)))
+
+    def search(self, query: Union[str, Dict[str, str]], k: int = 3,
+               reserve: Optional[Dict[str, int]] = None,
+               quota: Optional[Dict[str, int]] = None) -> Tuple[List[Tuple[Any, float, Source]], Dict[str, Any]]:
+        """(top-k gộp [(Document, điểm đã chuẩn hóa, nguồn)] sắp theo điểm giảm dần, thống kê của lần truy vấn này).
+
+        query: một câu cho mọi nguồn hoặc {group: câu}; reserve/quota theo group ghi đè giá trị của nguồn.
+        Thống kê: ms/hits/kept (hoặc error/timeout) theo nguồn, embed_ms, total_ms."""
+        queries = query if isinstance(query, dict) else {s.group: query for s in self.sources}
+        sources = [s for s in self.sources if s.group in queries]
+        stats: Dict[str, Any] = {}
+        started = time.perf_counter()
+        executor = _shared_executor()
+
+        def run(source: Source, vector: Optional[List[float]]) -> Tuple[List[Scored], float]:
+            # Không ghi vào stats ở thread của nguồn: nguồn quá timeout vẫn chạy tiếp sau khi search đã trả về
+            source_started = time.perf_counter()
+            results = source.search(queries[source.group], vector, max(source.k, k))
+            return results, round((time.perf_counter() - source_started) * 1000, 2)
+
+        # Nguồn tự embed chạy ngay, song song với bước embed chung của các nguồn còn lại
+        futures = {executor.submit(run, s, None): s for s in sources if not s.needs_vector}
+        vector_sources = [s for s in sources if s.needs_vector]
+        if vector_sources:
+            embed_started = time.perf_counter()
+            vectors = self._embed([queries[s.group] for s in vector_sources])
+            stats["embed_ms"] = round((time.perf_counter() - embed_started) * 1000, 2)
+            futures.update({executor.submit(run, s, vectors.get(queries[s.group])): s for s in vector_sources})
+
+        done, pending = wait(futures, timeout=max(0.0, self.timeout - (time.perf_counter() - started)))
+        per_source: Dict[str, List[Scored]] = {}
+        for future in done:
+            source = futures[future]
+            try:
+                per_source[source.name], ms = future.result()
+                stats[source.name] = {"ms": ms, "hits": len(per_source[source.name])}
+            except Exception as e:
+                stats[source.name] = {"error": f"{type(e).__name__}: {e}"}
+        for future in pending:
+            stats[futures[future].name] = {"timeout": True}
+
+        merged = self._merge(sources, per_source, k, reserve or {}, quota or {})
+        for _, _, source in merged:
+            stats[source.name]["kept"] = stats[source.name].get("kept", 0) + 1
+        stats["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return merged, stats
+
+    def _normalized(self, results: List[Scored]) -> List[Scored]:
+        if self.normalize != "minmax" or not results:
+            return results
+        scores = [score for _, score in results]
+        low, high = min(scores), max(scores)
+        return [(doc, (score - low) / (high - low) if high > low else 1.0) for doc, score in results]
+
+    def _merge(self, sources: List[Source], per_source: Dict[str, List[Scored]], k: int,
+               reserve: Dict[str, int], quota: Dict[str, int]) -> List[Tuple[Any, float, Source]]:
+        candidates = [(doc, float(score), source) for source in sources
+                      for doc, score in self._normalized(per_source.get(source.name, []))]
+
+        picked: List[Tuple[Any, float, Source]] = []
+        seen = set()
+        group_taken: Dict[str, int] = {}
+
+        def limit(source: Source) -> int:
+            value = quota.get(source.group, source.quota)
+            return k if value is None else value
+
+        def take(doc, score, source) -> bool:
+            # Cùng một chunk có thể nằm ở nhiều shard: chỉ giữ lần xuất hiện có điểm cao nhất
+            key = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+            if key in seen or group_taken.get(source.group, 0) >= limit(source):
+                return False
+            seen.add(key)
+            group_taken[source.group] = group_taken.get(source.group, 0) + 1
+            picked.append((doc, score, source))
+            return True
+
+        candidates.sort(key=lambda c: -c[1])
+        # 1. Phần giữ chỗ của từng group (kết quả tốt nhất của group đó)
+        for group in dict.fromkeys(s.group for s in sources):
+            need = reserve.get(group, max((s.reserve for s in sources if s.group == group), default=0))
+            for doc, score, source in candidates:
+                if group_taken.get(group, 0) >= min(need, k) or len(picked) >= k:
+                    break
+                if source.group == group:
+                    take(doc, score, source)
+        # 2. Phần còn lại theo điểm, không vượt quota
+        for doc, score, source in candidates:
+            if len(picked) >= k:
+                break
+            take(doc, score, source)
+
+        picked.sort(key=lambda p: -p[1])
+        return [(doc, round(score, 4), source) for doc, score, source in picked]
+
+
+def build_federated(resources, question_bank_dir: Optional[str] = None) -> FederatedRetriever:
+    """FederatedRetriever từ tài nguyên phỏng vấn: group "cv", "knowledge" (kèm các shard) và "questions"
+    (câu sáng tạo đã lưu trong question_bank_dir, tối đa 2 câu trong top-k gộp).
+
+    FAISS store được ưu tiên để mọi nguồn dùng chung một lần embed (qua worker pool nếu SharedIndexPool.attach);
+    không có store thì dùng retriever có similarity_search_with_score, cuối cùng là retriever thường."""
+    sources: List[Source] = []
+    for group, db, retriever in (("cv", resources.cv_db, resources.cv_retriever),
+                                 ("knowledge", resources.knowledge_db, resources.knowledge_retriever)):
+        if db is not None and hasattr(db, "similarity_search_with_score_by_vector"):
+            sources.append(VectorStoreSource(group, db, group=group))
+        elif hasattr(retriever, "similarity_search_with_score"):
+            sources.append(VectorStoreSource(group, retriever, group=group))
+        elif retriever is not None:
+            sources.append(RetrieverSource(group, retriever, group=group))
+    for name, db in (getattr(resources, "knowledge_shards", None) or {}).items():
+        sources.append(VectorStoreSource(name, db, group="knowledge"))
+    if question_bank_dir:
+        sources.append(QuestionBankSource(question_bank_dir, category="creative", group="questions", quota=2))
+    return FederatedRetriever(sources, getattr(resources, "embeddings", None))
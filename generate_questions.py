@@ -1,7 +1,10 @@
 import argparse
+import hashlib
 import json
 import os
 import re
+import time
+from datetime import timedelta
 from pathlib import Path
 from typing import List, Optional
 
@@ -10,6 +13,13 @@ from dotenv import load_dotenv
 from PIL import Image
 import pytesseract
 
+import prompts
+from cv_router import CVRouter, IMAGE_EXTS, VISION_PDF_DPI
+from llm_client import ResilientLLM
+from ocr_preprocess import OCRPreprocessor
+from token_utils import estimate_tokens
+from tracing import Tracer
+
 try:
 	from pypdf import PdfReader
 except Exception:  # pragma: no cover
@@ -29,6 +39,26 @@ TEXT_MODEL_CANDIDATES = [
 VISION_MODEL_CANDIDATES = [
     "gemini-2.5-flash"
 ]
+# Model dự phòng khi model chính lỗi liên tiếp (circuit breaker của ResilientLLM)
+FALLBACK_MODEL_CANDIDATES = [
+	"gemini-2.5-flash-lite"
+]
+# Deadline (giây) cho mỗi lần gọi Gemini, sau đó retry/chuyển model dự phòng
+LLM_TIMEOUT = 120.0
+# Hedge: gửi thêm một lời gọi khi chậm hơn p95 (tốn thêm một lời gọi có ảnh), bật bằng --hedge
+LLM_HEDGE = False
+# Gemini chỉ tạo cache tường minh khi phần nội dung đủ dài; ngắn hơn thì dựa vào cache tiền tố tự động
+EXPLICIT_CACHE_MIN_TOKENS = 1024
+EXPLICIT_CACHE_TTL = timedelta(hours=1)
+
+# Tiền xử lý ảnh trước OCR (chỉnh nghiêng, thu nhỏ, nhị phân hóa, OCR theo vùng); None = OCR ảnh gốc (mặc định)
+OCR_PREPROCESSOR: Optional[OCRPreprocessor] = None
+
+# Chọn OCR + prompt text hay gửi thẳng ảnh cho từng file (main() lưu trạng thái vào --out/cv_routes.json)
+ROUTER: Optional[CVRouter] = None
+
+# Span cho các bước đọc CV, gọi Gemini và parse JSON (xuất bằng --trace)
+TRACER = Tracer("generate_questions")
 
 
 def read_env() -> None:
@@ -71,10 +101,84 @@ def pick_supported_model(preferences: List[str]) -> Optional[str]:
 	return preferences[0] if preferences else None
 
 
+class GenaiModel:
+	"""Interface invoke(contents) cho genai.GenerativeModel để bọc bằng ResilientLLM"""
+
+	def __init__(self, model_name: str):
+		self.model_name = model_name
+		self.model = genai.GenerativeModel(model_name)
+		# Model gắn với cache tường minh theo fingerprint phần tĩnh (None: không tạo được cache)
+		self._cached_models = {}
+
+	def _cached_model(self, static: str):
+		key = hashlib.sha1(static.encode("utf-8")).hexdigest()
+		if key not in self._cached_models:
+			model = None
+			if estimate_tokens(static) >= EXPLICIT_CACHE_MIN_TOKENS:
+				try:
+					from google.generativeai import caching
+					cache = caching.CachedContent.create(model=self.model_name, system_instruction=static,
+														 ttl=EXPLICIT_CACHE_TTL)
+					model = genai.GenerativeModel.from_cached_content(cache)
+				except Exception as e:
+					print(f"Context cache unavailable for {self.model_name}: {e}")
+			self._cached_models[key] = model
+		return self._cached_models[key]
+
+	def invoke(self, contents, static: Optional[str] = None, **kwargs):
+		"""static: phần tĩnh của prompt (prompts.py), gửi đầu tiên hoặc đọc từ cache tường minh"""
+		options = {"request_options": {"timeout": LLM_TIMEOUT}}
+		if static is None:
+			return self.model.generate_content(contents, **options)
+		cached = self._cached_model(static)
+		if cached is not None:
+			return cached.generate_content(contents, **options)
+		# Phần tĩnh đứng đầu, giống nhau giữa các lần gọi nên Gemini cache được tiền tố
+		if isinstance(contents, str):
+			return self.model.generate_content(static + "\n\n" + contents, **options)
+		return self.model.generate_content([static, *contents], **options)
+
+
+_CLIENTS = {}
+
+
+def get_client(preferences: List[str]) -> ResilientLLM:
+	"""ResilientLLM (model chính + dự phòng) dùng chung cho mọi file trong một lần chạy"""
+	key = tuple(preferences)
+	if key not in _CLIENTS:
+		primary = pick_supported_model(preferences) or preferences[0]
+		fallback = pick_supported_model(FALLBACK_MODEL_CANDIDATES) or FALLBACK_MODEL_CANDIDATES[0]
+		_CLIENTS[key] = ResilientLLM(GenaiModel(primary), GenaiModel(fallback), timeout=LLM_TIMEOUT,
+									 hedge=LLM_HEDGE, names=[primary, fallback])
+	return _CLIENTS[key]
+
+
+def _record_ocr(span, report: dict) -> None:
+	# Số vùng, góc nghiêng, số ký tự và thời gian từng bước tiền xử lý/OCR
+	for key in ("chars", "regions", "skew"):
+		span.set(key, report[key])
+	for step, ms in report["timings_ms"].items():
+		span.set(f"{step}_ms", ms)
+
+
+def ocr_page(img: Image.Image, name: str = "") -> str:
+	if OCR_PREPROCESSOR is None:
+		return pytesseract.image_to_string(img)
+	with TRACER.span("ocr", file=name) as span:
+		text, report = OCR_PREPROCESSOR.ocr(img, name)
+		_record_ocr(span, report)
+	return text
+
+
 def ocr_image(image_path: Path) -> str:
 	try:
-		with Image.open(image_path) as img:
-			return pytesseract.image_to_string(img)
+		if OCR_PREPROCESSOR is None:
+			with Image.open(image_path) as img:
+				return pytesseract.image_to_string(img)
+		with TRACER.span("ocr", file=image_path.name) as span:
+			text, report = OCR_PREPROCESSOR.ocr_file(image_path)
+			_record_ocr(span, report)
+		return text
 	except pytesseract.TesseractNotFoundError:
 		return ""
 
@@ -93,8 +197,8 @@ def extract_text_from_pdf(pdf_path: Path) -> str:
 	if not any(chunk.strip() for chunk in text_chunks) and PDF2IMAGE_AVAILABLE:
 		try:
 			images = convert_from_path(str(pdf_path))
-			for img in images:
-				text = pytesseract.image_to_string(img)
+			for number, img in enumerate(images, 1):
+				text = ocr_page(img, f"{pdf_path.name}#{number}")
 				if text.strip():
 					text_chunks.append(text)
 		except Exception:
@@ -111,113 +215,63 @@ def extract_text_from_cv(path: Path) -> str:
 	raise ValueError(f"Unsupported file type: {suffix}")
 
 
-SYSTEM_PROMPT = (
-	"Bạn là một chuyên gia phỏng vấn nhân sự chuyên nghiệp.\n\n"
-	"Dựa trên CV của ứng viên sau:\n\n[CV_TEXT]\n\n"
-	"Và vị trí công việc mục tiêu: [JOB_TITLE]\n\n"
-	"Hãy tạo 8 câu hỏi phỏng vấn bằng tiếng Việt theo định dạng JSON có cấu trúc:\n"
-	"- 2 câu hỏi về hành vi (về làm việc nhóm, thách thức, động lực...)\n"
-	"- 3 câu hỏi kiến thức kỹ thuật liên quan đến công việc\n"
-	"- 2 câu hỏi cụ thể về các dự án hoặc kinh nghiệm trước đây của ứng viên được đề cập trong CV\n"
-	"- 1 câu hỏi sáng tạo / tình huống giả định để kiểm tra khả năng giải quyết vấn đề hoặc tư duy phản biện\n\n"
-	"Trả về theo định dạng JSON có cấu trúc nhất quán:\n"
-	"Đảm bảo mỗi câu hỏi có:\n"
-	"- id: số thứ tự (1-8)\n"
-	"- question: câu hỏi phỏng vấn thực tế\n"
-	"- category: 'behavioral', 'technical', 'cv_based', 'creative'\n"
-	"- purpose: giải thích ngắn gọn về mục đích đánh giá của câu hỏi này\n"
-	"Ví dụ:\n"
-		"[\n"
-	"  {\n"
-	"    \"id\": 1,\n"
-	"    \"question\": \"Hãy kể về một lần bạn phải làm việc nhóm để giải quyết một vấn đề khó khăn.\",\n"
-	"    \"category\": \"behavioral\",\n"
-	"    \"purpose\": \"Đánh giá kỹ năng làm việc nhóm và giải quyết vấn đề\"\n"
-	"  },\n"
-	"  {\n"
-	"    \"id\": 2,\n"
-	"    \"question\": \"Bạn thành thạo nhất những ngôn ngữ lập trình nào?\",\n"
-	"    \"category\": \"technical\",\n"
-	"    \"purpose\": \"Đánh giá kiến thức và chuyên môn kỹ thuật\"\n"
-	"  },\n"
-	"  {\n"
-	"    \"id\": 3,\n"
-	"    \"question\": \"Bạn có thể chia sẻ chi tiết về kinh nghiệm với dự án được đề cập trong CV của bạn không?\",\n"
-	"    \"category\": \"cv_based\",\n"
-	"    \"purpose\": \"Hiểu rõ kinh nghiệm dự án cụ thể và thành tựu\"\n"
-	"  },\n"
-	"  {\n"
-	"    \"id\": 4,\n"
-	"    \"question\": \"Bạn sẽ xử lý như thế nào khi nhóm của bạn không đồng ý về phương pháp kỹ thuật?\",\n"
-	"    \"category\": \"creative\",\n"
-	"    \"purpose\": \"Kiểm tra khả năng giải quyết xung đột và tư duy phản biện\"\n"
-	"  }\n"
-	"]\n\n"
-)
-
-
-def build_prompt(cv_text: str, job_title: str) -> str:
-	return SYSTEM_PROMPT.replace("[CV_TEXT]", cv_text.strip()[:40000]).replace("[JOB_TITLE]", job_title)
-
-
-def call_gemini_text(prompt: str) -> str:
-	model_name = pick_supported_model(TEXT_MODEL_CANDIDATES) or TEXT_MODEL_CANDIDATES[0]
-	model = genai.GenerativeModel(model_name)
-	response = model.generate_content(prompt)
+def _record_usage(span, response) -> None:
+	# Số token thật từ Gemini (cached_content_token_count > 0 nghĩa là trúng cache ngữ cảnh)
+	usage = getattr(response, "usage_metadata", None)
+	if usage is None:
+		return
+	span.set("prompt_tokens", int(getattr(usage, "prompt_token_count", 0) or 0))
+	span.set("response_tokens", int(getattr(usage, "candidates_token_count", 0) or 0))
+	cached = int(getattr(usage, "cached_content_token_count", 0) or 0)
+	span.set("cached_tokens", cached)
+	span.set("cache_hit", cached > 0)
+
+
+def call_gemini_text(cv_text: str, job_title: str) -> str:
+	client = get_client(TEXT_MODEL_CANDIDATES)
+	prompt = prompts.CV_QUESTION_SET
+	dynamic = prompt.dynamic(cv_text=cv_text.strip()[:40000], job_title=job_title)
+	with TRACER.span("llm.invoke", operation="text", model=client.names[0], prompt=prompt.id,
+					 prompt_tokens=prompt.static_tokens + estimate_tokens(dynamic)) as span:
+		response = client.invoke(dynamic, static=prompt.static)
+		_record_usage(span, response)
 	return response.text or ""
 
 
-def call_gemini_with_image(image_path: Path, job_title: str) -> str:
-	model_name = pick_supported_model(VISION_MODEL_CANDIDATES) or VISION_MODEL_CANDIDATES[0]
-	model = genai.GenerativeModel(model_name)
-	instruction = (
-		"Bạn là một chuyên gia phỏng vấn nhân sự chuyên nghiệp. Dựa trên hình ảnh CV sau và vị trí công việc mục tiêu: "
-		f"{job_title}. "
-		"Hãy trích xuất các chi tiết quan trọng từ CV và tạo 8 câu hỏi phỏng vấn bằng tiếng Việt theo định dạng JSON có cấu trúc nhất quán:\n"
-		"Tạo tổng cộng 8 câu hỏi:\n"
-		"- 2 câu hỏi về hành vi (về làm việc nhóm, thách thức, động lực...)\n"
-		"- 3 câu hỏi kiến thức kỹ thuật liên quan đến công việc\n"
-		"- 2 câu hỏi cụ thể về các dự án hoặc kinh nghiệm trước đây của ứng viên được đề cập trong CV\n"
-		"- 1 câu hỏi sáng tạo / tình huống giả định để kiểm tra khả năng giải quyết vấn đề hoặc tư duy phản biện\n\n"
-		"Đảm bảo mỗi câu hỏi có:\n"
-		"- id: số thứ tự (1-8)\n"
-		"- question: câu hỏi phỏng vấn thực tế\n"
-		"- category: một trong 'behavioral', 'technical', 'cv_based', 'creative'\n"
-		"- purpose: giải thích ngắn gọn về mục đích đánh giá của câu hỏi này\n"
-		"Ví dụ:\n"
-		"[\n"
-		"  {\n"
-		"    \"id\": 1,\n"
-		"    \"question\": \"Hãy kể về một lần bạn phải làm việc nhóm để giải quyết một vấn đề khó khăn.\",\n"
-		"    \"category\": \"behavioral\",\n"
-		"    \"purpose\": \"Đánh giá kỹ năng làm việc nhóm và giải quyết vấn đề\"\n"
-		"  },\n"
-		"  {\n"
-		"    \"id\": 2,\n"
-		"    \"question\": \"Bạn thành thạo nhất những ngôn ngữ lập trình nào?\",\n"
-		"    \"category\": \"technical\",\n"
-		"    \"purpose\": \"Đánh giá kiến thức và chuyên môn kỹ thuật\"\n"
-		"  },\n"
-		"  {\n"
-		"    \"id\": 3,\n"
-		"    \"question\": \"Bạn có thể chia sẻ chi tiết về kinh nghiệm với dự án được đề cập trong CV của bạn không?\",\n"
-		"    \"category\": \"cv_based\",\n"
-		"    \"purpose\": \"Hiểu rõ kinh nghiệm dự án cụ thể và thành tựu\"\n"
-		"  },\n"
-		"  {\n"
-		"    \"id\": 4,\n"
-		"    \"question\": \"Bạn sẽ xử lý như thế nào khi nhóm của bạn không đồng ý về phương pháp kỹ thuật?\",\n"
-		"    \"category\": \"creative\",\n"
-		"    \"purpose\": \"Kiểm tra khả năng giải quyết xung đột và tư duy phản biện\"\n"
-		"  }\n"
-		"]\n\n"
-	)
-	with Image.open(image_path) as img:
-		response = model.generate_content([instruction, img])
+def call_gemini_with_images(images: List[Image.Image], job_title: str) -> str:
+	client = get_client(VISION_MODEL_CANDIDATES)
+	prompt = prompts.IMAGE_QUESTION_SET
+	with TRACER.span("llm.invoke", operation="image", model=client.names[0], prompt=prompt.id,
+					 pages=len(images)) as span:
+		response = client.invoke([prompt.dynamic(job_title=job_title), *images], static=prompt.static)
+		_record_usage(span, response)
 	return response.text or ""
 
 
+def render_pdf_page(pdf_path: Path, dpi: int) -> Optional[Image.Image]:
+	"""Trang đầu của PDF (cho CVRouter thăm dò PDF scan)"""
+	pages = convert_from_path(str(pdf_path), dpi=dpi, first_page=1, last_page=1)
+	return pages[0] if pages else None
+
+
+def load_cv_images(path: Path) -> List[Image.Image]:
+	if path.suffix.lower() == ".pdf":
+		if not PDF2IMAGE_AVAILABLE:
+			raise RuntimeError("pdf2image is not installed; cannot render PDF pages for the vision route")
+		return convert_from_path(str(path), dpi=VISION_PDF_DPI)
+	with Image.open(path) as img:
+		img.load()
+		return [img.copy()]
+
+
 def try_parse_json(s: str) -> Optional[List[dict]]:
+	with TRACER.span("parse", operation="questions") as span:
+		parsed = _parse_json_candidates(s)
+		span.set("ok", parsed is not None)
+	return parsed
+
+
+def _parse_json_candidates(s: str) -> Optional[List[dict]]:
 	try:
 		return json.loads(s)
 	except Exception:
@@ -237,20 +291,42 @@ def try_parse_json(s: str) -> Optional[List[dict]]:
 	return None
 
 
-def process_file(file_path: Path, job_title: str, out_dir: Path) -> None:
+def get_router() -> CVRouter:
+	global ROUTER
+	if ROUTER is None:
+		ROUTER = CVRouter(pdf_renderer=render_pdf_page if PDF2IMAGE_AVAILABLE else None)
+	return ROUTER
+
+
+def process_file(file_path: Path, job_title: str, out_dir: Path, force_route: Optional[str] = None) -> None:
 	print(f"Processing: {file_path}")
-	cv_text = extract_text_from_cv(file_path)
-	prompt: Optional[str] = None
+	router = get_router()
+	with TRACER.span("route", file=file_path.name) as span:
+		decision = router.choose(file_path, force_route)
+		span.set("route", decision["route"])
+		span.set("cached", decision["cached"])
+	print(f"  route: {decision['route']}{' (cached)' if decision['cached'] else ''} - {decision['reason']}")
+	route = decision["route"]
+	if route == "vision" and file_path.suffix.lower() == ".pdf" and not PDF2IMAGE_AVAILABLE:
+		print("  Warning: pdf2image is not installed, falling back to text/OCR.")
+		route = "ocr"
 	raw: str = ""
-	if cv_text.strip():
-		prompt = build_prompt(cv_text=cv_text, job_title=job_title)
-		raw = call_gemini_text(prompt)
-	else:
-		if file_path.suffix.lower() in {".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif"}:
-			raw = call_gemini_with_image(file_path, job_title)
+	started = time.perf_counter()
+	if route in ("text", "ocr"):
+		with TRACER.span("extract_cv", file=file_path.name):
+			cv_text = extract_text_from_cv(file_path)
+		if cv_text.strip():
+			raw = call_gemini_text(cv_text, job_title)
+		elif file_path.suffix.lower() in IMAGE_EXTS or (file_path.suffix.lower() == ".pdf" and PDF2IMAGE_AVAILABLE):
+			# OCR không ra chữ: gửi ảnh, thời gian đo lại từ đầu cho đường vision
+			route = "vision"
+			started = time.perf_counter()
 		else:
 			print(f"Warning: No text extracted from {file_path.name}. Skipping.")
 			return
+	if route == "vision":
+		raw = call_gemini_with_images(load_cv_images(file_path), job_title)
+	router.record(decision, route, time.perf_counter() - started)
 	parsed = try_parse_json(raw)
 	if parsed is None:
 		print(f"Model did not return valid JSON for {file_path.name}. Saving raw.")
@@ -267,11 +343,22 @@ def main() -> None:
 	parser.add_argument("--cv_dir", default="CV", help="Directory containing CV files (images/pdf)")
 	parser.add_argument("--job", required=True, help="Target job title, e.g. 'Data Scientist'")
 	parser.add_argument("--out", default="outputs", help="Directory to write JSON outputs")
+	parser.add_argument("--trace", default=None, help="Write spans to this file (.jsonl or OTLP .json)")
+	parser.add_argument("--preprocess", action="store_true", help="Deskew/downscale/binarize images before OCR")
+	parser.add_argument("--ocr-regions", action="store_true", help="OCR each text region separately (implies --preprocess)")
+	parser.add_argument("--hedge", action="store_true", help="Send a duplicate Gemini call when one runs past p95 (extra cost)")
+	parser.add_argument("--route", choices=["auto", "ocr", "vision"], default="auto",
+						help="auto: pick OCR+text or direct vision per file by predicted latency")
 	args = parser.parse_args()
+	global OCR_PREPROCESSOR, ROUTER, LLM_HEDGE
+	LLM_HEDGE = args.hedge
+	if args.preprocess or args.ocr_regions:
+		OCR_PREPROCESSOR = OCRPreprocessor(regions=args.ocr_regions)
 	read_env()
 	cv_dir = Path(args.cv_dir)
 	out_dir = Path(args.out)
 	out_dir.mkdir(parents=True, exist_ok=True)
+	ROUTER = CVRouter(out_dir / "cv_routes.json", pdf_renderer=render_pdf_page if PDF2IMAGE_AVAILABLE else None)
 	if not cv_dir.exists():
 		raise FileNotFoundError(f"CV directory not found: {cv_dir}")
 	supported_exts = {".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".pdf"}
@@ -281,9 +368,18 @@ def main() -> None:
 		return
 	for f in sorted(files):
 		try:
-			process_file(f, args.job, out_dir)
+			process_file(f, args.job, out_dir, None if args.route == "auto" else args.route)
 		except Exception as e:
 			print(f"Error processing {f.name}: {e}")
+	print(json.dumps(TRACER.summary(), ensure_ascii=False, indent=2))
+	# Số file theo từng đường và độ trễ p50/p95 của ocr/vision
+	print(json.dumps(ROUTER.metrics(), ensure_ascii=False, indent=2))
+	for client in _CLIENTS.values():
+		# Retry, hedge, fallback và độ trễ p50/p95/p99 theo từng model
+		print(json.dumps(client.metrics(), ensure_ascii=False, indent=2))
+	if args.trace:
+		TRACER.export(args.trace)
+		print(f"Trace saved: {args.trace}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+# Kiểm tra sức khỏe FAISS index sau mỗi lần build (vector_db_cv, vector_db2chunk_nltk):
+#   - index_meta.json (builder ghi): model embedding, số chiều, chuẩn hóa, chunk_size/chunk_overlap
+#     phải khớp với model/cài đặt hiện tại; số chiều index khớp với vector của model
+#   - vector đã chuẩn hóa (norm ≈ 1) nếu meta ghi normalize; số vector khớp docstore
+#   - bộ truy vấn thăm dò cố định: độ trễ search p50/p99, recall@k so với tìm kiếm chính xác (IndexFlat)
+#   - so với hồ sơ của lần build trước (index_health.json): chậm hơn, recall thấp hơn hoặc đổi model/số chiều
+#     là hồi quy → builder giữ index cũ và thoát với mã 1
+#   python index_health.py vector_db2chunk_nltk
+#   python index_health.py vector_db_cv --embeddings index      # không cần model: truy vấn bằng vector có sẵn
+
+META_FILE = "index_meta.json"
+PROFILE_FILE = "index_health.json"
+DEFAULT_MODEL = "intfloat/multilingual-e5-large-instruct"
+PROBE_QUERIES = [
+    "marketing mix gồm những yếu tố nào",
+    "chiến lược giá thâm nhập thị trường",
+    "phân khúc thị trường và khách hàng mục tiêu",
+    "đo lường hiệu quả chiến dịch quảng cáo",
+    "định vị thương hiệu so với đối thủ cạnh tranh",
+    "kênh phân phối sản phẩm",
+    "kinh nghiệm làm việc và dự án đã tham gia",
+    "kỹ năng chuyên môn và học vấn của ứng viên",
+]
+# Sai số cho phép khi so với lần build trước
+LATENCY_TOLERANCE = 0.5      # p99 chậm hơn tối đa 50%...
+LATENCY_FLOOR_MS = 1.0       # ...hoặc tối đa 1ms (index nhỏ, số đo dưới 1ms dao động mạnh)
+RECALL_TOLERANCE = 0.01
+# Index xấp xỉ (IVF/HNSW) phải tìm được tối thiểu 90% kết quả của tìm kiếm chính xác
+MIN_RECALL = 0.9
+NORM_TOLERANCE = 1e-3
+
+
+def read_meta(index_dir: str) -> Optional[Dict[str, Any]]:
+    path = Path(index_dir) / META_FILE
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_meta(index_dir: str, **meta) -> Dict[str, Any]:
+    """Ghi index_meta.json cạnh index.faiss (gọi từ builder sau khi save_local)"""
+    meta = {**meta, "built_at": datetime.now().isoformat(timespec="seconds")}
+    with open(Path(index_dir) / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def read_profile(index_dir: str) -> Optional[Dict[str, Any]]:
+    path = Path(index_dir) / PROFILE_FILE
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _vectors(index) -> Optional[np.ndarray]:
+    """Toàn bộ vector trong index (None nếu loại index không cho đọc lại vector)"""
+    import faiss
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        pass
+    try:
+        # IVF: cần bảng tra id → vị trí
+        ivf = faiss.extract_index_ivf(index)
+        ivf.make_direct_map()
+        return index.reconstruct_n(0, index.ntotal)
+    except (RuntimeError, AttributeError):
+        return None
+
+
+def _percentile_ms(durations: List[float], q: float) -> float:
+    return round(float(np.percentile(np.array(durations) * 1000, q)), 4)
+
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+class HealthReport:
+    """Kết quả các kiểm tra; error làm hỏng lần build, warning chỉ in ra"""
+
+    def __init__(self, index_dir: str):
+        self.data: Dict[str, Any] = {"index": str(index_dir), "checks": []}
+
+    def check(self, name: str, ok: bool, detail: str, level: str = "error"):
+        self.data["checks"].append({"name": name, "ok": bool(ok), "level": level, "detail": detail})
+
+    @property
+    def failed(self) -> List[Dict[str, Any]]:
+        return [c for c in self.data["checks"] if not c["ok"] and c["level"] == "error"]
+
+    def print(self):
+        for c in self.data["checks"]:
+            icon = "✅" if c["ok"] else ("❌" if c["level"] == "error" else "⚠️")
+            print(f"{icon} {c['name']}: {c['detail']}")
+        latency = self.data.get("latency")
+        if latency:
+            print(f"⏱️ search p50={latency['search_p50_ms']}ms p99={latency['search_p99_ms']}ms"
+                  + (f", embed p50={latency['embed_p50_ms']}ms" if "embed_p50_ms" in latency else "")
+                  + f", recall@{self.data['k']}={self.data.get('recall')}")
+
+
+def check_index(index_dir: str, embeddings=None, expected: Optional[Dict[str, Any]] = None,
+                baseline: Optional[Dict[str, Any]] = None, k: int = 5, repeat: int = 20,
+                queries: Optional[List[str]] = None) -> HealthReport:
+    """Kiểm tra index trong index_dir. embeddings=None: truy vấn thăm dò bằng vector lấy mẫu từ index.
+
+    expected: meta mong đợi (model, chunk_size, chunk_overlap...); baseline: hồ sơ lần build trước."""
+    import faiss
+    index_dir = str(index_dir)
+    report = HealthReport(index_dir)
+    data = report.data
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    # Index nhỏ hơn k (vd: CV chỉ có vài chunk): recall@k được đo và báo cáo với k đã giới hạn
+    k = min(k, max(1, index.ntotal))
+    data.update({"ntotal": int(index.ntotal), "dim": int(index.d), "index_type": type(index).__name__,
+                 "metric": "inner_product" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2", "k": k})
+
+    # 1. Metadata của builder
+    meta = read_meta(index_dir)
+    data["meta"] = meta
+    if meta is None:
+        report.check("meta", False, f"Chưa có {META_FILE} (index build trước khi có kiểm tra này)", "warning")
+        meta = {}
+    else:
+        report.check("meta.dim", meta.get("dim") == index.d, f"meta {meta.get('dim')}, index {index.d}")
+        for key, value in (expected or {}).items():
+            if value is not None:
+                report.check(f"meta.{key}", meta.get(key) == value, f"index {meta.get(key)!r}, hiện tại {value!r}")
+    report.check("docstore", len(index_to_docstore_id) == index.ntotal,
+                 f"{index.ntotal} vector, {len(index_to_docstore_id)} id trong docstore")
+
+    # 2. Chuẩn hóa
+    vectors = _vectors(index)
+    if vectors is not None and len(vectors):
+        norms = np.linalg.norm(vectors, axis=1)
+        data["norm"] = {"min": round(float(norms.min()), 5), "max": round(float(norms.max()), 5)}
+        detail = f"norm trong [{data['norm']['min']}, {data['norm']['max']}]"
+        if meta.get("normalize", True):
+            report.check("normalized", bool(np.all(np.abs(norms - 1) <= NORM_TOLERANCE)), detail)
+        else:
+            report.check("normalized", True, detail + " (meta: không chuẩn hóa)")
+    elif vectors is None:
+        report.check("normalized", False, f"{type(index).__name__} không đọc lại được vector", "warning")
+
+    # 3. Truy vấn thăm dò: số chiều, độ trễ, recall so với tìm kiếm chính xác
+    latency: Dict[str, float] = {}
+    if embeddings is not None:
+        queries = queries or PROBE_QUERIES
+        durations, query_vectors = [], []
+        for q in queries:
+            started = time.perf_counter()
+            query_vectors.append(embeddings.embed_query(q))
+            durations.append(time.perf_counter() - started)
+        latency["embed_p50_ms"] = _percentile_ms(durations, 50)
+        query_matrix = np.array(query_vectors, dtype=np.float32)
+        report.check("query.dim", query_matrix.shape[1] == index.d,
+                     f"model cho vector {query_matrix.shape[1]} chiều, index {index.d} chiều")
+        if query_matrix.shape[1] != index.d:
+            return report
+    else:
+        if vectors is None or not len(vectors):
+            report.check("probe", False, "Không có vector để làm truy vấn thăm dò", "warning")
+            return report
+        rng = np.random.default_rng(0)
+        picked = rng.choice(len(vectors), size=min(len(PROBE_QUERIES), len(vectors)), replace=False)
+        noise = rng.normal(scale=0.01, size=(len(picked), index.d)).astype(np.float32)
+        query_matrix = vectors[picked] + noise
+        queries = [f"vector #{i}" for i in picked]
+
+    durations = []
+    for _ in range(repeat):
+        for row in query_matrix:
+            started = time.perf_counter()
+            index.search(row[None, :], k)
+            durations.append(time.perf_counter() - started)
+    latency.update({"search_p50_ms": _percentile_ms(durations, 50), "search_p99_ms": _percentile_ms(durations, 99)})
+    data["latency"] = latency
+
+    _, found = index.search(query_matrix, k)
+    if vectors is not None:
+        exact = faiss.IndexFlat(index.d, index.metric_type)
+        exact.add(vectors)
+        _, truth = exact.search(query_matrix, k)
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+        data["recall"] = round(hits / truth.size, 4)
+        report.check("recall", data["recall"] >= MIN_RECALL, f"recall@{k} {data['recall']} (tối thiểu {MIN_RECALL})")
+
+    # Mã băm nội dung top-k của từng truy vấn: so giữa các lần build để thấy kết quả trôi (drift)
+    data["probe_top"] = {
+        q: [_chunk_hash(docstore.search(index_to_docstore_id[i]).page_content) for i in row if i != -1]
+        for q, row in zip(queries, found.tolist())
+    }
+
+    if baseline:
+        compare(report, baseline)
+    return report
+
+
+def compare(report: HealthReport, baseline: Dict[str, Any]):
+    """Hồi quy so với hồ sơ lần build trước: đổi số chiều/model, p99 chậm hơn, recall thấp hơn"""
+    data = report.data
+    report.check("baseline.dim", data["dim"] == baseline.get("dim"), f"trước {baseline.get('dim')}, nay {data['dim']}")
+    old_model = (baseline.get("meta") or {}).get("model")
+    new_model = (data.get("meta") or {}).get("model")
+    if old_model and new_model:
+        report.check("baseline.model", old_model == new_model, f"trước {old_model}, nay {new_model}")
+
+    old_latency, new_latency = baseline.get("latency") or {}, data.get("latency") or {}
+    if "search_p99_ms" in old_latency and "search_p99_ms" in new_latency:
+        old, new = old_latency["search_p99_ms"], new_latency["search_p99_ms"]
+        limit = max(old * (1 + LATENCY_TOLERANCE), old + LATENCY_FLOOR_MS)
+        report.check("baseline.latency", new <= limit, f"p99 {old}ms → {new}ms (giới hạn {limit:.3f}ms)")
+    if baseline.get("recall") is not None and data.get("recall") is not None:
+        report.check("baseline.recall", data["recall"] >= baseline["recall"] - RECALL_TOLERANCE,
+                     f"recall@{data['k']} {baseline['recall']} → {data['recall']}")
+
+    old_top, new_top = baseline.get("probe_top") or {}, data.get("probe_top") or {}
+    shared = [q for q in new_top if q in old_top and not q.startswith("vector #")]
+    if shared:
+        # Đổi chunk_size hoặc tài liệu nguồn làm kết quả đổi hẳn: chỉ cảnh báo, không chặn build
+        overlap = np.mean([len(set(old_top[q]) & set(new_top[q])) / max(1, len(old_top[q])) for q in shared])
+        data["probe_overlap"] = round(float(overlap), 4)
+        report.check("baseline.drift", overlap >= 0.5, f"top-{data['k']} trùng {overlap:.0%} với lần build trước",
+                     "warning")
+    if baseline.get("ntotal"):
+        change = data["ntotal"] / baseline["ntotal"] - 1
+        report.check("baseline.ntotal", abs(change) <= 0.5,
+                     f"{baseline['ntotal']} → {data['ntotal']} vector ({change:+.0%})", "warning")
+
+
+def save_profile(index_dir: str, report: HealthReport):
+    profile = {**report.data, "created_at": datetime.now().isoformat(timespec="seconds")}
+    with open(Path(index_dir) / PROFILE_FILE, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+
+
+def finalize_build(vectorstore, save_dir: str, embeddings, meta: Dict[str, Any], force: bool = False):
+    """Lưu index vào thư mục tạm, kiểm tra so với lần build trước rồi mới thay thế save_dir.
+
+    Có hồi quy (và không force): giữ nguyên index cũ, index mới để ở <save_dir>.new, thoát với mã 1."""
+    save_dir = Path(save_dir)
+    staging = save_dir.with_name(save_dir.name + ".new")
+    if staging.exists():
+        shutil.rmtree(staging)
+    vectorstore.save_local(str(staging))
+    write_meta(str(staging), **meta, dim=int(vectorstore.index.d), ntotal=int(vectorstore.index.ntotal))
+
+    print("🩺 Kiểm tra index mới...")
+    report = check_index(str(staging), embeddings, baseline=read_profile(str(save_dir)))
+    report.print()
+    if report.failed and not force:
+        raise SystemExit(f"❌ Index mới không đạt ({', '.join(c['name'] for c in report.failed)}); "
+                         f"giữ index cũ ở {save_dir}, index mới ở {staging} (bỏ qua bằng --force)")
+    save_profile(str(staging), report)
+
+    old = save_dir.with_name(save_dir.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if save_dir.exists():
+        os.replace(save_dir, old)
+    os.replace(staging, save_dir)
+    if old.exists():
+        shutil.rmtree(old)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra sức khỏe và độ trễ truy vấn của FAISS index")
+    parser.add_argument("index_dir", help="Thư mục index (vd: vector_db2chunk_nltk)")
+    parser.add_argument("--embeddings", choices=["e5", "synthetic", "index"], default="e5",
+                        help="index: không load model, truy vấn thăm dò bằng vector có sẵn trong index")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model embedding hiện tại")
+    parser.add_argument("--chunk-size", type=int, help="chunk_size hiện tại (so với meta)")
+    parser.add_argument("--chunk-overlap", type=int, help="chunk_overlap hiện tại (so với meta)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20, help="Số lần lặp mỗi truy vấn khi đo độ trễ")
+    parser.add_argument("--baseline", help="Hồ sơ để so sánh (mặc định: index_health.json trong thư mục index)")
+    parser.add_argument("--save", action="store_true", help="Ghi kết quả làm hồ sơ mới của index")
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    if not (Path(args.index_dir) / "index.faiss").exists():
+        print(f"❌ Không tìm thấy {Path(args.index_dir) / 'index.faiss'}")
+        sys.exit(1)
+
+    embeddings = None
+    if args.embeddings == "synthetic":
+        sys.path.insert(0, str(Path(__file__).resolve().parent / "benchmarks"))
+        from bench_worker_pool import SyntheticEmbeddings
+        embeddings = SyntheticEmbeddings(rounds=1)
+    elif args.embeddings == "e5":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(
+            model_name=args.model,
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"normalize_embeddings": True}
+        )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        baseline = read_profile(args.index_dir)
+
+    expected = {"chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap}
+    if embeddings is not None:
+        expected["model"] = args.model if args.embeddings == "e5" else None
+    report = check_index(args.index_dir, embeddings, expected=expected, baseline=baseline,
+                         k=args.k, repeat=args.repeat)
+    report.print()
+    if args.output:
+        Path(args.output).write_text(json.dumps(report.data, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save and not report.failed:
+        save_profile(args.index_dir, report)
+        print(f"💾 {Path(args.index_dir) / PROFILE_FILE}")
+    if report.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
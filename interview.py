@@ -1,22 +1,38 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
+import time
+import argparse
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 from pathlib import Path
 from datetime import datetime
-
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import GoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain.schema import Document
+from concurrent.futures import ThreadPoolExecutor
 
 from GetApikey import loadapi
+from question_bank import QuestionBank, SHARED_CANDIDATE, candidate_hash, index_version
+from streaming_scoring import ScoreStream, score_from_fields
+import prompts
+from token_utils import estimate_tokens
+from results_store import DEFAULT_DB, open_store
 
+# langchain/torch/Gemini chỉ được import trong các hàm cần đến chúng, để `--help` và `--replay`
+# khởi động nhanh (kiểm tra bằng: python benchmarks/check_import_time.py)
+if TYPE_CHECKING:
+    from langchain.schema import Document
 
-class InterviewSystem:
-    def __init__(self):
-        """Khởi tạo hệ thống phỏng vấn với 2 vector database"""
-        self.api_key = loadapi()
+
+class InterviewResources:
+    """Tài nguyên dùng chung giữa các phiên phỏng vấn: embedding model, 2 vector database và LLM"""
+    
+    def __init__(self, api_key: Optional[str] = None, llm=None, batch_embeddings: bool = False,
+                 max_batch: int = 32, max_wait_ms: float = 5.0, resilient: bool = True,
+                 fallback_model: Optional[str] = "gemini-2.5-flash-lite", llm_timeout: float = 60.0,
+                 knowledge_shards: Optional[List[str]] = None, hedge: bool = False):
+        from langchain_community.vectorstores import FAISS
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from embedding_batcher import get_shared_batcher
+
+        self.api_key = api_key or loadapi()
         
         # Khởi tạo embeddings
         self.embeddings = HuggingFaceEmbeddings(
@@ -24,6 +40,9 @@ class InterviewSystem:
             model_kwargs={"device": "cpu"},
             encode_kwargs={"normalize_embeddings": True}
         )
+        if batch_embeddings:
+            # Gom các truy vấn đồng thời thành 1 batch (nhiều phiên phỏng vấn cùng lúc)
+            self.embeddings = get_shared_batcher(self.embeddings, max_batch=max_batch, max_wait_ms=max_wait_ms)
         
         # Load vector databases
         self.cv_db = FAISS.load_local(
@@ -36,17 +55,64 @@ class InterviewSystem:
             self.embeddings, 
             allow_dangerous_deserialization=True
         )
+        # Các shard kiến thức bổ sung (truy vấn song song cùng knowledge_db qua federated_retriever)
+        self.knowledge_shards = {
+            Path(shard).name: FAISS.load_local(shard, self.embeddings, allow_dangerous_deserialization=True)
+            for shard in knowledge_shards or []
+        }
         
         # Khởi tạo Gemini LLM
-        self.llm = GoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=self.api_key,
-            temperature=0.7
-        )
+        fallback = None
+        if llm is None:
+            from langchain_google_genai import GoogleGenerativeAI
+            # Retry do ResilientLLM đảm nhận (có deadline), tắt retry nội bộ để không nhân số lần gọi
+            llm = GoogleGenerativeAI(
+                model="gemini-2.5-flash",
+                google_api_key=self.api_key,
+                temperature=0.7,
+                max_retries=0 if resilient else 6
+            )
+            if resilient and fallback_model:
+                fallback = GoogleGenerativeAI(model=fallback_model, google_api_key=self.api_key,
+                                              temperature=0.7, max_retries=0)
+        if resilient:
+            # Deadline, retry có jitter, hedged request và circuit breaker chuyển sang model dự phòng
+            from llm_client import ResilientLLM
+            llm = ResilientLLM(llm, fallback, timeout=llm_timeout, hedge=hedge,
+                               names=["gemini-2.5-flash", fallback_model] if fallback is not None else None)
+        self.llm = llm
         
         # Khởi tạo retriever
         self.cv_retriever = self.cv_db.as_retriever(search_kwargs={"k": 3})
         self.knowledge_retriever = self.knowledge_db.as_retriever(search_kwargs={"k": 3})
+
+
+class InterviewSystem:
+    def __init__(self, question_bank_dir: Optional[str] = "question_bank", stream_scoring: bool = False,
+                 prefetch_scoring: bool = True, prefetch_next: bool = True,
+                 resources: Optional[InterviewResources] = None, trace_path: Optional[str] = None,
+                 results_db: Optional[str] = DEFAULT_DB, export_json: bool = False,
+                 dedup_threshold: Optional[float] = 0.95, prescore: bool = False, adaptive: bool = False,
+                 federated: bool = True):
+        """Khởi tạo hệ thống phỏng vấn với 2 vector database"""
+        # Dùng chung tài nguyên nếu được truyền vào (vd: server nhiều phiên)
+        resources = resources or InterviewResources()
+        self.resources = resources
+        self.api_key = resources.api_key
+        self.embeddings = resources.embeddings
+        self.cv_db = resources.cv_db
+        self.knowledge_db = resources.knowledge_db
+        self.llm = resources.llm
+        self.cv_retriever = resources.cv_retriever
+        self.knowledge_retriever = resources.knowledge_retriever
+        
+        # Truy vấn song song CV + kiến thức (và các shard) cho câu sáng tạo và context chấm điểm;
+        # câu sáng tạo còn tìm các câu sáng tạo đã lưu (cần vector do bộ lọc trùng ghi) để tránh hỏi lặp ý
+        self.federated = None
+        if federated:
+            from federated_retriever import build_federated
+            has_vectors = dedup_threshold is not None and self.embeddings is not None
+            self.federated = build_federated(resources, question_bank_dir if has_vectors else None)
         
         # Lưu trữ câu hỏi và điểm số
         self.questions = []
@@ -55,6 +121,16 @@ class InterviewSystem:
         self.total_score = 0
         self.max_possible_score = 0  # Tổng điểm tối đa có thể đạt được
         
+        # Chấm điểm dạng streaming và thời gian phản hồi của từng câu
+        self.stream_scoring = stream_scoring
+        self.scoring_timings = []
+        
+        # Truy vấn trước context chấm điểm (câu hiện tại và tùy chọn câu kế tiếp)
+        self.prefetch_scoring = prefetch_scoring
+        self.prefetch_next = prefetch_next
+        self._prefetch_executor = None
+        self._prefetched_contexts = {}
+        
         # Thông tin thí sinh
         self.candidate_info = {
             "name": "",
@@ -71,6 +147,36 @@ class InterviewSystem:
         
         # Thời gian bắt đầu phỏng vấn
         self.interview_start_time = None
+        
+        # Ngân hàng câu hỏi dùng lại giữa các phiên (None để luôn tạo mới)
+        # Câu hỏi mới gần trùng nghĩa (cosine ≥ dedup_threshold) với câu đã có bị loại, không lưu vào ngân hàng
+        dedup = None
+        if question_bank_dir and dedup_threshold is not None and self.embeddings is not None:
+            from question_dedup import QuestionDeduplicator
+            dedup = QuestionDeduplicator(self.embeddings, dedup_threshold)
+        self.question_bank = QuestionBank(question_bank_dir, dedup=dedup) if question_bank_dir else None
+        
+        # Chấm sơ bộ bằng embedding: câu trả lời trống/lạc đề được chấm ở máy, không gọi LLM
+        self.prescorer = None
+        if prescore and self.embeddings is not None:
+            from prescore import PreScorer
+            self.prescorer = PreScorer(self.embeddings)
+        self.knowledge_version = index_version("vector_db2chunk_nltk")
+        self.cv_text = ""
+        
+        # Đo thời gian, token, cache hit và retry của từng bước (xuất kèm file kết quả)
+        from tracing import Tracer
+        self.tracer = Tracer("interview")
+        self._trace_handler = self.tracer.callback_handler()
+        self.trace_path = trace_path
+        
+        # Kết quả lưu vào kho SQLite; export_json=True ghi thêm file JSON từng phiên như trước
+        self.results_db = results_db
+        self.export_json = export_json or not results_db
+        
+        # Phỏng vấn thích ứng: chọn câu tiếp theo theo điểm đã có và dừng sớm khi mức đánh giá đã rõ
+        self.adaptive = adaptive
+        self.adaptive_summary = None
     
     def extract_candidate_info_from_cv(self):
         """Trích xuất thông tin thí sinh từ CV bằng AI"""
@@ -90,41 +196,18 @@ class InterviewSystem:
             if not cv_content.strip():
                 print("❌ File CV trống. Vui lòng kiểm tra nội dung file.")
                 return False
+            self.cv_text = cv_content
             
             # Sử dụng AI để trích xuất thông tin
-            extraction_prompt = f"""
-            Hãy trích xuất thông tin cá nhân từ CV sau đây:
-            
-            {cv_content}
-            
-            Trả về JSON format với các thông tin sau:
-            {{
-                "name": "Họ và tên đầy đủ",
-                "email": "Địa chỉ email nếu có",
-                "phone": "Số điện thoại nếu có", 
-                "position": "Vị trí ứng tuyển hoặc mục tiêu nghề nghiệp",
-                "experience_years": số_năm_kinh_nghiệm,
-                "education": "Trường học hoặc bằng cấp",
-                "skills": ["kỹ năng 1", "kỹ năng 2", ...],
-                "summary": "Tóm tắt ngắn gọn về ứng viên"
-            }}
-            
-            Lưu ý:
-            - Nếu không tìm thấy thông tin nào, để trống string hoặc 0 cho số
-            - experience_years phải là số nguyên
-            - skills phải là array các string
-            - Chỉ trả về JSON, không có text khác
-            """
-            
-            response = self.llm.invoke(extraction_prompt)
+            response = self._invoke_prompt(prompts.EXTRACT_CANDIDATE, "extract_candidate", cv_content=cv_content)
             
             # Parse JSON response
             try:
                 import re
-                json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                if json_match:
-                    extracted_info = json.loads(json_match.group())
-                    
+                with self.tracer.span("parse", operation="candidate_info"):
+                    json_match = re.search(r'\{.*\}', response, re.DOTALL)
+                    extracted_info = json.loads(json_match.group()) if json_match else None
+                if extracted_info is not None:
                     # Cập nhật thông tin thí sinh
                     self.candidate_info.update({
                         "name": extracted_info.get("name", ""),
@@ -192,6 +275,13 @@ class InterviewSystem:
         
     def generate_questions(self) -> List[Dict[str, Any]]:
         """Tạo 8 câu hỏi phỏng vấn từ 2 vector database"""
+        self.questions = self.build_question_set(self.candidate_info, self.cv_text)
+        return self.questions
+    
+    def build_question_set(self, candidate_info: Dict[str, Any], cv_text: str = "") -> List[Dict[str, Any]]:
+        """Tạo bộ câu hỏi cho một thí sinh mà không thay đổi trạng thái phiên"""
+        if self.question_bank is not None:
+            return self._generate_questions_from_bank(candidate_info, cv_text)
         
         # 1. Tạo 2 câu hỏi hành vi từ CV
         behavioral_questions = self._generate_behavioral_questions()
@@ -209,187 +299,141 @@ class InterviewSystem:
         all_questions = behavioral_questions + technical_questions + project_questions
         all_questions.append(creative_question)
         
-        self.questions = all_questions
+        return all_questions
+    
+    def _generate_questions_from_bank(self, candidate_info: Dict[str, Any], cv_text: str = "") -> List[Dict[str, Any]]:
+        """Lấy câu hỏi từ ngân hàng câu hỏi, chỉ gọi LLM cho phần còn thiếu"""
+        candidate = candidate_hash(cv_text, candidate_info)
+        position = candidate_info.get("position", "") or "general"
+        
+        def take(category, n, generate, shared=False):
+            owner = SHARED_CANDIDATE if shared else candidate
+            with self.tracer.span("question_bank.take", operation=category) as span:
+                def counted_generate():
+                    span.add("generations")
+                    return generate()
+                
+                questions = self.question_bank.take(owner, position, self.knowledge_version, category, n,
+                                                    counted_generate, served_by=candidate)
+                generations = span.attributes.get("generations", 0)
+                span.set("cache_hit", generations == 0)
+                span.set("retries", max(0, generations - 1))
+                return questions
+        
+        # Câu kỹ thuật dùng chung cho mọi ứng viên cùng vị trí, các câu còn lại gắn với CV
+        plan = [
+            ("behavioral", 2, self._generate_behavioral_questions, False),
+            ("technical", 3, self._generate_technical_questions, True),
+            ("cv_based", 2, self._generate_project_questions, False),
+            ("creative", 1, lambda: [self._generate_creative_question()], False),
+        ]
+        all_questions, categories = [], []
+        for category, n, generate, shared in plan:
+            questions = take(category, n, generate, shared)
+            all_questions += questions
+            categories += [category] * len(questions)
+        
+        # Câu trùng nghĩa với một câu khác loại đứng trước trong phiên được thay bằng câu khác cùng loại
+        dedup = self.question_bank.dedup
+        if dedup is not None and len(all_questions) > 1:
+            generators = {category: (generate, shared) for category, _, generate, shared in plan}
+            with self.tracer.span("question_dedup") as span:
+                duplicates = dedup.duplicates(all_questions)
+                span.set("duplicates", len(duplicates))
+                for i in duplicates:
+                    replacement = take(categories[i], 1, *generators[categories[i]])
+                    if replacement:
+                        all_questions[i] = replacement[0]
+        
+        # Đánh lại số thứ tự 1-8 theo thứ tự phỏng vấn
+        for i, question in enumerate(all_questions, 1):
+            question["id"] = i
+            question.pop("batch", None)
+        
         return all_questions
     
     def _generate_behavioral_questions(self) -> List[Dict[str, Any]]:
         """Tạo 2 câu hỏi hành vi từ CV database"""
         # Tìm thông tin về kỹ năng mềm, kinh nghiệm làm việc nhóm
-        cv_docs = self.cv_retriever.get_relevant_documents("kỹ năng giao tiếp làm việc nhóm thách thức động lực")
-        
-        prompt_template = """
-        Dựa trên thông tin CV sau:
-        {cv_content}
-        
-        Hãy tạo 2 câu hỏi hành vi (behavioral) liên quan đến nhau về:
-        - Làm việc nhóm
-        - Xử lý thách thức
-        - Động lực làm việc
-        
-        Trả về JSON format:
-        [
-            {{
-                "id": 1,
-                "question": "Câu hỏi 1",
-                "category": "behavioral",
-                "purpose": "Mục đích đánh giá",
-                "related_to": "Câu hỏi liên quan đến câu hỏi 2"
-            }},
-            {{
-                "id": 2,
-                "question": "Câu hỏi 2", 
-                "category": "behavioral",
-                "purpose": "Mục đích đánh giá",
-                "related_to": "Câu hỏi liên quan đến câu hỏi 1"
-            }}
-        ]
-        """
+        cv_docs = self._retrieve(self.cv_retriever, "kỹ năng giao tiếp làm việc nhóm thách thức động lực", "behavioral")
         
         cv_content = "\n".join([doc.page_content for doc in cv_docs])
-        prompt = PromptTemplate(template=prompt_template, input_variables=["cv_content"])
-        formatted_prompt = prompt.format(cv_content=cv_content)
-        
-        response = self.llm.invoke(formatted_prompt)
+        response = self._invoke_prompt(prompts.BEHAVIORAL, "behavioral", cv_content=cv_content)
         return self._parse_json_response(response)
     
     def _generate_technical_questions(self) -> List[Dict[str, Any]]:
         """Tạo 3 câu hỏi kỹ thuật từ knowledge database dựa trên kiến thức cụ thể"""
-        # Tìm kiến thức cụ thể từ knowledge database để tạo câu hỏi
-        knowledge_docs = self.knowledge_retriever.get_relevant_documents("kiến thức chuyên môn lý thuyết bài học")
-        
-        prompt_template = """
-        Dựa trên kiến thức chuyên môn sau đây từ tài liệu học tập:
-        {knowledge_content}
-        
-        Hãy tạo 3 câu hỏi kiểm tra kiến thức liên quan đến nhau về:
-        - Kiến thức lý thuyết từ tài liệu
-        - Khái niệm và định nghĩa
-        - Ứng dụng thực tế của kiến thức
-        
-        Yêu cầu:
-        - Câu hỏi phải dựa trực tiếp vào nội dung kiến thức đã cho
-        - Kiểm tra khả năng hiểu và áp dụng kiến thức
-        - Các câu hỏi phải liên quan đến nhau và cùng chủ đề
-        
-        Trả về JSON format:
-        [
-            {{
-                "id": 3,
-                "question": "Câu hỏi kiến thức 1 (dựa trên nội dung tài liệu)",
-                "category": "technical",
-                "purpose": "Kiểm tra hiểu biết về khái niệm cơ bản",
-                "related_to": "Liên quan đến câu hỏi 4,5 về cùng chủ đề"
-            }},
-            {{
-                "id": 4,
-                "question": "Câu hỏi kiến thức 2 (ứng dụng thực tế)",
-                "category": "technical", 
-                "purpose": "Kiểm tra khả năng áp dụng kiến thức",
-                "related_to": "Liên quan đến câu hỏi 3,5"
-            }},
-            {{
-                "id": 5,
-                "question": "Câu hỏi kiến thức 3 (phân tích sâu)",
-                "category": "technical",
-                "purpose": "Kiểm tra khả năng phân tích và đánh giá", 
-                "related_to": "Liên quan đến câu hỏi 3,4"
-            }}
-        ]
-        """
+        # Tìm kiến thức cụ thể từ knowledge database để tạo câu hỏi (giữ lại id chunk để chấm điểm sau này)
+        knowledge_docs, chunk_ids = self._retrieve_with_ids(
+            self.knowledge_db, self.knowledge_retriever, "kiến thức chuyên môn lý thuyết bài học", "technical"
+        )
         
         knowledge_content = "\n".join([doc.page_content for doc in knowledge_docs])
-        prompt = PromptTemplate(template=prompt_template, input_variables=["knowledge_content"])
-        formatted_prompt = prompt.format(knowledge_content=knowledge_content)
-        
-        response = self.llm.invoke(formatted_prompt)
-        return self._parse_json_response(response)
+        response = self._invoke_prompt(prompts.TECHNICAL, "technical", knowledge_content=knowledge_content)
+        questions = self._parse_json_response(response)
+        
+        # Tham chiếu cố định cho bước chấm điểm: chunk nguồn + ý chính (tạo một lần, lưu cùng câu hỏi)
+        for question in questions:
+            key_points = question.get("key_points")
+            question["key_points"] = [str(p).strip() for p in key_points if str(p).strip()] \
+                if isinstance(key_points, list) else []
+            question["source_chunk_ids"] = list(chunk_ids)
+        return questions
     
     def _generate_project_questions(self) -> List[Dict[str, Any]]:
         """Tạo 2 câu hỏi về dự án/kinh nghiệm từ CV"""
         # Tìm thông tin về dự án và kinh nghiệm
-        cv_docs = self.cv_retriever.get_relevant_documents("dự án kinh nghiệm thành tích hoạt động")
-        
-        prompt_template = """
-        Dựa trên thông tin CV về dự án và kinh nghiệm:
-        {cv_content}
-        
-        Hãy tạo 2 câu hỏi cụ thể về dự án/kinh nghiệm liên quan đến nhau:
-        - Dự án đã tham gia
-        - Kinh nghiệm làm việc
-        - Thành tích đạt được
-        
-        Trả về JSON format:
-        [
-            {{
-                "id": 6,
-                "question": "Câu hỏi về dự án 1",
-                "category": "cv_based",
-                "purpose": "Mục đích đánh giá",
-                "related_to": "Liên quan đến câu hỏi 7"
-            }},
-            {{
-                "id": 7,
-                "question": "Câu hỏi về dự án 2",
-                "category": "cv_based",
-                "purpose": "Mục đích đánh giá",
-                "related_to": "Liên quan đến câu hỏi 6"
-            }}
-        ]
-        """
+        cv_docs = self._retrieve(self.cv_retriever, "dự án kinh nghiệm thành tích hoạt động", "cv_based")
         
         cv_content = "\n".join([doc.page_content for doc in cv_docs])
-        prompt = PromptTemplate(template=prompt_template, input_variables=["cv_content"])
-        formatted_prompt = prompt.format(cv_content=cv_content)
-        
-        response = self.llm.invoke(formatted_prompt)
+        response = self._invoke_prompt(prompts.PROJECT, "cv_based", cv_content=cv_content)
         return self._parse_json_response(response)
     
     def _generate_creative_question(self) -> Dict[str, Any]:
         """Tạo 1 câu hỏi sáng tạo kết hợp cả 2 database"""
-        # Lấy thông tin từ cả 2 database
-        cv_docs = self.cv_retriever.get_relevant_documents("kỹ năng kinh nghiệm")
-        knowledge_docs = self.knowledge_retriever.get_relevant_documents("giải quyết vấn đề tư duy phản biện")
-        
-        prompt_template = """
-        Dựa trên thông tin CV và kiến thức kỹ thuật:
-        CV: {cv_content}
-        Knowledge: {knowledge_content}
-        
-        Hãy tạo 1 câu hỏi sáng tạo/tình huống giả định để kiểm tra:
-        - Khả năng giải quyết vấn đề
-        - Tư duy phản biện
-        - Sáng tạo trong công việc
-        
-        Trả về JSON format:
-        {{
-            "id": 8,
-            "question": "Câu hỏi sáng tạo",
-            "category": "creative",
-            "purpose": "Kiểm tra khả năng giải quyết vấn đề và tư duy phản biện",
-            "related_to": "Kết hợp kiến thức từ CV và technical knowledge"
-        }}
-        """
+        # Lấy thông tin từ cả 2 database (song song, 3 đoạn mỗi bên)
+        queries = {"cv": "kỹ năng kinh nghiệm", "knowledge": "giải quyết vấn đề tư duy phản biện",
+                   "questions": "câu hỏi tình huống giải quyết vấn đề tư duy phản biện"}
+        past_questions = []
+        if self.federated is not None:
+            # 3 đoạn mỗi database; 2 chỗ còn lại cho câu sáng tạo đã dùng gần nhất (quota của nguồn "questions")
+            results = self._federated_search(queries, "creative", k=8, reserve={"cv": 3, "knowledge": 3},
+                                             quota={"cv": 3, "knowledge": 3})
+            cv_docs = [doc for doc, _, source in results if source.group == "cv"]
+            knowledge_docs = [doc for doc, _, source in results if source.group == "knowledge"]
+            past_questions = [doc.page_content for doc, _, source in results if source.group == "questions"]
+        else:
+            cv_docs = self._retrieve(self.cv_retriever, queries["cv"], "creative")
+            knowledge_docs = self._retrieve(self.knowledge_retriever, queries["knowledge"], "creative")
         
         cv_content = "\n".join([doc.page_content for doc in cv_docs])
         knowledge_content = "\n".join([doc.page_content for doc in knowledge_docs])
-        
-        prompt = PromptTemplate(template=prompt_template, input_variables=["cv_content", "knowledge_content"])
-        formatted_prompt = prompt.format(cv_content=cv_content, knowledge_content=knowledge_content)
-        
-        response = self.llm.invoke(formatted_prompt)
+        response = self._invoke_prompt(prompts.CREATIVE, "creative", cv_content=cv_content,
+                                       knowledge_content=knowledge_content,
+                                       past_questions="\n".join(f"- {q}" for q in past_questions) or "(không có)")
         result = self._parse_json_response(response)
         return result[0] if result else {}
     
     def _parse_json_response(self, response: str) -> List[Dict[str, Any]]:
         """Parse JSON response từ LLM"""
+        with self.tracer.span("parse", operation="questions") as span:
+            questions = self._parse_json_list(response)
+            span.set("items", len(questions))
+            return questions
+    
+    def _parse_json_list(self, response: str) -> List[Dict[str, Any]]:
+        """Tìm mảng (hoặc object đơn lẻ) JSON trong response"""
         try:
             # Tìm JSON trong response
             import re
             json_match = re.search(r'\[.*\]', response, re.DOTALL)
             if json_match:
                 return json.loads(json_match.group())
-            else:
-                return json.loads(response)
+            # Câu hỏi sáng tạo được trả về dạng object đơn lẻ
+            object_match = re.search(r'\{.*\}', response, re.DOTALL)
+            if object_match:
+                return [json.loads(object_match.group())]
+            return json.loads(response)
         except:
             return []
     
@@ -412,9 +456,14 @@ class InterviewSystem:
         print(f"✅ Đã tạo {len(questions)} câu hỏi")
         print("\n" + "=" * 50)
         
+        planner = None
+        if self.adaptive:
+            from adaptive_interview import AdaptivePlanner, load_difficulty
+            planner = AdaptivePlanner(questions, load_difficulty(self.results_db, self.candidate_info.get("position")))
+        
         # Hiển thị và thu thập câu trả lời
-        for i, question in enumerate(questions):
-            if i == 7:  # Câu hỏi sáng tạo
+        for question, upcoming in self._question_order(questions, planner):
+            if question.get('category') == 'creative':  # Câu hỏi sáng tạo
                 # Tính điểm trung bình hiện tại
                 current_avg = self.total_score / len(self.scores) if self.scores else 0
                 if current_avg < 8.0:
@@ -426,15 +475,33 @@ class InterviewSystem:
             print(f"   {question['question']}")
             print(f"   Mục đích: {question['purpose']}")
             
+            # Chuẩn bị context chấm điểm trong lúc chờ thí sinh trả lời
+            self._prefetch_scoring_context(question)
+            if self.prefetch_next and upcoming is not None:
+                self._prefetch_scoring_context(upcoming)
+            
             answer = input("\n💬 Câu trả lời của bạn: ")
             
             if answer.strip():
                 # Chấm điểm câu trả lời
-                score = self._score_answer(question, answer)
+                stream = None
+                context = self._scoring_context(question)
+                local = self._prescore(question, answer, context)
+                if local is not None:
+                    score = local["score"]
+                    self.scoring_timings.append({"question_id": question['id'], "scored_by": "local",
+                                                 **local["timings"], "context": context})
+                elif self.stream_scoring:
+                    stream = self._score_answer_stream(question, answer, context)
+                    score = stream.wait_score()
+                else:
+                    score = self._score_answer(question, answer, context, skip_prescore=True)
                 self.answers.append(answer)
                 self.scores.append(score)
                 self.total_score += score
                 self.max_possible_score += 10  # Mỗi câu tối đa 10 điểm
+                if planner is not None:
+                    planner.record(question, score)
                 
                 # Tính điểm trung bình hiện tại
                 current_avg = self.total_score / len(self.scores)
@@ -442,8 +509,39 @@ class InterviewSystem:
                 print(f"📊 Điểm câu này: {score}/10")
                 print(f"📈 Tổng điểm: {self.total_score}/{self.max_possible_score}")
                 print(f"📊 Điểm trung bình: {current_avg:.1f}/10")
+                if local is not None:
+                    print(f"📝 Nhận xét: {local['reason']}")
+                
+                if stream is not None:
+                    # Nhận xét hiển thị dần khi token về, stream vẫn chạy nền trong lúc in
+                    print("📝 Nhận xét: ", end="", flush=True)
+                    stream.follow_feedback(lambda delta: print(delta, end="", flush=True))
+                    stream.wait_done()
+                    print()
+                    self.scoring_timings.append(dict(question_id=question['id'], scored_by=stream.scored_by,
+                                                     **stream.timings(), context=context))
+                    self.tracer.record("llm.stream", stream.timings()["total_time"] or 0, operation="score",
+                                       prompt_tokens=estimate_tokens(stream.prompt),
+                                       response_tokens=estimate_tokens(stream.text))
             else:
                 print("⚠️  Bạn chưa trả lời. Câu hỏi này sẽ được bỏ qua.")
+                if planner is not None:
+                    planner.record(question, None)
+        
+        if planner is not None:
+            # Câu đã trả lời lên đầu để khớp thứ tự với self.answers/self.scores khi xuất kết quả
+            self.questions = planner.ordered_questions()
+            self.adaptive_summary = planner.summary()
+            if planner.stop_reason == "settled":
+                low, high = self.adaptive_summary["interval"]
+                print(f"\n⏹️ Kết quả đã rõ sau {len(planner.asked)}/{len(questions)} câu "
+                      f"(điểm trung bình {low:.1f}-{high:.1f}, độ tin cậy {planner.confidence:.0%})")
+        
+        # Bỏ các truy vấn trước không còn dùng tới (vd: câu sáng tạo bị bỏ qua)
+        self._prefetched_contexts.clear()
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=False)
+            self._prefetch_executor = None
         
         # Hiển thị kết quả cuối
         self._show_final_results()
@@ -451,170 +549,239 @@ class InterviewSystem:
         # Xuất kết quả ra file JSON
         self.export_interview_results()
     
-    def _score_answer(self, question: Dict[str, Any], answer: str) -> float:
-        """Chấm điểm câu trả lời bằng Gemini"""
-        
-        # Lấy context liên quan để chấm điểm
-        if question['category'] == 'behavioral' or question['category'] == 'cv_based':
-            context_docs = self.cv_retriever.get_relevant_documents(question['question'])
-        else:
-            context_docs = self.knowledge_retriever.get_relevant_documents(question['question'])
-        
-        context = "\n".join([doc.page_content for doc in context_docs])
-        
-        # Xác định tiêu chí chấm điểm dựa trên loại câu hỏi
-        if question['category'] == 'technical':
-            criteria = """
-        1. Kiến thức chính xác (Knowledge): Mức độ hiểu biết đúng về khái niệm
-        2. Áp dụng thực tế (Application): Khả năng áp dụng kiến thức vào tình huống thực tế
-        3. Phân tích sâu (Analysis): Khả năng phân tích và giải thích chi tiết
-        4. Tư duy phản biện (Critical Thinking): Khả năng đánh giá và so sánh
-        5. Truyền đạt rõ ràng (Communication): Cách trình bày logic và dễ hiểu
-            """
-        else:
-            criteria = """
-        1. Độ chính xác (Correctness): Mức độ lập luận gắn kết với ý chính
-        2. Độ bao quát (Coverage): Tỷ lệ phần trăm các ý chính được đề cập  
-        3. Lý luận (Reasoning): Cách phân tích từng bước, nêu rõ giả định
-        4. Tính sáng tạo (Creativity): Giải pháp mới mẻ nhưng hợp lý
-        5. Truyền đạt (Communication): Ngôn ngữ rõ ràng, có cấu trúc
-            """
-        
-        scoring_prompt = f"""
-        Bạn là một chuyên gia phỏng vấn nhân sự. Hãy chấm điểm câu trả lời một cách công bằng và chính xác.
-
-        Câu hỏi: {question['question']}
-        Loại câu hỏi: {question['category']}
-        Mục đích: {question['purpose']}
-        Câu trả lời: {answer}
-        Context liên quan: {context}
-
-        Chấm điểm theo thang điểm 10 cho từng tiêu chí:
-        {criteria}
+    def _question_order(self, questions: List[Dict[str, Any]], planner=None):
+        """(câu hỏi, câu kế tiếp để truy vấn trước context) theo thứ tự cố định hoặc do AdaptivePlanner chọn"""
+        if planner is None:
+            for i, question in enumerate(questions):
+                yield question, questions[i + 1] if i + 1 < len(questions) else None
+            return
+        question = planner.next_question()
+        while question is not None:
+            # Câu kế tiếp phụ thuộc điểm câu này nên chưa biết trước
+            yield question, None
+            question = planner.next_question()
+    
+    def _invoke_prompt(self, prompt: "prompts.Prompt", operation: str, **values) -> str:
+        """Gọi LLM với một prompt trong registry (phần tĩnh đứng đầu để Gemini cache tiền tố)"""
+        return self._invoke_llm(prompt.render(**values), operation, prompt_id=prompt.id)
+    
+    def _invoke_llm(self, prompt: str, operation: str, prompt_id: Optional[str] = None, tracer=None) -> str:
+        """Gọi LLM trong một span; token thật, token đọc từ cache và số lần retry được lấy qua callback nếu LLM hỗ trợ.
 
-        Yêu cầu:
-        - Tổng điểm phải là trung bình của 5 tiêu chí (không cộng dồn)
-        - Điểm từ 0-10 cho mỗi tiêu chí
-        - Đánh giá dựa trên chất lượng thực tế của câu trả lời
+        tracer: ghi span vào tracer khác (vd: tracer của từng phiên trên server) thay cho tracer của engine."""
+        attributes = {"prompt": prompt_id} if prompt_id else {}
+        handler = self._trace_handler if tracer is None else tracer.callback_handler()
+        tracer = tracer or self.tracer
+        with tracer.span("llm.invoke", operation=operation, prompt_tokens=estimate_tokens(prompt),
+                         **attributes) as span:
+            response = self.llm.invoke(prompt, config={"callbacks": [handler]})
+            span.attributes.setdefault("response_tokens", estimate_tokens(str(response)))
+            return response
+    
+    def _retrieve(self, retriever, query: str, operation: str) -> List["Document"]:
+        """Truy vấn vector database trong một span"""
+        with self.tracer.span("retriever", operation=operation) as span:
+            docs = retriever.get_relevant_documents(query)
+            span.set("documents", len(docs))
+            return docs
+    
+    def _federated_search(self, queries: Dict[str, str], operation: str, **kwargs) -> list:
+        """Truy vấn song song nhiều nguồn trong một span (thời gian từng nguồn ghi vào thuộc tính của span)"""
+        with self.tracer.span("retriever", operation=operation, sources=len(queries)) as span:
+            # Thống kê trả về theo từng lần gọi: engine (và FederatedRetriever) dùng chung giữa các phiên
+            results, stats = self.federated.search(queries, **kwargs)
+            for name, source_stats in stats.items():
+                if isinstance(source_stats, dict) and "ms" in source_stats:
+                    span.set(f"{name}_ms", source_stats["ms"])
+            span.set("documents", len(results))
+            return results
+    
+    def _prescore(self, question: Dict[str, Any], answer: str, context: str) -> Optional[Dict[str, Any]]:
+        """Chấm sơ bộ ở máy; trả về kết quả nếu không cần gọi LLM, None nếu phải gửi LLM chấm"""
+        if self.prescorer is None:
+            return None
+        started = time.perf_counter()
+        with self.tracer.span("prescore") as span:
+            result = self.prescorer.prescore(question['question'], answer, context, question.get("key_points"))
+            span.set("decision", result["decision"])
+        if result["decision"] != "local":
+            return None
+        elapsed = round(time.perf_counter() - started, 3)
+        result["timings"] = {"time_to_score": elapsed, "time_to_first_feedback": elapsed, "total_time": elapsed}
+        return result
+    
+    def _retrieve_with_ids(self, db, retriever, query: str, operation: str) -> tuple:
+        """Truy vấn FAISS kèm id chunk trong docstore; store không phải FAISS thì dùng retriever (không có id)"""
+        if db is None or not hasattr(db, "index_to_docstore_id"):
+            return self._retrieve(retriever, query, operation), []
+        from retrieval import search_with_ids
+        with self.tracer.span("retriever", operation=operation) as span:
+            results = search_with_ids(db, query, k=getattr(retriever, "search_kwargs", {}).get("k", 3))
+            span.set("documents", len(results))
+        return [doc for _, doc, _ in results], [doc_id for doc_id, _, _ in results]
+    
+    def _reference_context(self, question: Dict[str, Any]) -> Optional[str]:
+        """Tham chiếu cố định của câu kỹ thuật: ý chính, hoặc chunk nguồn theo id; None nếu câu hỏi không có"""
+        if question.get("key_points"):
+            return "\n".join(f"- {point}" for point in question["key_points"])
+        chunk_ids = question.get("source_chunk_ids")
+        if chunk_ids and self.knowledge_db is not None and hasattr(self.knowledge_db, "docstore"):
+            docs = [self.knowledge_db.docstore.search(doc_id) for doc_id in chunk_ids]
+            # docstore.search trả về chuỗi báo lỗi nếu id không còn (index đã build lại)
+            contents = [doc.page_content for doc in docs if hasattr(doc, "page_content")]
+            if len(contents) == len(chunk_ids):
+                return "\n".join(contents)
+        return None
+    
+    def _score_answer(self, question: Dict[str, Any], answer: str, context: Optional[str] = None,
+                      skip_prescore: bool = False) -> float:
+        """Chấm điểm câu trả lời: chấm ở máy nếu rõ ràng trống/lạc đề, còn lại bằng Gemini.
 
-        Trả về JSON format:
-        {{
-            "criteria_1": điểm_số,
-            "criteria_2": điểm_số,
-            "criteria_3": điểm_số,
-            "criteria_4": điểm_số,
-            "criteria_5": điểm_số,
-            "total": tổng_điểm_trung_bình,
-            "feedback": "Nhận xét chi tiết về câu trả lời"
-        }}
-        """
-        
-        response = self.llm.invoke(scoring_prompt)
+        skip_prescore=True khi nơi gọi đã chấm sơ bộ (tránh embed câu trả lời 2 lần)."""
+        if context is None:
+            context = self._scoring_context(question)
+        local = None if skip_prescore else self._prescore(question, answer, context)
+        if local is not None:
+            self.scoring_timings.append({"question_id": question['id'], "scored_by": "local", **local["timings"],
+                                         "context": context})
+            return local["score"]
+        scoring_prompt = self._build_scoring_prompt(question, answer, context)
+        
+        started = time.perf_counter()
+        from llm_client import LLMUnavailableError
+        try:
+            response = self._invoke_llm(scoring_prompt, "score", self._scoring_prompt_template(question).id)
+            scored_by = "llm"
+        except LLMUnavailableError as e:
+            # Ghi rõ điểm mặc định trong scoring_timings thay vì lặng lẽ trả 5.0
+            print(f"⚠️ Không chấm được bằng LLM ({e}), dùng điểm mặc định")
+            response, scored_by = "", "default"
+        elapsed = round(time.perf_counter() - started, 3)
+        score, scored_by = self._parse_score(response, scored_by)
+        self.scoring_timings.append({
+            "question_id": question['id'],
+            "scored_by": scored_by,
+            "time_to_score": elapsed,
+            "time_to_first_feedback": elapsed,
+            "total_time": elapsed,
+            "context": context
+        })
+        
+        return score
+    
+    def _score_answer_stream(self, question: Dict[str, Any], answer: str, context: Optional[str] = None) -> ScoreStream:
+        """Chấm điểm dạng streaming: trả về ScoreStream, điểm có ngay khi các trường JSON hoàn chỉnh"""
+        return ScoreStream(self.llm, self._build_scoring_prompt(question, answer, context))
+    
+    def _retrieve_scoring_context(self, question: Dict[str, Any]) -> str:
+        """Lấy context liên quan để chấm điểm"""
+        # Câu kỹ thuật có tham chiếu lưu sẵn: không cần truy vấn vector database
+        reference = self._reference_context(question)
+        if reference is not None:
+            return reference
+        
+        primary = "cv" if question['category'] in ('behavioral', 'cv_based') else "knowledge"
+        if self.federated is not None:
+            # Tìm cả 2 nguồn cùng lúc: giữ 2 đoạn của nguồn chính, đoạn thứ 3 lấy từ nguồn còn lại nếu điểm cao hơn
+            secondary = "knowledge" if primary == "cv" else "cv"
+            results = self._federated_search({primary: question['question'], secondary: question['question']},
+                                             "scoring_context", k=3, reserve={primary: 2}, quota={secondary: 1})
+            context_docs = [doc for doc, _, _ in results]
+        elif primary == "cv":
+            context_docs = self._retrieve(self.cv_retriever, question['question'], "scoring_context")
+        else:
+            context_docs = self._retrieve(self.knowledge_retriever, question['question'], "scoring_context")
         
+        return "\n".join([doc.page_content for doc in context_docs])
+    
+    def _prefetch_scoring_context(self, question: Optional[Dict[str, Any]]):
+        """Truy vấn trước context chấm điểm ở luồng nền trong lúc thí sinh đang trả lời"""
+        if not self.prefetch_scoring or not question:
+            return
+        key = (question['id'], question['question'])
+        if key in self._prefetched_contexts:
+            return
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self._prefetched_contexts[key] = self._prefetch_executor.submit(self._retrieve_scoring_context, question)
+    
+    def _scoring_context(self, question: Dict[str, Any]) -> str:
+        """Lấy context chấm điểm, ưu tiên kết quả đã truy vấn trước"""
+        future = self._prefetched_contexts.pop((question['id'], question['question']), None)
+        with self.tracer.span("scoring_context", cache_hit=future is not None and future.done()):
+            if future is not None:
+                try:
+                    return future.result()
+                except Exception as e:
+                    print(f"⚠️ Lỗi khi truy vấn trước context: {e}")
+            return self._retrieve_scoring_context(question)
+    
+    def _build_scoring_prompt(self, question: Dict[str, Any], answer: str, context: Optional[str] = None) -> str:
+        """Tạo prompt chấm điểm cho một câu trả lời"""
+        if context is None:
+            context = self._scoring_context(question)
+        
+        # Ý chính tham chiếu thay cho các chunk thô: prompt ngắn hơn, cùng thước đo cho mọi thí sinh
+        context_label = "Các ý chính của đáp án tham chiếu" if question.get("key_points") else "Context liên quan"
+        
+        # Tiêu chí chấm điểm theo loại câu hỏi nằm trong phần tĩnh của prompt
+        prompt = self._scoring_prompt_template(question)
+        return prompt.render(question=question['question'], category=question['category'],
+                             purpose=question['purpose'], context_label=context_label, context=context,
+                             answer=answer)
+    
+    @staticmethod
+    def _scoring_prompt_template(question: Dict[str, Any]) -> "prompts.Prompt":
+        return prompts.SCORE_TECHNICAL if question['category'] == 'technical' else prompts.SCORE_GENERAL
+    
+    def _parse_score(self, response: str, scored_by: str = "llm") -> tuple:
+        """Parse điểm số từ JSON response của LLM: (điểm, scored_by); parse lỗi thì (5.0, "default")"""
+        with self.tracer.span("parse", operation="score"):
+            score = self._parse_score_fields(response)
+        if score is None:
+            # Điểm mặc định không phải điểm LLM chấm: không đưa vào hiệu chỉnh prescore/thống kê như điểm "llm"
+            return 5.0, "default"
+        return score, scored_by
+    
+    def _parse_score_fields(self, response: str) -> Optional[float]:
+        """Đọc điểm từ object JSON trong response, None nếu lỗi"""
         try:
             import re
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
             if json_match:
                 score_data = json.loads(json_match.group())
-                total_score = float(score_data.get('total', 0))
-                
-                # Đảm bảo điểm số trong khoảng hợp lệ (0-10)
-                if 0 <= total_score <= 10:
-                    return total_score
-                else:
-                    # Nếu điểm không hợp lệ, tính trung bình từ các tiêu chí
-                    criteria_scores = [
-                        score_data.get('criteria_1', 0),
-                        score_data.get('criteria_2', 0),
-                        score_data.get('criteria_3', 0),
-                        score_data.get('criteria_4', 0),
-                        score_data.get('criteria_5', 0)
-                    ]
-                    valid_scores = [float(s) for s in criteria_scores if isinstance(s, (int, float)) and 0 <= s <= 10]
-                    if valid_scores:
-                        return sum(valid_scores) / len(valid_scores)
+                score = score_from_fields(score_data)
+                if score is not None:
+                    return score
                     
         except Exception as e:
             print(f"⚠️ Lỗi khi chấm điểm: {e}")
         
-        # Trả về điểm mặc định nếu có lỗi
-        return 5.0
+        return None
     
     def export_interview_results(self):
-        """Xuất kết quả phỏng vấn ra file JSON"""
+        """Lưu kết quả phỏng vấn vào kho kết quả (và file JSON nếu bật export_json)"""
         try:
             # Tính thời gian phỏng vấn
             if self.interview_start_time:
                 interview_duration = (datetime.now() - self.interview_start_time).total_seconds() / 60
                 self.candidate_info["interview_duration"] = round(interview_duration, 2)
             
-            # Tạo cấu trúc dữ liệu hoàn chỉnh
-            avg_score = self.total_score / len(self.scores) if self.scores else 0
-            total_possible_all_questions = len(self.questions) * 10  # Tất cả câu hỏi × 10 điểm
-            
-            interview_data = {
-                "candidate_info": self.candidate_info,
-                "interview_summary": {
-                    "total_questions": len(self.questions),
-                    "total_answers": len(self.answers),
-                    "total_score": self.total_score,
-                    "max_possible_score": self.max_possible_score,
-                    "total_possible_score_all_questions": total_possible_all_questions,
-                    "average_score": round(avg_score, 2),
-                    "interview_status": self._get_interview_status(),
-                    "candidate_education": self.candidate_info.get("education", ""),
-                    "candidate_skills": self.candidate_info.get("skills", []),
-                    "candidate_summary": self.candidate_info.get("summary", "")
-                },
-                "questions_and_answers": [],
-                "detailed_scores": [],
-                "export_info": {
-                    "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "system_version": "1.0.0"
-                }
-            }
-            
-            # Thêm chi tiết câu hỏi và câu trả lời
-            for i, (question, answer, score) in enumerate(zip(self.questions, self.answers, self.scores)):
-                qa_detail = {
-                    "question_id": question['id'],
-                    "question_category": question['category'],
-                    "question": question['question'],
-                    "question_purpose": question['purpose'],
-                    "question_related_to": question.get('related_to', ''),
-                    "answer": answer,
-                    "score": score,
-                    "max_score": 10
-                }
-                interview_data["questions_and_answers"].append(qa_detail)
-                
-                # Thêm chi tiết điểm số (nếu có)
-                score_detail = {
-                    "question_id": question['id'],
-                    "score": score,
-                    "percentage": round((score / 10) * 100, 1)
-                }
-                interview_data["detailed_scores"].append(score_detail)
-            
-            # Tạo thư mục lưu trữ
-            output_dir = Path("interview_results")
-            output_dir.mkdir(exist_ok=True)
+            with self.tracer.span("export"):
+                interview_data = build_interview_data(self)
+                session_id = open_store(self.results_db).add(interview_data) if self.results_db else None
+                filepath = save_interview_data(interview_data) if self.export_json else None
+            if self.trace_path:
+                self.tracer.export(self.trace_path)
+                print(f"🧭 Trace: {self.trace_path}")
             
-            # Tạo tên file dựa trên tên thí sinh và ngày
-            safe_name = "".join(c for c in self.candidate_info["name"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            safe_name = safe_name.replace(' ', '_')
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{safe_name}_{timestamp}.json"
-            filepath = output_dir / filename
+            if session_id is not None:
+                print(f"\n💾 Đã lưu kết quả phỏng vấn: phiên #{session_id} trong {self.results_db}")
+            if filepath:
+                print(f"\n💾 Đã xuất kết quả phỏng vấn ra file: {filepath}")
+                print(f"📁 Thư mục lưu trữ: {filepath.parent.absolute()}")
             
-            # Xuất file JSON
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(interview_data, f, ensure_ascii=False, indent=2)
-            
-            print(f"\n💾 Đã xuất kết quả phỏng vấn ra file: {filepath}")
-            print(f"📁 Thư mục lưu trữ: {output_dir.absolute()}")
-            
-            return str(filepath)
+            return session_id if session_id is not None else str(filepath)
             
         except Exception as e:
             print(f"❌ Lỗi khi xuất file: {e}")
@@ -622,18 +789,7 @@ class InterviewSystem:
     
     def _get_interview_status(self):
         """Xác định trạng thái phỏng vấn dựa trên điểm trung bình"""
-        if not self.scores:
-            return "Chưa có điểm"
-        
-        avg_score = self.total_score / len(self.scores)
-        if avg_score >= 8.0:
-            return "Xuất sắc - Đạt yêu cầu cao"
-        elif avg_score >= 6.0:
-            return "Tốt - Đáp ứng yêu cầu"
-        elif avg_score >= 4.0:
-            return "Trung bình - Cần cải thiện"
-        else:
-            return "Chưa đạt - Cần trau dồi thêm"
+        return interview_status(self.scores, self.total_score)
     
     def _show_final_results(self):
         """Hiển thị kết quả cuối cùng"""
@@ -675,10 +831,181 @@ class InterviewSystem:
             print(f"  Trả lời: {answer[:100]}...")
 
 
+# Ngưỡng điểm trung bình của từng mức đánh giá (cao xuống thấp), dưới ngưỡng cuối là FAIL_STATUS
+STATUS_BANDS = [
+    (8.0, "Xuất sắc - Đạt yêu cầu cao"),
+    (6.0, "Tốt - Đáp ứng yêu cầu"),
+    (4.0, "Trung bình - Cần cải thiện"),
+]
+FAIL_STATUS = "Chưa đạt - Cần trau dồi thêm"
+
+
+def interview_status(scores: List[float], total_score: float) -> str:
+    """Xác định trạng thái phỏng vấn dựa trên điểm trung bình"""
+    if not scores:
+        return "Chưa có điểm"
+    
+    avg_score = total_score / len(scores)
+    for threshold, status in STATUS_BANDS:
+        if avg_score >= threshold:
+            return status
+    return FAIL_STATUS
+
+
+def build_interview_data(state) -> Dict[str, Any]:
+    """Tạo cấu trúc kết quả phỏng vấn từ trạng thái phiên (InterviewSystem hoặc phiên của server)"""
+    avg_score = state.total_score / len(state.scores) if state.scores else 0
+    total_possible_all_questions = len(state.questions) * 10  # Tất cả câu hỏi × 10 điểm
+    
+    interview_data = {
+        "candidate_info": state.candidate_info,
+        "interview_summary": {
+            "total_questions": len(state.questions),
+            "total_answers": len(state.answers),
+            "total_score": state.total_score,
+            "max_possible_score": state.max_possible_score,
+            "total_possible_score_all_questions": total_possible_all_questions,
+            "average_score": round(avg_score, 2),
+            "interview_status": interview_status(state.scores, state.total_score),
+            "candidate_education": state.candidate_info.get("education", ""),
+            "candidate_skills": state.candidate_info.get("skills", []),
+            "candidate_summary": state.candidate_info.get("summary", "")
+        },
+        "questions_and_answers": [],
+        "detailed_scores": [],
+        "export_info": {
+            "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "system_version": "1.0.0"
+        }
+    }
+    
+    # Tóm tắt thời gian/token theo từng bước của phiên
+    tracer = getattr(state, "tracer", None)
+    if tracer is not None:
+        interview_data["trace_summary"] = tracer.summary()
+    if getattr(state, "adaptive_summary", None):
+        interview_data["adaptive"] = state.adaptive_summary
+    
+    # Thêm chi tiết câu hỏi và câu trả lời
+    for i, (question, answer, score) in enumerate(zip(state.questions, state.answers, state.scores)):
+        qa_detail = {
+            "question_id": question['id'],
+            "question_category": question['category'],
+            "question": question['question'],
+            "question_purpose": question['purpose'],
+            "question_related_to": question.get('related_to', ''),
+            "answer": answer,
+            "score": score,
+            "max_score": 10
+        }
+        if question.get("key_points"):
+            qa_detail["key_points"] = question["key_points"]
+        timing = next((t for t in state.scoring_timings if t["question_id"] == question['id']), None)
+        if timing:
+            qa_detail["time_to_first_feedback"] = timing["time_to_first_feedback"]
+            # Ai chấm (llm/local/default) và context đã dùng: prescore.py --calibrate chỉ học từ điểm do LLM chấm
+            for key, target in (("scored_by", "scored_by"), ("context", "scoring_context")):
+                if timing.get(key) is not None:
+                    qa_detail[target] = timing[key]
+        interview_data["questions_and_answers"].append(qa_detail)
+        
+        # Thêm chi tiết điểm số (nếu có)
+        score_detail = {
+            "question_id": question['id'],
+            "score": score,
+            "percentage": round((score / 10) * 100, 1)
+        }
+        interview_data["detailed_scores"].append(score_detail)
+    
+    return interview_data
+
+
+def save_interview_data(interview_data: Dict[str, Any], output_dir: str = "interview_results") -> Path:
+    """Ghi kết quả phỏng vấn ra file JSON trong thư mục lưu trữ"""
+    # Tạo thư mục lưu trữ
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True)
+    
+    # Tạo tên file dựa trên tên thí sinh và ngày
+    name = interview_data["candidate_info"].get("name", "")
+    safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    safe_name = safe_name.replace(' ', '_')
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filepath = output_dir / f"{safe_name}_{timestamp}.json"
+    counter = 1
+    while filepath.exists():
+        # Nhiều phiên cùng tên kết thúc trong cùng một giây (chế độ server)
+        filepath = output_dir / f"{safe_name}_{timestamp}_{counter}.json"
+        counter += 1
+    
+    # Xuất file JSON
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(interview_data, f, ensure_ascii=False, indent=2)
+    
+    return filepath
+
+
+def replay_results(source: str, results_db: str = DEFAULT_DB):
+    """Hiển thị lại kết quả một phiên đã xuất: file JSON hoặc id phiên trong kho (không load model hay vector database)"""
+    if source.isdigit() and not Path(source).exists():
+        data = open_store(results_db).get(int(source))
+        if data is None:
+            print(f"❌ Không có phiên #{source} trong {results_db}")
+            return
+    else:
+        with open(source, encoding="utf-8") as f:
+            data = json.load(f)
+    qa = data.get("questions_and_answers", [])
+    summary = data.get("interview_summary", {})
+    state = SimpleNamespace(
+        questions=[{"id": q["question_id"], "category": q["question_category"], "question": q["question"]}
+                   for q in qa],
+        answers=[q["answer"] for q in qa],
+        scores=[q["score"] for q in qa],
+        total_score=summary.get("total_score", sum(q["score"] for q in qa)),
+        max_possible_score=summary.get("max_possible_score", len(qa) * 10)
+    )
+    # Số câu hỏi của phiên gốc có thể nhiều hơn số câu đã trả lời
+    state.questions += [{}] * max(0, summary.get("total_questions", 0) - len(state.questions))
+    InterviewSystem._show_final_results(state)
+
+
 def main():
     """Hàm main để chạy hệ thống phỏng vấn"""
+    parser = argparse.ArgumentParser(description="Hệ thống phỏng vấn dựa trên CV và knowledge database")
+    parser.add_argument("--replay", metavar="FILE", help="Hiển thị lại kết quả (file JSON hoặc id phiên trong kho), không gọi LLM")
+    parser.add_argument("--question-bank", default="question_bank", help="Thư mục ngân hàng câu hỏi")
+    parser.add_argument("--no-question-bank", action="store_true", help="Luôn tạo câu hỏi mới")
+    parser.add_argument("--stream-scoring", action="store_true", help="Hiển thị điểm dần khi LLM đang chấm")
+    parser.add_argument("--trace", default="interview_results/traces.jsonl", help="File xuất trace (.jsonl hoặc OTLP/JSON)")
+    parser.add_argument("--results-db", default=DEFAULT_DB, help="Kho kết quả SQLite")
+    parser.add_argument("--export-json", action="store_true", help="Ghi thêm file JSON cho phiên này")
+    parser.add_argument("--adaptive", action="store_true", help="Chọn câu hỏi theo điểm, dừng sớm khi kết quả đã rõ")
+    parser.add_argument("--knowledge-shard", action="append", default=[], metavar="DIR",
+                        help="Thêm FAISS index kiến thức (truy vấn song song cùng knowledge_db), có thể lặp lại")
+    parser.add_argument("--no-federated", action="store_true", help="Truy vấn tuần tự từng retriever như cũ")
+    parser.add_argument("--prescore", action="store_true",
+                        help="Chấm sơ bộ ở máy câu trống/lạc đề (chạy prescore.py --calibrate trước)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Gửi thêm một lời gọi LLM khi lời gọi chậm hơn p95 (tốn thêm chi phí)")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay_results(args.replay, args.results_db)
+        return
+
     try:
-        interview_system = InterviewSystem()
+        interview_system = InterviewSystem(
+            resources=InterviewResources(knowledge_shards=args.knowledge_shard, hedge=args.hedge),
+            question_bank_dir=None if args.no_question_bank else args.question_bank,
+            stream_scoring=args.stream_scoring,
+            trace_path=args.trace,
+            results_db=args.results_db,
+            export_json=args.export_json,
+            adaptive=args.adaptive,
+            federated=not args.no_federated,
+            prescore=args.prescore
+        )
         interview_system.conduct_interview()
     except Exception as e:
         print(f"❌ Lỗi: {e}")
@@ -0,0 +1,473 @@
+import time
+import uuid
+import asyncio
+import argparse
+import functools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from aiohttp import web, WSMsgType
+
+from interview import InterviewSystem, build_interview_data, interview_status
+from llm_client import LLMUnavailableError, ResilientLLM
+from results_store import open_store
+from tracing import Tracer
+
+
+class ServerBusy(Exception):
+    """Hàng đợi gọi LLM đã đầy, client nên thử lại sau"""
+
+
+class InterviewSession:
+    """Trạng thái gọn của một phiên phỏng vấn (không giữ model, index hay LLM)"""
+
+    __slots__ = (
+        "session_id", "candidate_info", "cv_text", "questions", "answers", "scores",
+        "total_score", "max_possible_score", "scoring_timings", "interview_start_time",
+        "index", "finished", "last_active", "lock", "context_task", "tracer"
+    )
+
+    def __init__(self, session_id: str, candidate_info: Dict[str, Any], cv_text: str = ""):
+        self.session_id = session_id
+        self.candidate_info = candidate_info
+        self.cv_text = cv_text
+        self.questions: List[Dict[str, Any]] = []
+        self.answers: List[str] = []
+        self.scores: List[float] = []
+        self.total_score = 0
+        self.max_possible_score = 0
+        self.scoring_timings: List[Dict[str, Any]] = []
+        self.interview_start_time = datetime.now()
+        self.index = 0
+        self.finished = False
+        self.last_active = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.context_task: Optional[asyncio.Future] = None
+        # Span của phiên (gồm cả thời gian chờ hàng đợi LLM), tóm tắt được ghi vào file kết quả
+        self.tracer = Tracer("interview-server")
+
+    @property
+    def average(self) -> float:
+        return self.total_score / len(self.scores) if self.scores else 0
+
+    def current_question(self) -> Optional[Dict[str, Any]]:
+        if self.finished or self.index >= len(self.questions):
+            return None
+        return self.questions[self.index]
+
+    def advance(self):
+        """Chuyển sang câu tiếp theo; câu sáng tạo chỉ được hỏi khi điểm trung bình >= 8.0"""
+        self.index += 1
+        question = self.current_question()
+        if question is None or (question.get("category") == "creative" and self.average < 8.0):
+            self.finished = True
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "candidate": self.candidate_info.get("name", ""),
+            "position": self.candidate_info.get("position", ""),
+            "answered": len(self.scores),
+            "total_questions": len(self.questions),
+            "total_score": round(self.total_score, 2),
+            "average_score": round(self.average, 2),
+            "interview_status": interview_status(self.scores, self.total_score),
+            "finished": self.finished
+        }
+
+
+def _public_question(question: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if question is None:
+        return None
+    return {key: question.get(key) for key in ("id", "question", "category", "purpose")}
+
+
+class LLMGate:
+    """Giới hạn số lời gọi LLM đồng thời và độ dài hàng đợi chờ (backpressure)"""
+
+    def __init__(self, executor: ThreadPoolExecutor, max_inflight: int, max_waiting: int):
+        self.executor = executor
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.inflight = 0
+        self._semaphore = asyncio.Semaphore(max_inflight)
+
+    async def run(self, fn, *args):
+        """Chạy hàm blocking (gọi LLM) trong thread pool mà không chặn event loop"""
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            raise ServerBusy()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+
+
+class InterviewServer:
+    """Server HTTP/WebSocket phục vụ nhiều phiên phỏng vấn, dùng chung 1 embedding model và 1 bộ index"""
+
+    def __init__(self, resources, max_sessions: int = 100, max_inflight_llm: int = 16,
+                 max_waiting_llm: int = 64, session_ttl: float = 1800,
+                 question_bank_dir: Optional[str] = "question_bank", results_db: str = "interview_results/results.db",
+                 prescore: bool = False):
+        # Một engine duy nhất, chỉ dùng các hàm không phụ thuộc trạng thái phiên
+        self.engine = InterviewSystem(
+            question_bank_dir=question_bank_dir,
+            prefetch_scoring=False,
+            resources=resources,
+            prescore=prescore
+        )
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.results_store = open_store(results_db)
+        self.sessions: Dict[str, InterviewSession] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight_llm + 4, thread_name_prefix="interview")
+        self.max_inflight_llm = max_inflight_llm
+        self.max_waiting_llm = max_waiting_llm
+        self.llm_gate: Optional[LLMGate] = None
+        self.stats = {"sessions_started": 0, "sessions_completed": 0, "answers_scored": 0,
+                      "rejected_sessions": 0, "rejected_busy": 0, "llm_unavailable": 0}
+        self._reaper: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Logic phiên phỏng vấn (dùng chung cho HTTP và WebSocket)
+    # ------------------------------------------------------------------
+    async def _run_blocking(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+
+    def _prefetch_context(self, session: InterviewSession):
+        """Truy vấn trước context chấm điểm cho câu hiện tại trong lúc thí sinh trả lời"""
+        question = session.current_question()
+        session.context_task = None
+        if question is not None:
+            loop = asyncio.get_running_loop()
+            session.context_task = loop.run_in_executor(
+                self.executor, self.engine._retrieve_scoring_context, question
+            )
+
+    async def start_session(self, candidate_info: Dict[str, Any], cv_text: str = "") -> InterviewSession:
+        if len(self.sessions) >= self.max_sessions:
+            self.stats["rejected_sessions"] += 1
+            raise web.HTTPTooManyRequests(
+                text='{"error": "Đã đạt số phiên phỏng vấn tối đa"}', content_type="application/json"
+            )
+
+        info = {
+            "name": "", "email": "", "phone": "", "position": "", "experience_years": 0,
+            "education": "", "skills": [], "summary": "", "interview_duration": 0
+        }
+        info.update(candidate_info or {})
+        info["interview_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        session = InterviewSession(uuid.uuid4().hex, info, cv_text)
+        # Giữ chỗ trước khi tạo câu hỏi để giới hạn số phiên được tính cả phiên đang khởi tạo
+        self.sessions[session.session_id] = session
+        try:
+            with session.tracer.span("question_generation") as span:
+                session.questions = await self.llm_gate.run(self.engine.build_question_set, info, cv_text)
+                span.set("questions", len(session.questions))
+        except BaseException:
+            self.sessions.pop(session.session_id, None)
+            raise
+        if not session.questions:
+            self.sessions.pop(session.session_id, None)
+            raise web.HTTPBadGateway(
+                text='{"error": "Không thể tạo câu hỏi"}', content_type="application/json"
+            )
+
+        self.stats["sessions_started"] += 1
+        self._prefetch_context(session)
+        return session
+
+    async def submit_answer(self, session: InterviewSession, answer: str) -> Dict[str, Any]:
+        async with session.lock:
+            session.last_active = time.monotonic()
+            question = session.current_question()
+            if question is None:
+                return {"finished": True, "result": session.summary()}
+
+            result: Dict[str, Any] = {"question_id": question["id"], "skipped": not answer.strip()}
+            if answer.strip():
+                started = time.perf_counter()
+                task = session.context_task
+                with session.tracer.span("scoring_context", cache_hit=task is not None and task.done()):
+                    context = None
+                    if task is not None:
+                        try:
+                            context = await task
+                        except Exception as e:
+                            # Truy vấn trước lỗi: bỏ future hỏng để các lượt sau không await lại nó
+                            print(f"⚠️ Lỗi khi truy vấn trước context: {e}")
+                            session.context_task = None
+                    if context is None:
+                        context = await self._run_blocking(self.engine._retrieve_scoring_context, question)
+                # Câu trả lời trống/lạc đề được chấm ở máy, không chiếm suất gọi LLM
+                local = None
+                scored_by = "local"
+                if self.engine.prescorer is not None:
+                    local = await self._run_blocking(self.engine._prescore, question, answer, context or "")
+                if local is not None:
+                    score = local["score"]
+                    result["feedback"] = local["reason"]
+                else:
+                    prompt = self.engine._build_scoring_prompt(question, answer, context)
+                    scored_by = "llm"
+                    prompt_id = self.engine._scoring_prompt_template(question).id
+                    try:
+                        # Span llm.invoke:score chỉ ghi vào tracer của phiên (không ghi thêm vào tracer của engine)
+                        response = await self.llm_gate.run(self.engine._invoke_llm, prompt, "score", prompt_id,
+                                                           session.tracer)
+                    except LLMUnavailableError:
+                        # Model chính và dự phòng đều lỗi: điểm mặc định, ghi rõ trong scoring_timings
+                        response, scored_by = "", "default"
+                        self.stats["llm_unavailable"] += 1
+                    score, scored_by = self.engine._parse_score(response, scored_by)
+                elapsed = round(time.perf_counter() - started, 3)
+
+                session.answers.append(answer)
+                session.scores.append(score)
+                session.total_score += score
+                session.max_possible_score += 10
+                session.scoring_timings.append({
+                    "question_id": question["id"],
+                    "scored_by": scored_by,
+                    "time_to_score": elapsed,
+                    "time_to_first_feedback": elapsed,
+                    "total_time": elapsed,
+                    "context": context
+                })
+                self.stats["answers_scored"] += 1
+                result.update({
+                    "score": score,
+                    "total_score": round(session.total_score, 2),
+                    "max_possible_score": session.max_possible_score,
+                    "average_score": round(session.average, 2)
+                })
+
+            session.advance()
+            if session.finished:
+                result["finished"] = True
+                result["result"] = await self.finish_session(session)
+            else:
+                self._prefetch_context(session)
+                result["finished"] = False
+                result["next_question"] = _public_question(session.current_question())
+            return result
+
+    async def finish_session(self, session: InterviewSession) -> Dict[str, Any]:
+        """Kết thúc phiên, xuất kết quả và giải phóng trạng thái"""
+        session.finished = True
+        self.sessions.pop(session.session_id, None)
+        duration = (datetime.now() - session.interview_start_time).total_seconds() / 60
+        session.candidate_info["interview_duration"] = round(duration, 2)
+        interview_data = build_interview_data(session)
+        result_id = await self._run_blocking(self.results_store.add, interview_data)
+        self.stats["sessions_completed"] += 1
+        summary = session.summary()
+        summary["result_id"] = result_id
+        return summary
+
+    async def _reap_idle_sessions(self):
+        """Xóa các phiên không hoạt động quá session_ttl giây"""
+        while True:
+            await asyncio.sleep(min(60, self.session_ttl))
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if now - session.last_active > self.session_ttl and not session.lock.locked():
+                    self.sessions.pop(session_id, None)
+
+    # ------------------------------------------------------------------
+    # HTTP handlers
+    # ------------------------------------------------------------------
+    def _get_session(self, request: web.Request) -> InterviewSession:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text='{"error": "Không tìm thấy phiên"}', content_type="application/json")
+        return session
+
+    async def handle_create(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        session = await self.start_session(body.get("candidate_info", {}), body.get("cv_text", ""))
+        return web.json_response({
+            "session_id": session.session_id,
+            "total_questions": len(session.questions),
+            "question": _public_question(session.current_question())
+        }, status=201)
+
+    async def handle_get(self, request: web.Request) -> web.Response:
+        session = self._get_session(request)
+        data = session.summary()
+        data["question"] = _public_question(session.current_question())
+        return web.json_response(data)
+
+    async def handle_answer(self, request: web.Request) -> web.Response:
+        session = self._get_session(request)
+        body = await request.json()
+        return web.json_response(await self.submit_answer(session, str(body.get("answer", ""))))
+
+    async def handle_finish(self, request: web.Request) -> web.Response:
+        session = self._get_session(request)
+        async with session.lock:
+            return web.json_response(await self.finish_session(session))
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        session = self._get_session(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        await ws.send_json({"type": "question", "question": _public_question(session.current_question())})
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                if msg.type == WSMsgType.ERROR:
+                    break
+                continue
+            try:
+                payload = msg.json()
+                result = await self.submit_answer(session, str(payload.get("answer", "")))
+            except ServerBusy:
+                await ws.send_json({"type": "error", "error": "busy", "retry_after": 1})
+                continue
+            except ValueError:
+                await ws.send_json({"type": "error", "error": "invalid_json"})
+                continue
+
+            await ws.send_json(dict(result, type="score"))
+            if result.get("finished"):
+                await ws.send_json({"type": "finished", "result": result.get("result")})
+                break
+            await ws.send_json({"type": "question", "question": result.get("next_question")})
+
+        await ws.close()
+        return ws
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        extra = {}
+        if hasattr(self.engine.embeddings, "stats"):
+            extra["embedding_batcher"] = self.engine.embeddings.stats()
+        if isinstance(self.engine.llm, ResilientLLM):
+            extra["llm"] = self.engine.llm.metrics()
+        return web.json_response(dict(
+            self.stats,
+            **extra,
+            active_sessions=len(self.sessions),
+            max_sessions=self.max_sessions,
+            llm_inflight=self.llm_gate.inflight if self.llm_gate else 0,
+            llm_waiting=self.llm_gate.waiting if self.llm_gate else 0,
+            process_cpu_seconds=round(time.process_time(), 3),
+            trace=self.engine.tracer.summary()
+        ))
+
+    @web.middleware
+    async def _busy_middleware(self, request: web.Request, handler):
+        try:
+            return await handler(request)
+        except ServerBusy:
+            self.stats["rejected_busy"] += 1
+            return web.json_response({"error": "Server đang quá tải, vui lòng thử lại"},
+                                     status=503, headers={"Retry-After": "1"})
+
+    async def _on_startup(self, app: web.Application):
+        # Semaphore phải được tạo trong event loop đang chạy
+        self.llm_gate = LLMGate(self.executor, self.max_inflight_llm, self.max_waiting_llm)
+        self._reaper = asyncio.create_task(self._reap_idle_sessions())
+
+    async def _on_cleanup(self, app: web.Application):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        self.executor.shutdown(wait=False)
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._busy_middleware])
+        app.add_routes([
+            web.post("/sessions", self.handle_create),
+            web.get("/sessions/{session_id}", self.handle_get),
+            web.post("/sessions/{session_id}/answer", self.handle_answer),
+            web.post("/sessions/{session_id}/finish", self.handle_finish),
+            web.get("/sessions/{session_id}/ws", self.handle_websocket),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server phỏng vấn nhiều phiên (HTTP/WebSocket)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-sessions", type=int, default=100, help="Số phiên phỏng vấn đồng thời tối đa")
+    parser.add_argument("--max-inflight-llm", type=int, default=16, help="Số lời gọi LLM đồng thời tối đa")
+    parser.add_argument("--max-waiting-llm", type=int, default=64, help="Số lời gọi LLM được xếp hàng trước khi trả 503")
+    parser.add_argument("--session-ttl", type=float, default=1800, help="Thời gian (giây) trước khi xóa phiên không hoạt động")
+    parser.add_argument("--results-db", default="interview_results/results.db", help="Kho kết quả SQLite")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Số tiến trình worker cho embed/search (pre-fork, dùng chung index chỉ đọc); 0 = chạy trong tiến trình chính")
+    parser.add_argument("--batch-embeddings", action="store_true",
+                        help="Gom các truy vấn embedding đồng thời thành batch")
+    parser.add_argument("--max-batch", type=int, default=32, help="Kích thước batch embedding tối đa")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Thời gian chờ gom batch tối đa (ms)")
+    parser.add_argument("--fake-llm", action="store_true", help="Dùng LLM/retriever giả lập (load test, không cần model)")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="Độ trễ (giây) của LLM giả lập")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0,
+                        help="Tỷ lệ lỗi chèn vào LLM giả lập (kiểm tra retry/fallback của ResilientLLM)")
+    parser.add_argument("--llm-timeout", type=float, default=60.0, help="Deadline (giây) cho cả lời gọi LLM, gồm retry và model dự phòng")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Gửi thêm một lời gọi LLM khi lời gọi chậm hơn p95 (tốn thêm chi phí)")
+    parser.add_argument("--prescore", action="store_true",
+                        help="Chấm sơ bộ ở máy câu trống/lạc đề (chạy prescore.py --calibrate trước)")
+    parser.add_argument("--knowledge-shard", action="append", default=[], metavar="DIR",
+                        help="Thêm FAISS index kiến thức (truy vấn song song cùng knowledge_db), có thể lặp lại")
+    args = parser.parse_args()
+
+    if args.fake_llm:
+        from fake_llm import FakeLLM, FakeResources, FaultyLLM
+        resources = FakeResources(llm_latency=args.fake_latency)
+        if args.fake_error_rate:
+            resources.llm = ResilientLLM(FaultyLLM(resources.llm, error_rate=args.fake_error_rate),
+                                         fallback=FakeLLM(latency=args.fake_latency), timeout=args.llm_timeout,
+                                         hedge=args.hedge)
+    else:
+        from interview import InterviewResources
+        resources = InterviewResources(
+            batch_embeddings=args.batch_embeddings,
+            max_batch=args.max_batch,
+            max_wait_ms=args.max_wait_ms,
+            llm_timeout=args.llm_timeout,
+            hedge=args.hedge,
+            knowledge_shards=args.knowledge_shard
+        )
+        if args.workers:
+            # Fork worker ngay sau khi load model/index, trước khi event loop và thread pool chạy;
+            # mọi lệnh embed (retriever, chấm sơ bộ, lọc trùng, truy vấn kèm id, shard) chạy trong worker
+            from worker_pool import SharedIndexPool
+            pool = SharedIndexPool(
+                resources.embeddings,
+                {"cv": resources.cv_db, "knowledge": resources.knowledge_db},
+                workers=args.workers
+            )
+            pool.attach(resources, k=3)
+
+    server = InterviewServer(
+        resources,
+        max_sessions=args.max_sessions,
+        max_inflight_llm=args.max_inflight_llm,
+        max_waiting_llm=args.max_waiting_llm,
+        session_ttl=args.session_ttl,
+        question_bank_dir=None if args.fake_llm else "question_bank",
+        results_db=args.results_db,
+        prescore=args.prescore
+    )
+    web.run_app(server.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Iterator
+
+from tracing import active_span
+
+# Lớp bọc LLM dùng chung (Gemini qua langchain hoặc bất kỳ object có .invoke/.stream):
+#   - deadline chung cho cả lời gọi (timeout): mọi lần retry, backoff và model dự phòng dùng chung ngân sách,
+#     hết hạn thì dừng; lời gọi quá hạn bị bỏ lại chạy nốt trong pool (đếm trong abandoned/abandoned_running)
+#   - retry với backoff ngẫu nhiên (full jitter) để nhiều phiên không retry cùng lúc
+#   - hedged request (tùy chọn, hedge=True): lời gọi chậm hơn p95 gần đây được gửi thêm một bản, lấy kết quả về trước;
+#     mỗi bản hedge là một lời gọi Gemini tính phí (kể cả payload nhiều ảnh) và callback langchain chạy 2 lần
+#   - circuit breaker: lỗi liên tiếp thì chuyển ngay sang model dự phòng trong reset_timeout giây
+#   - thống kê độ trễ p50/p95/p99, số lần retry/hedge/fallback theo từng model (metrics())
+#   - lời gọi chạy trong bản sao context của nơi gọi: callback tracing ghi vào span đang mở (vd: llm.invoke:score),
+#     số lần retry/hedge/fallback cũng được cộng vào span đó
+# Kiểm thử không cần mạng với FaultyLLM trong fake_llm.py:
+#   python benchmarks/bench_llm_client.py
+
+
+class LLMUnavailableError(RuntimeError):
+    """Model chính và model dự phòng đều lỗi hoặc quá hạn"""
+
+
+class CircuitBreaker:
+    """closed → open sau failure_threshold lỗi liên tiếp → half_open sau reset_timeout (cho 1 lời gọi thử)"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class LatencyStats:
+    """Độ trễ của các lời gọi thành công gần đây (cửa sổ trượt) và bộ đếm sự kiện"""
+
+    def __init__(self, window: int = 500):
+        self.latencies: deque = deque(maxlen=window)
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def count(self, event: str, amount: int = 1):
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self.latencies)
+        if not values:
+            return None
+        # Nội suy tuyến tính giống np.percentile
+        rank = (len(values) - 1) * q / 100
+        low = int(rank)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (rank - low)
+
+    def snapshot(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = dict(self.counters)
+        result["samples"] = len(self.latencies)
+        for q in (50, 95, 99):
+            value = self.percentile(q)
+            result[f"p{q}_s"] = round(value, 3) if value is not None else None
+        return result
+
+
+class ResilientLLM:
+    """Bọc model chính (và model dự phòng) với deadline, retry, hedging và circuit breaker; cùng interface invoke/stream"""
+
+    def __init__(self, primary, fallback=None, timeout: float = 60.0, retries: int = 2,
+                 backoff: float = 0.5, max_backoff: float = 8.0, hedge: bool = False,
+                 hedge_percentile: float = 95, hedge_min_samples: int = 20, hedge_min_delay: float = 0.5,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, max_workers: int = 32,
+                 names: Optional[List[str]] = None, seed: Optional[int] = None):
+        self.models = [primary] + ([fallback] if fallback is not None else [])
+        self.names = names or ["primary", "fallback"][:len(self.models)]
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        # Chưa đủ mẫu thì chưa hedge; không hedge sớm hơn hedge_min_delay để tránh nhân đôi mọi lời gọi nhanh
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.breakers = [CircuitBreaker(failure_threshold, reset_timeout) for _ in self.models]
+        self.stats = {name: LatencyStats() for name in self.names}
+        self._rng = random.Random(seed)
+        # Lời gọi quá hạn vẫn chạy tiếp trong thread của nó (không hủy được), pool đủ lớn để không chặn lời gọi mới
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def __getattr__(self, name):
+        # Thuộc tính khác (model, temperature, ...) lấy từ model chính
+        if name.startswith("_") or name == "models":
+            raise AttributeError(name)
+        return getattr(self.models[0], name)
+
+    def _hedge_delay(self, stats: LatencyStats) -> Optional[float]:
+        if not self.hedge or len(stats.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, stats.percentile(self.hedge_percentile))
+
+    def _submit(self, fn, *args, **kwargs):
+        # Mỗi lần submit một bản sao riêng: một Context không thể chạy đồng thời ở 2 thread (lời gọi hedge)
+        return self._executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    def _sleep_backoff(self, attempt: int, deadline: float):
+        delay = self._rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+    @staticmethod
+    def _abandon(stats: LatencyStats, futures):
+        """Lời gọi quá hạn không hủy được: đếm số thread của pool còn bị chiếm cho tới khi chúng chạy xong"""
+        for future in futures:
+            stats.count("abandoned")
+            stats.count("abandoned_running")
+            future.add_done_callback(lambda _: stats.count("abandoned_running", -1))
+
+    def _attempt(self, model, stats: LatencyStats, prompt, kwargs: Dict[str, Any], deadline: float, span=None):
+        """Một lần gọi tới deadline; sau độ trễ p95 gửi thêm một bản (hedge), lấy kết quả thành công đầu tiên"""
+        started = time.monotonic()
+        pending = {self._submit(model.invoke, prompt, **kwargs)}
+        hedge_delay = self._hedge_delay(stats)
+        hedged = None
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = remaining
+            if hedge_delay is not None and hedged is None:
+                wait_for = min(remaining, max(0.0, started + hedge_delay - time.monotonic()))
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    stats.add(time.monotonic() - started)
+                    if future is hedged:
+                        stats.count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+            if not done and hedge_delay is not None and hedged is None:
+                stats.count("hedges")
+                if span is not None:
+                    span.add("hedges")
+                hedged = self._submit(model.invoke, prompt, **kwargs)
+                pending.add(hedged)
+        if pending:
+            stats.count("timeouts")
+            self._abandon(stats, pending)
+            raise TimeoutError(f"LLM không phản hồi trong {self.timeout}s")
+        raise error
+
+    def invoke(self, prompt, config: Optional[Dict[str, Any]] = None, **kwargs):
+        """Như llm.invoke; config (callbacks của langchain) được chuyển tiếp nguyên vẹn"""
+        if config is not None:
+            kwargs["config"] = config
+        span = active_span()
+        deadline = time.monotonic() + self.timeout
+        last_error: Optional[BaseException] = None
+        for index, (model, breaker, name) in enumerate(zip(self.models, self.breakers, self.names)):
+            stats = self.stats[name]
+            if time.monotonic() >= deadline:
+                break
+            if not breaker.allow():
+                stats.count("short_circuited")
+                continue
+            if index > 0:
+                self.stats[self.names[0]].count("fallbacks")
+                if span is not None:
+                    span.set("fallback", name)
+            for attempt in range(self.retries + 1):
+                stats.count("calls")
+                try:
+                    result = self._attempt(model, stats, prompt, kwargs, deadline, span)
+                except Exception as e:
+                    last_error = e
+                    stats.count("failures")
+                    if attempt < self.retries and time.monotonic() < deadline:
+                        stats.count("retries")
+                        if span is not None:
+                            span.add("retries")
+                        self._sleep_backoff(attempt, deadline)
+                    if time.monotonic() >= deadline:
+                        break
+                    continue
+                breaker.success()
+                return result
+            breaker.failure()
+        raise LLMUnavailableError(f"Không gọi được LLM: {last_error}") from last_error
+
+    def stream(self, prompt, **kwargs) -> Iterator[str]:
+        """Như llm.stream; deadline/retry/fallback áp dụng tới chunk đầu tiên, sau đó đọc tiếp không giới hạn"""
+        span = active_span()
+        deadline = time.monotonic() + self.timeout
+        last_error: Optional[BaseException] = None
+        for index, (model, breaker, name) in enumerate(zip(self.models, self.breakers, self.names)):
+            stats = self.stats[name]
+            if time.monotonic() >= deadline:
+                break
+            if not breaker.allow():
+                stats.count("short_circuited")
+                continue
+            if index > 0:
+                self.stats[self.names[0]].count("fallbacks")
+                if span is not None:
+                    span.set("fallback", name)
+            for attempt in range(self.retries + 1):
+                stats.count("calls")
+                future = None
+                try:
+                    chunks = iter(model.stream(prompt, **kwargs))
+                    future = self._submit(next, chunks, None)
+                    first = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception as e:
+                    last_error = e
+                    stats.count("failures")
+                    if isinstance(e, TimeoutError):
+                        stats.count("timeouts")
+                        if future is not None and not future.done():
+                            self._abandon(stats, [future])
+                        last_error = TimeoutError(f"LLM không gửi chunk đầu tiên trong {self.timeout}s")
+                    if attempt < self.retries and time.monotonic() < deadline:
+                        stats.count("retries")
+                        if span is not None:
+                            span.add("retries")
+                        self._sleep_backoff(attempt, deadline)
+                    if time.monotonic() >= deadline:
+                        break
+                    continue
+                breaker.success()
+                # Thời gian tới chunk đầu không gộp vào cửa sổ độ trễ của invoke (dùng để tính mốc hedge)
+                stats.count("streams")
+                if first is not None:
+                    yield first
+                yield from chunks
+                return
+            breaker.failure()
+        raise LLMUnavailableError(f"Không gọi được LLM: {last_error}") from last_error
+
+    def metrics(self) -> Dict[str, Any]:
+        """Thống kê theo model: số lời gọi, lỗi, retry, hedge, fallback, trạng thái breaker và độ trễ p50/p95/p99"""
+        return {name: {**self.stats[name].snapshot(), "breaker": breaker.state}
+                for name, breaker in zip(self.names, self.breakers)}
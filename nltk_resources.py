@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import argparse
+import functools
+from pathlib import Path
+from typing import List, Optional
+
+# Tìm dữ liệu tokenizer Punkt ở máy (không bao giờ gọi mạng khi build index).
+# Thứ tự tìm: thư mục nltk_data/ đi kèm repo, biến môi trường NLTK_DATA, các thư mục mặc định của NLTK.
+# Tải về (một lần, có mạng) vào thư mục đi kèm repo: python nltk_resources.py --vendor
+
+VENDOR_DIR = Path(__file__).resolve().parent / "nltk_data"
+
+# NLTK >= 3.8.2 dùng punkt_tab (thư mục), bản cũ hơn dùng punkt (pickle)
+_RESOURCES = ("tokenizers/punkt_tab/{language}", "tokenizers/punkt/{language}.pickle")
+
+
+def _candidate_dirs() -> List[Path]:
+    dirs = [VENDOR_DIR]
+    dirs += [Path(p) for p in os.environ.get("NLTK_DATA", "").split(os.pathsep) if p]
+    try:
+        import nltk
+        dirs += [Path(p) for p in nltk.data.path]
+    except ImportError:
+        pass
+    return dirs
+
+
+def find_punkt(language: str = "english") -> Optional[Path]:
+    """Thư mục nltk_data chứa Punkt cho ngôn ngữ này, None nếu không có"""
+    for directory in _candidate_dirs():
+        for resource in _RESOURCES:
+            if (directory / resource.format(language=language)).exists():
+                return directory
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_punkt(language: str = "english") -> str:
+    """Đảm bảo NLTK tìm thấy Punkt từ dữ liệu có sẵn ở máy; kết quả được cache trong tiến trình"""
+    directory = find_punkt(language)
+    if directory is None:
+        raise LookupError(
+            f"Không tìm thấy dữ liệu NLTK Punkt ({language}). "
+            f"Chạy 'python nltk_resources.py --vendor' (cần mạng, một lần) "
+            f"hoặc chép thư mục nltk_data có tokenizers/punkt_tab vào {VENDOR_DIR}"
+        )
+    import nltk
+    # Đặt thư mục tìm được lên đầu để nltk.data.find không phải quét các thư mục khác
+    if str(directory) in nltk.data.path:
+        nltk.data.path.remove(str(directory))
+    nltk.data.path.insert(0, str(directory))
+    return str(directory)
+
+
+def vendor(target: Path = VENDOR_DIR) -> bool:
+    """Tải punkt/punkt_tab vào thư mục đi kèm repo (lệnh duy nhất cần mạng)"""
+    import nltk
+    target.mkdir(parents=True, exist_ok=True)
+    ok = True
+    for package in ("punkt_tab", "punkt"):
+        ok &= bool(nltk.download(package, download_dir=str(target), quiet=True))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quản lý dữ liệu NLTK Punkt cục bộ")
+    parser.add_argument("--vendor", action="store_true", help=f"Tải Punkt vào {VENDOR_DIR}")
+    parser.add_argument("--language", default="english")
+    args = parser.parse_args()
+
+    if args.vendor:
+        if not vendor():
+            print("❌ Không tải được dữ liệu Punkt")
+            sys.exit(1)
+        print(f"✅ Đã tải Punkt vào {VENDOR_DIR}")
+
+    started = time.perf_counter()
+    try:
+        directory = ensure_punkt(args.language)
+    except LookupError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Punkt ({args.language}): {directory} ({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
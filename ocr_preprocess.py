@@ -0,0 +1,324 @@
+import re
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageOps
+import pytesseract
+
+# Tiền xử lý ảnh trước khi OCR bằng Tesseract (chỉ dùng PIL + numpy):
+#   1. chuyển xám và thu nhỏ về target_dpi (ảnh chụp/scan DPI cao làm Tesseract chậm mà không chính xác hơn)
+#   2. chỉnh nghiêng: thử các góc trong ±max_skew độ, chọn góc làm profile theo hàng "sắc" nhất
+#   3. làm phẳng nền (chia cho nền đã làm mờ, xử lý ảnh chụp bị tối góc) rồi nhị phân hóa bằng ngưỡng Otsu
+#   4. (regions=True) tách vùng chữ bằng XY-cut theo khoảng trắng, bỏ vùng quá nhỏ hoặc quá đặc (ảnh chân dung, logo)
+#   5. OCR cả trang, hoặc từng vùng (--psm 6, mỗi vùng một tiến trình tesseract); bỏ dòng không có chữ/số
+# OCR theo vùng và việc bật tiền xử lý trong vectodbofcv/generate_questions là tùy chọn cho tới khi
+# có số đo --compare trên CV thật.
+# Mỗi ảnh có báo cáo thời gian từng bước và số ký tự:
+#   python ocr_preprocess.py CV/2.png --compare          # so với OCR ảnh gốc
+#   python ocr_preprocess.py CV/*.png --debug outputs/ocr # lưu ảnh nhị phân kèm khung các vùng
+
+TARGET_DPI = 300
+# Ảnh không có metadata DPI: coi cạnh ngắn là chiều rộng trang A4 (8.27 inch)
+A4_WIDTH_INCH = 8.27
+# Vùng có tỷ lệ điểm mực cao hơn mức này là ảnh/đồ họa, không phải chữ
+MAX_TEXT_DENSITY = 0.45
+
+Box = Tuple[int, int, int, int]
+
+
+def estimate_dpi(img: Image.Image) -> float:
+    """DPI từ metadata, nếu không có thì ước lượng theo khổ A4"""
+    dpi = img.info.get("dpi")
+    if dpi and dpi[0] and float(dpi[0]) > 1:
+        return float(dpi[0])
+    return min(img.size) / A4_WIDTH_INCH
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Ngưỡng Otsu: cực đại phương sai giữa hai lớp trên histogram 256 mức xám"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean[-1] * weight / total - mean) ** 2 / (weight * (total - weight))
+    if not np.isfinite(between[:-1]).any():
+        # Ảnh một màu (trang trắng)
+        return 127
+    return int(np.nanargmax(between[:-1]))
+
+
+def flatten_background(gray: Image.Image) -> Image.Image:
+    """Chia ảnh cho nền (ảnh làm mờ mạnh) để bù ánh sáng không đều của ảnh chụp"""
+    radius = max(8, min(gray.size) // 30)
+    background = np.asarray(gray.filter(ImageFilter.BoxBlur(radius)), dtype=np.float32)
+    flat = np.asarray(gray, dtype=np.float32) / np.maximum(background, 1.0) * 255.0
+    return Image.fromarray(np.clip(flat, 0, 255).astype(np.uint8))
+
+
+def estimate_skew(gray: Image.Image, max_skew: float = 5.0, work_width: int = 800) -> float:
+    """Góc nghiêng (độ) làm tổng bình phương chênh lệch số điểm mực giữa các hàng liên tiếp lớn nhất"""
+    small = gray
+    if gray.width > work_width:
+        small = gray.resize((work_width, max(1, gray.height * work_width // gray.width)), Image.BILINEAR)
+    pixels = np.asarray(small)
+    ink = Image.fromarray(((pixels <= otsu_threshold(pixels)) * 255).astype(np.uint8))
+
+    def sharpness(angle: float) -> float:
+        rows = np.asarray(ink.rotate(angle, resample=Image.NEAREST, fillcolor=0), dtype=np.float32).sum(axis=1)
+        return float(np.square(np.diff(rows)).sum())
+
+    def best_angle(angles: np.ndarray) -> Optional[float]:
+        # Bằng điểm thì chọn góc gần 0 nhất; profile phẳng (trang trắng) thì không có góc nào tốt hơn
+        scores = [sharpness(a) for a in angles]
+        if max(scores) - min(scores) <= 1e-6 * max(max(scores), 1.0):
+            return None
+        return float(max(zip(scores, -np.abs(angles), angles))[2])
+
+    # Dò thô mỗi 1 độ, sau đó dò mịn 0.1 độ quanh góc tốt nhất (không vượt ±max_skew)
+    best = best_angle(np.arange(-max_skew, max_skew + 0.01, 1.0))
+    if best is None:
+        return 0.0
+    fine = np.arange(max(-max_skew, best - 1.0), min(max_skew, best + 1.0) + 0.01, 0.1)
+    # Dò mịn không phân biệt được các góc lân cận: giữ góc của lần dò thô
+    fine_best = best_angle(fine)
+    return round(float(fine_best if fine_best is not None else best), 2) + 0.0
+
+
+def ink_runs(profile: np.ndarray, min_gap: int) -> List[Tuple[int, int]]:
+    """Các đoạn [start, end) có mực, gộp các đoạn cách nhau không quá min_gap điểm trắng"""
+    filled = np.flatnonzero(profile)
+    if not len(filled):
+        return []
+    breaks = np.flatnonzero(np.diff(filled) > min_gap + 1)
+    starts = np.concatenate(([filled[0]], filled[breaks + 1]))
+    ends = np.concatenate((filled[breaks], [filled[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def xy_cut(ink: np.ndarray, row_gap: int, col_gap: int, depth: int = 6) -> List[Box]:
+    """Chia đệ quy theo khoảng trắng ngang (ưu tiên) rồi dọc; trả về các khung (left, top, right, bottom) theo thứ tự đọc"""
+    boxes: List[Box] = []
+
+    def cut(top: int, bottom: int, left: int, right: int, level: int):
+        block = ink[top:bottom, left:right]
+        rows = ink_runs(block.sum(axis=1), row_gap)
+        cols = ink_runs(block.sum(axis=0), col_gap)
+        if not rows or not cols:
+            return
+        if level >= depth or (len(rows) == 1 and len(cols) == 1):
+            boxes.append((left + cols[0][0], top + rows[0][0], left + cols[-1][1], top + rows[-1][1]))
+        elif len(rows) > 1:
+            for start, end in rows:
+                cut(top + start, top + end, left, right, level + 1)
+        else:
+            for start, end in cols:
+                cut(top, bottom, left + start, left + end, level + 1)
+
+    cut(0, ink.shape[0], 0, ink.shape[1], 0)
+    return boxes
+
+
+def clean_text(text: str) -> str:
+    """Bỏ dòng chỉ có ký hiệu nhiễu (|, ~, _...) và gộp nhiều dòng trống liên tiếp"""
+    lines = [line.rstrip() for line in text.splitlines()]
+    lines = [line if re.search(r"\w", line) else "" for line in lines]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class OCRPreprocessor:
+    """Tiền xử lý + OCR theo vùng; báo cáo của từng ảnh được trả về cùng text (không giữ lại trong instance)"""
+
+    def __init__(self, target_dpi: float = TARGET_DPI, deskew: bool = True, max_skew: float = 5.0,
+                 binarize: bool = True, regions: bool = False, max_regions: int = 16,
+                 lang: Optional[str] = None, min_region_area: int = 400):
+        self.target_dpi = target_dpi
+        self.deskew = deskew
+        self.max_skew = max_skew
+        self.binarize = binarize
+        self.regions = regions
+        # Mỗi vùng là một lần gọi tesseract (khởi động ~50ms): quá nhiều vùng thì gộp lại
+        self.max_regions = max_regions
+        self.lang = lang
+        self.min_region_area = min_region_area
+
+    def prepare(self, img: Image.Image) -> Tuple[Image.Image, List[Box], Dict[str, Any]]:
+        """Ảnh đã xử lý, các vùng chữ và báo cáo (chưa OCR)"""
+        timings: Dict[str, float] = {}
+        report: Dict[str, Any] = {"original_size": list(img.size), "timings_ms": timings}
+
+        started = time.perf_counter()
+        img = ImageOps.exif_transpose(img)
+        gray = img.convert("L")
+        dpi = estimate_dpi(img)
+        scale = min(1.0, self.target_dpi / dpi)
+        if scale < 0.95:
+            gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+                               Image.LANCZOS, reducing_gap=2.0)
+        report.update({"dpi": round(dpi), "scale": round(scale, 3), "size": list(gray.size)})
+        timings["resize"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        angle = estimate_skew(gray, self.max_skew) if self.deskew else 0.0
+        if abs(angle) >= 0.1:
+            gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        report["skew"] = angle
+        timings["deskew"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        if self.binarize:
+            flat = flatten_background(gray)
+            pixels = np.asarray(flat)
+            threshold = otsu_threshold(pixels)
+            gray = Image.fromarray(np.where(pixels > threshold, 255, 0).astype(np.uint8))
+        timings["binarize"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        boxes = [(0, 0, gray.width, gray.height)]
+        if self.regions:
+            boxes, skipped = self.detect_regions(gray)
+            report["skipped_regions"] = skipped
+        report["regions"] = len(boxes)
+        timings["regions"] = (time.perf_counter() - started) * 1000
+        return gray, boxes, report
+
+    def detect_regions(self, gray: Image.Image) -> Tuple[List[Box], int]:
+        """Vùng chữ (đã nới lề vài điểm) và số vùng bị bỏ qua"""
+        pixels = np.asarray(gray)
+        ink = pixels <= (127 if self.binarize else otsu_threshold(pixels))
+        # Khoảng trắng giữa các khối ~ một dòng trống (0.12 inch), giữa các cột ~ 2% chiều rộng
+        row_gap = max(4, round(gray.width / A4_WIDTH_INCH * 0.12))
+        col_gap = max(6, gray.width // 50)
+        boxes = xy_cut(ink, row_gap, col_gap)
+        while len(boxes) > self.max_regions:
+            row_gap, col_gap = row_gap * 2, col_gap * 2
+            boxes = xy_cut(ink, row_gap, col_gap)
+
+        kept: List[Box] = []
+        for left, top, right, bottom in boxes:
+            area = (right - left) * (bottom - top)
+            if area < self.min_region_area or ink[top:bottom, left:right].mean() > MAX_TEXT_DENSITY:
+                continue
+            pad = 4
+            kept.append((max(0, left - pad), max(0, top - pad), min(gray.width, right + pad),
+                         min(gray.height, bottom + pad)))
+        return kept, len(boxes) - len(kept)
+
+    def ocr(self, img: Image.Image, name: str = "") -> Tuple[str, Dict[str, Any]]:
+        """Text đã OCR và báo cáo của ảnh (thời gian từng bước, số vùng, số ký tự)"""
+        total_started = time.perf_counter()
+        processed, boxes, report = self.prepare(img)
+        started = time.perf_counter()
+        if self.regions:
+            # Vùng đã là một khối chữ: --psm 6 nhanh hơn để Tesseract tự phân tích bố cục
+            parts = [pytesseract.image_to_string(processed.crop(box), lang=self.lang, config="--psm 6")
+                     for box in boxes]
+        else:
+            parts = [pytesseract.image_to_string(processed, lang=self.lang)]
+        text = clean_text("\n\n".join(parts))
+        report["timings_ms"]["ocr"] = (time.perf_counter() - started) * 1000
+        report["timings_ms"]["total"] = (time.perf_counter() - total_started) * 1000
+        report["timings_ms"] = {k: round(v, 1) for k, v in report["timings_ms"].items()}
+        report["chars"] = len(text)
+        if name:
+            report = {"file": name, **report}
+        return text, report
+
+    def ocr_file(self, path: Union[str, Path]) -> Tuple[str, Dict[str, Any]]:
+        path = Path(path)
+        with Image.open(path) as img:
+            # JPEG: giải mã thẳng ở độ phân giải nhỏ hơn (nhanh hơn nhiều so với giải mã đủ rồi thu nhỏ)
+            scale = self.target_dpi / estimate_dpi(img)
+            size = list(img.size)
+            if scale <= 0.5:
+                width = img.width
+                img.draft("L", (round(img.width * scale), round(img.height * scale)))
+                if img.info.get("dpi"):
+                    img.info["dpi"] = tuple(d * img.width / width for d in img.info["dpi"])
+            img.load()
+            text, report = self.ocr(img, path.name)
+        report["original_size"] = size
+        return text, report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Một dòng tóm tắt cho log"""
+    t = report["timings_ms"]
+    size = "x".join(map(str, report["original_size"]))
+    if report["size"] != report["original_size"]:
+        size += " → " + "x".join(map(str, report["size"]))
+    chars = f"{report['chars']} ký tự, " if "chars" in report else ""
+    ocr = f", OCR {t['ocr']:.0f}ms" if "ocr" in t else ""
+    return (f"{report.get('file', 'ảnh')}: {size}, nghiêng {report['skew']}°, {report['regions']} vùng, "
+            f"{chars}{t.get('total', sum(t.values())):.0f}ms (tiền xử lý "
+            f"{t['resize'] + t['deskew'] + t['binarize'] + t['regions']:.0f}ms{ocr})")
+
+
+def _tesseract_available() -> bool:
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiền xử lý ảnh CV trước khi OCR và báo cáo thời gian/số ký tự")
+    parser.add_argument("images", nargs="+", help="Các file ảnh")
+    parser.add_argument("--target-dpi", type=float, default=TARGET_DPI)
+    parser.add_argument("--no-deskew", action="store_true")
+    parser.add_argument("--no-binarize", action="store_true")
+    parser.add_argument("--regions", action="store_true", help="OCR từng vùng chữ thay vì cả trang")
+    parser.add_argument("--lang", default=None, help="Ngôn ngữ Tesseract, vd: vie+eng")
+    parser.add_argument("--compare", action="store_true", help="OCR thêm ảnh gốc để so sánh")
+    parser.add_argument("--debug", help="Lưu ảnh đã xử lý kèm khung các vùng vào thư mục này")
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    preprocessor = OCRPreprocessor(target_dpi=args.target_dpi, deskew=not args.no_deskew,
+                                   binarize=not args.no_binarize, regions=args.regions, lang=args.lang)
+    run_ocr = _tesseract_available()
+    if not run_ocr:
+        print("⚠️ Không tìm thấy Tesseract (đặt TESSERACT_CMD): chỉ chạy bước tiền xử lý")
+
+    reports = []
+    for path in map(Path, args.images):
+        with Image.open(path) as img:
+            img.load()
+        if run_ocr:
+            _, report = preprocessor.ocr(img, path.name)
+        else:
+            processed, boxes, report = preprocessor.prepare(img)
+            report["timings_ms"] = {k: round(v, 1) for k, v in report["timings_ms"].items()}
+            report = {"file": path.name, **report}
+        print(f"🖼️ {format_report(report)}")
+
+        if args.compare and run_ocr:
+            started = time.perf_counter()
+            raw_text = clean_text(pytesseract.image_to_string(img, lang=args.lang))
+            report["raw"] = {"chars": len(raw_text), "ms": round((time.perf_counter() - started) * 1000, 1)}
+            speedup = report["raw"]["ms"] / max(report["timings_ms"]["total"], 1e-3)
+            print(f"   ảnh gốc: {report['raw']['chars']} ký tự, {report['raw']['ms']:.0f}ms (nhanh hơn x{speedup:.2f})")
+
+        if args.debug:
+            if run_ocr:
+                processed, boxes, _ = preprocessor.prepare(img)
+            debug = processed.convert("RGB")
+            draw = ImageDraw.Draw(debug)
+            for box in boxes:
+                draw.rectangle(box, outline=(255, 0, 0), width=2)
+            Path(args.debug).mkdir(parents=True, exist_ok=True)
+            debug.save(Path(args.debug) / f"{path.stem}_regions.png")
+        reports.append(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import re
+import sys
+import json
+import argparse
+import threading
+from pathlib import Path
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from token_utils import estimate_tokens
+
+# Chấm sơ bộ câu trả lời ở máy trước khi gọi LLM: embed câu trả lời (cùng model e5 với vector database),
+# so với câu hỏi, context chấm điểm và các ý chính tham chiếu (nếu có), cộng thêm độ dài và tỷ lệ từ khóa
+# của context xuất hiện trong câu trả lời. Câu trả lời gần như trống hoặc rõ ràng lạc đề được chấm luôn
+# ở máy (0-2 điểm); các trường hợp còn lại vẫn gửi LLM chấm như trước.
+# Mặc định tắt (InterviewSystem(prescore=False)) cho tới khi ngưỡng được hiệu chỉnh theo điểm LLM thật.
+#   python prescore.py --calibrate                        # so với các câu do LLM chấm (scored_by="llm") trong kho
+#   python prescore.py --calibrate --embeddings synthetic # chạy thử không cần model
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Từ quá phổ biến trong context tiếng Việt/tiếng Anh, không mang nội dung
+_STOPWORDS = {
+    "của", "và", "các", "những", "được", "cho", "với", "trong", "này", "một", "là", "có", "không", "để",
+    "khi", "theo", "như", "từ", "đến", "về", "thì", "mà", "hoặc", "nhưng", "cũng", "đã", "sẽ", "đang",
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "have",
+}
+
+
+def keywords(text: str, limit: int = 20) -> List[str]:
+    """Các từ xuất hiện nhiều nhất trong text (bỏ từ dừng, số và từ 1-2 ký tự)"""
+    words = [w for w in _WORD.findall(text.lower()) if len(w) >= 3 and not w.isdigit() and w not in _STOPWORDS]
+    return [w for w, _ in Counter(words).most_common(limit)]
+
+
+class PreScorer:
+    """Quyết định chấm ở máy hay gửi LLM cho từng câu trả lời"""
+
+    def __init__(self, embeddings, off_topic_similarity: float = 0.80, min_keyword_coverage: float = 0.15,
+                 min_answer_tokens: int = 4, local_max_score: float = 2.0, cache_size: int = 1024):
+        self.embeddings = embeddings
+        # Lạc đề: độ tương đồng với câu hỏi và với context đều dưới ngưỡng, gần như không dùng từ khóa của context
+        self.off_topic_similarity = off_topic_similarity
+        self.min_keyword_coverage = min_keyword_coverage
+        self.min_answer_tokens = min_answer_tokens
+        self.local_max_score = local_max_score
+        # Câu hỏi và context lặp lại giữa các thí sinh: giữ vector để không embed lại
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.stats = {"local": 0, "llm": 0}
+
+    def _embed(self, texts: List[str]) -> List[np.ndarray]:
+        with self._lock:
+            missing = list(dict.fromkeys(t for t in texts if t not in self._cache))
+        if missing:
+            vectors = np.asarray(self.embeddings.embed_documents(missing), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            with self._lock:
+                for text, vector in zip(missing, vectors):
+                    self._cache[text] = vector
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        with self._lock:
+            return [self._cache[t] if t in self._cache else None for t in texts]
+
+    def features(self, question: str, answer: str, context: str = "",
+                 key_points: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Độ dài, cosine với câu hỏi/context/ý chính và tỷ lệ từ khóa của context có trong câu trả lời"""
+        tokens = estimate_tokens(answer.strip())
+        features: Dict[str, Any] = {"answer_tokens": tokens}
+        if tokens < self.min_answer_tokens:
+            return features
+
+        key_points = [k for k in (key_points or []) if k]
+        texts = [answer, question] + ([context] if context else []) + key_points
+        vectors = self._embed(texts)
+        answer_vector = vectors[0]
+        features["question_similarity"] = round(float(answer_vector @ vectors[1]), 4)
+        if context:
+            features["context_similarity"] = round(float(answer_vector @ vectors[2]), 4)
+            context_words = keywords(context)
+            answer_words = set(_WORD.findall(answer.lower()))
+            features["keyword_coverage"] = round(
+                sum(w in answer_words for w in context_words) / len(context_words), 4) if context_words else 0.0
+        if key_points:
+            similarities = np.stack(vectors[-len(key_points):]) @ answer_vector
+            features["key_point_similarity"] = round(float(similarities.max()), 4)
+        return features
+
+    def decide(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        """{"decision": "local"/"llm", "score": điểm nếu chấm ở máy, "reason": lý do}"""
+        if features["answer_tokens"] < self.min_answer_tokens:
+            return {"decision": "local", "score": 0.0, "reason": "Câu trả lời quá ngắn"}
+
+        relevance = max(features.get("question_similarity", 0.0), features.get("context_similarity", 0.0),
+                        features.get("key_point_similarity", 0.0))
+        if relevance < self.off_topic_similarity and features.get("keyword_coverage", 0.0) < self.min_keyword_coverage:
+            # Càng gần ngưỡng điểm càng cao, tối đa local_max_score
+            floor = self.off_topic_similarity - 0.15
+            score = self.local_max_score * min(1.0, max(0.0, (relevance - floor) / 0.15))
+            return {"decision": "local", "score": round(score, 1),
+                    "reason": "Câu trả lời không liên quan đến câu hỏi"}
+        return {"decision": "llm", "score": None, "reason": ""}
+
+    def prescore(self, question: str, answer: str, context: str = "",
+                 key_points: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        features = self.features(question, answer, context, key_points)
+        result = self.decide(features)
+        result["features"] = features
+        self.stats[result["decision"]] += 1
+        return result
+
+
+def calibrate(scorer: PreScorer, records: List[Dict[str, Any]], thresholds: Sequence[float],
+              fail_below: float = 4.0) -> List[Dict[str, Any]]:
+    """So sánh quyết định chấm ở máy với điểm LLM đã ghi cho từng ngưỡng off_topic_similarity.
+
+    'wrong' = câu chấm ở máy nhưng LLM cho từ fail_below điểm trở lên (chấm ở máy làm đổi kết quả)."""
+    features = [scorer.features(r["question"], r["answer"], r.get("context", ""), r.get("key_points"))
+                for r in records]
+    llm_scores = np.array([float(r["score"]) for r in records])
+    rows = []
+    original = scorer.off_topic_similarity
+    try:
+        for threshold in thresholds:
+            scorer.off_topic_similarity = threshold
+            decisions = [scorer.decide(f) for f in features]
+            local = np.array([d["decision"] == "local" for d in decisions])
+            local_scores = np.array([d["score"] if d["score"] is not None else np.nan for d in decisions])
+            rows.append({
+                "threshold": round(float(threshold), 3),
+                "llm_calls_avoided": round(float(local.mean()), 4) if len(records) else 0.0,
+                "local_answers": int(local.sum()),
+                "wrong": int((local & (llm_scores >= fail_below)).sum()),
+                "mae": round(float(np.abs(local_scores[local] - llm_scores[local]).mean()), 3) if local.any() else None
+            })
+    finally:
+        scorer.off_topic_similarity = original
+    return rows
+
+
+def _record(qa: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Câu trả lời dùng để hiệu chỉnh: chỉ câu do LLM chấm (câu chấm ở máy/điểm mặc định không phải đáp án đúng),
+    kèm context và ý chính đã dùng khi chấm để tính đủ đặc trưng như lúc chạy thật"""
+    if qa.get("scored_by") != "llm" or qa.get("score") is None:
+        return None
+    key_points = qa.get("key_points") or []
+    if isinstance(key_points, str):
+        key_points = json.loads(key_points)
+    return {"question": qa.get("question") or "", "answer": qa.get("answer") or "", "score": qa["score"],
+            "context": qa.get("scoring_context") or "", "key_points": key_points}
+
+
+def _load_records(db: str) -> List[Dict[str, Any]]:
+    from results_store import ResultsStore
+    records = [_record(r) for r in ResultsStore(db).query_answers()]
+    return [r for r in records if r is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hiệu chỉnh bộ chấm sơ bộ theo điểm LLM đã ghi")
+    parser.add_argument("--calibrate", action="store_true", help="Chạy báo cáo hiệu chỉnh")
+    parser.add_argument("--db", default="interview_results/results.db", help="Kho kết quả SQLite")
+    parser.add_argument("--results", nargs="*", help="Đọc thêm các file JSON kết quả")
+    parser.add_argument("--embeddings", choices=["e5", "synthetic"], default="e5")
+    parser.add_argument("--max-wrong-rate", type=float, default=0.01,
+                        help="Tỷ lệ tối đa câu chấm ở máy bị LLM cho ≥ 4 điểm khi chọn ngưỡng")
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    if not args.calibrate:
+        parser.print_help()
+        return
+
+    records = []
+    if Path(args.db).exists():
+        records += _load_records(args.db)
+    for path in args.results or []:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        records += [r for r in map(_record, data.get("questions_and_answers", [])) if r is not None]
+    if not records:
+        # Kết quả cũ không ghi scored_by/context: không biết điểm nào do LLM chấm
+        print("❌ Không có câu trả lời do LLM chấm kèm context (chạy phỏng vấn với phiên bản có ghi scored_by)")
+        sys.exit(1)
+
+    if args.embeddings == "synthetic":
+        sys.path.insert(0, str(Path(__file__).resolve().parent / "benchmarks"))
+        from bench_worker_pool import SyntheticEmbeddings
+        embeddings = SyntheticEmbeddings(rounds=1)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(
+            model_name="intfloat/multilingual-e5-large-instruct",
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"normalize_embeddings": True}
+        )
+
+    scorer = PreScorer(embeddings)
+    rows = calibrate(scorer, records, np.arange(0.70, 0.901, 0.01))
+    print(f"📊 {len(records)} câu trả lời đã được LLM chấm")
+    print(f"{'ngưỡng':>7} {'bỏ LLM':>8} {'chấm máy':>9} {'sai':>5} {'MAE':>6}")
+    for row in rows:
+        mae = f"{row['mae']:.2f}" if row["mae"] is not None else "-"
+        print(f"{row['threshold']:>7.2f} {row['llm_calls_avoided']:>8.1%} {row['local_answers']:>9} {row['wrong']:>5} {mae:>6}")
+
+    safe = [r for r in rows if r["wrong"] <= args.max_wrong_rate * len(records)]
+    if safe:
+        best = max(safe, key=lambda r: (r["llm_calls_avoided"], -r["threshold"]))
+        print(f"✅ Đề xuất off_topic_similarity={best['threshold']}: bỏ {best['llm_calls_avoided']:.1%} lời gọi LLM, "
+              f"{best['wrong']} câu sai lệch")
+    else:
+        print("⚠️ Không có ngưỡng nào đủ an toàn; giữ chấm sơ bộ tắt (mặc định)")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"records": len(records), "thresholds": rows},
+                                                ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
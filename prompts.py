@@ -0,0 +1,361 @@
+import sys
+import json
+import string
+import hashlib
+import argparse
+import textwrap
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from token_utils import estimate_tokens
+
+# Registry các prompt gửi LLM, có phiên bản. Mỗi prompt gồm phần tĩnh (vai trò, yêu cầu, tiêu chí, định dạng JSON)
+# đứng đầu và phần thay đổi theo từng lần gọi (CV, kiến thức, câu trả lời...) đứng cuối:
+#   - phần tĩnh giống hệt nhau giữa các lần gọi nên Gemini cache được tiền tố (implicit caching),
+#     hoặc tạo cache tường minh một lần (generate_questions.py) để chỉ trả tiền cho phần thay đổi
+#   - phần thay đổi được biên dịch sẵn thành danh sách (chuỗi cố định, tên biến), không parse lại mỗi lần
+#   python prompts.py                                   # liệt kê prompt, số token phần tĩnh
+#   python prompts.py --trace interview_results/traces.jsonl   # token được cache theo từng prompt
+
+# Gemini 2.5 tính token đọc từ cache với giá 25%
+CACHED_TOKEN_DISCOUNT = 0.75
+
+
+class Prompt:
+    """Template có phiên bản: static (không có biến) + dynamic (biến dạng {ten_bien})"""
+
+    def __init__(self, name: str, version: str, static: str, dynamic: str):
+        self.name = name
+        self.version = version
+        self.static = textwrap.dedent(static).strip()
+        # Biên dịch một lần: [(chuỗi cố định, tên biến hoặc None), ...]
+        self._parts = [(literal, field) for literal, field, _, _ in
+                       string.Formatter().parse(textwrap.dedent(dynamic).strip())]
+        self.fields = [field for _, field in self._parts if field]
+        self.fingerprint = hashlib.sha1(self.static.encode("utf-8")).hexdigest()[:10]
+        self.static_tokens = estimate_tokens(self.static)
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def dynamic(self, **values) -> str:
+        """Phần thay đổi của prompt với các giá trị đã cho"""
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in self._parts)
+
+    def render(self, **values) -> str:
+        """Prompt đầy đủ: phần tĩnh trước, phần thay đổi sau"""
+        return self.static + "\n\n" + self.dynamic(**values)
+
+
+REGISTRY: Dict[str, Dict[str, Prompt]] = {}
+
+
+def register(prompt: Prompt) -> Prompt:
+    REGISTRY.setdefault(prompt.name, {})[prompt.version] = prompt
+    return prompt
+
+
+def get(name: str, version: Optional[str] = None) -> Prompt:
+    """Prompt theo tên; mặc định là phiên bản đăng ký sau cùng"""
+    versions = REGISTRY[name]
+    return versions[version] if version else list(versions.values())[-1]
+
+
+_QUESTION_SET_INSTRUCTION = """
+    Bạn là một chuyên gia phỏng vấn nhân sự chuyên nghiệp.
+
+    Dựa trên CV của ứng viên và vị trí công việc mục tiêu ở cuối prompt, hãy tạo 8 câu hỏi phỏng vấn bằng tiếng Việt theo định dạng JSON có cấu trúc:
+    - 2 câu hỏi về hành vi (về làm việc nhóm, thách thức, động lực...)
+    - 3 câu hỏi kiến thức kỹ thuật liên quan đến công việc
+    - 2 câu hỏi cụ thể về các dự án hoặc kinh nghiệm trước đây của ứng viên được đề cập trong CV
+    - 1 câu hỏi sáng tạo / tình huống giả định để kiểm tra khả năng giải quyết vấn đề hoặc tư duy phản biện
+
+    Trả về theo định dạng JSON có cấu trúc nhất quán:
+    Đảm bảo mỗi câu hỏi có:
+    - id: số thứ tự (1-8)
+    - question: câu hỏi phỏng vấn thực tế
+    - category: một trong 'behavioral', 'technical', 'cv_based', 'creative'
+    - purpose: giải thích ngắn gọn về mục đích đánh giá của câu hỏi này
+    Ví dụ:
+    [
+      {
+        "id": 1,
+        "question": "Hãy kể về một lần bạn phải làm việc nhóm để giải quyết một vấn đề khó khăn.",
+        "category": "behavioral",
+        "purpose": "Đánh giá kỹ năng làm việc nhóm và giải quyết vấn đề"
+      },
+      {
+        "id": 2,
+        "question": "Bạn thành thạo nhất những ngôn ngữ lập trình nào?",
+        "category": "technical",
+        "purpose": "Đánh giá kiến thức và chuyên môn kỹ thuật"
+      },
+      {
+        "id": 3,
+        "question": "Bạn có thể chia sẻ chi tiết về kinh nghiệm với dự án được đề cập trong CV của bạn không?",
+        "category": "cv_based",
+        "purpose": "Hiểu rõ kinh nghiệm dự án cụ thể và thành tựu"
+      },
+      {
+        "id": 4,
+        "question": "Bạn sẽ xử lý như thế nào khi nhóm của bạn không đồng ý về phương pháp kỹ thuật?",
+        "category": "creative",
+        "purpose": "Kiểm tra khả năng giải quyết xung đột và tư duy phản biện"
+      }
+    ]
+"""
+
+# generate_questions.py: CV dạng text và CV dạng ảnh dùng chung phần hướng dẫn (cùng một cache)
+CV_QUESTION_SET = register(Prompt("cv_question_set", "2", _QUESTION_SET_INSTRUCTION, """
+    Vị trí công việc mục tiêu: {job_title}
+
+    CV của ứng viên:
+    {cv_text}
+"""))
+IMAGE_QUESTION_SET = register(Prompt("image_question_set", "2", _QUESTION_SET_INSTRUCTION, """
+    Vị trí công việc mục tiêu: {job_title}
+
+    CV của ứng viên nằm trong hình ảnh đính kèm.
+"""))
+
+EXTRACT_CANDIDATE = register(Prompt("extract_candidate", "2", """
+    Hãy trích xuất thông tin cá nhân từ CV ở cuối prompt.
+
+    Trả về JSON format với các thông tin sau:
+    {
+        "name": "Họ và tên đầy đủ",
+        "email": "Địa chỉ email nếu có",
+        "phone": "Số điện thoại nếu có",
+        "position": "Vị trí ứng tuyển hoặc mục tiêu nghề nghiệp",
+        "experience_years": số_năm_kinh_nghiệm,
+        "education": "Trường học hoặc bằng cấp",
+        "skills": ["kỹ năng 1", "kỹ năng 2", ...],
+        "summary": "Tóm tắt ngắn gọn về ứng viên"
+    }
+
+    Lưu ý:
+    - Nếu không tìm thấy thông tin nào, để trống string hoặc 0 cho số
+    - experience_years phải là số nguyên
+    - skills phải là array các string
+    - Chỉ trả về JSON, không có text khác
+""", """
+    CV:
+    {cv_content}
+"""))
+
+BEHAVIORAL = register(Prompt("behavioral", "2", """
+    Hãy tạo 2 câu hỏi hành vi (behavioral) liên quan đến nhau, dựa trên thông tin CV ở cuối prompt, về:
+    - Làm việc nhóm
+    - Xử lý thách thức
+    - Động lực làm việc
+
+    Trả về JSON format:
+    [
+        {
+            "id": 1,
+            "question": "Câu hỏi 1",
+            "category": "behavioral",
+            "purpose": "Mục đích đánh giá",
+            "related_to": "Câu hỏi liên quan đến câu hỏi 2"
+        },
+        {
+            "id": 2,
+            "question": "Câu hỏi 2",
+            "category": "behavioral",
+            "purpose": "Mục đích đánh giá",
+            "related_to": "Câu hỏi liên quan đến câu hỏi 1"
+        }
+    ]
+""", """
+    Thông tin CV:
+    {cv_content}
+"""))
+
+TECHNICAL = register(Prompt("technical", "2", """
+    Hãy tạo 3 câu hỏi kiểm tra kiến thức liên quan đến nhau, dựa trên kiến thức chuyên môn từ tài liệu học tập ở cuối prompt, về:
+    - Kiến thức lý thuyết từ tài liệu
+    - Khái niệm và định nghĩa
+    - Ứng dụng thực tế của kiến thức
+
+    Yêu cầu:
+    - Câu hỏi phải dựa trực tiếp vào nội dung kiến thức đã cho
+    - Kiểm tra khả năng hiểu và áp dụng kiến thức
+    - Các câu hỏi phải liên quan đến nhau và cùng chủ đề
+    - Mỗi câu hỏi kèm 3-5 ý chính (key_points) mà một câu trả lời tốt cần nêu, ngắn gọn, lấy từ nội dung tài liệu
+
+    Trả về JSON format:
+    [
+        {
+            "id": 3,
+            "question": "Câu hỏi kiến thức 1 (dựa trên nội dung tài liệu)",
+            "category": "technical",
+            "purpose": "Kiểm tra hiểu biết về khái niệm cơ bản",
+            "related_to": "Liên quan đến câu hỏi 4,5 về cùng chủ đề",
+            "key_points": ["Ý chính 1", "Ý chính 2", "Ý chính 3"]
+        },
+        {
+            "id": 4,
+            "question": "Câu hỏi kiến thức 2 (ứng dụng thực tế)",
+            "category": "technical",
+            "purpose": "Kiểm tra khả năng áp dụng kiến thức",
+            "related_to": "Liên quan đến câu hỏi 3,5",
+            "key_points": ["Ý chính 1", "Ý chính 2", "Ý chính 3"]
+        },
+        {
+            "id": 5,
+            "question": "Câu hỏi kiến thức 3 (phân tích sâu)",
+            "category": "technical",
+            "purpose": "Kiểm tra khả năng phân tích và đánh giá",
+            "related_to": "Liên quan đến câu hỏi 3,4",
+            "key_points": ["Ý chính 1", "Ý chính 2", "Ý chính 3"]
+        }
+    ]
+""", """
+    Kiến thức chuyên môn từ tài liệu học tập:
+    {knowledge_content}
+"""))
+
+PROJECT = register(Prompt("cv_based", "2", """
+    Hãy tạo 2 câu hỏi cụ thể về dự án/kinh nghiệm liên quan đến nhau, dựa trên thông tin CV ở cuối prompt:
+    - Dự án đã tham gia
+    - Kinh nghiệm làm việc
+    - Thành tích đạt được
+
+    Trả về JSON format:
+    [
+        {
+            "id": 6,
+            "question": "Câu hỏi về dự án 1",
+            "category": "cv_based",
+            "purpose": "Mục đích đánh giá",
+            "related_to": "Liên quan đến câu hỏi 7"
+        },
+        {
+            "id": 7,
+            "question": "Câu hỏi về dự án 2",
+            "category": "cv_based",
+            "purpose": "Mục đích đánh giá",
+            "related_to": "Liên quan đến câu hỏi 6"
+        }
+    ]
+""", """
+    Thông tin CV về dự án và kinh nghiệm:
+    {cv_content}
+"""))
+
+CREATIVE = register(Prompt("creative", "3", """
+    Hãy tạo 1 câu hỏi sáng tạo/tình huống giả định, dựa trên thông tin CV và kiến thức kỹ thuật ở cuối prompt, để kiểm tra:
+    - Khả năng giải quyết vấn đề
+    - Tư duy phản biện
+    - Sáng tạo trong công việc
+
+    Không lặp lại tình huống của các câu hỏi đã dùng ở cuối prompt (nếu có).
+
+    Trả về JSON format:
+    {
+        "id": 8,
+        "question": "Câu hỏi sáng tạo",
+        "category": "creative",
+        "purpose": "Kiểm tra khả năng giải quyết vấn đề và tư duy phản biện",
+        "related_to": "Kết hợp kiến thức từ CV và technical knowledge"
+    }
+""", """
+    CV: {cv_content}
+    Knowledge: {knowledge_content}
+    Câu hỏi đã dùng:
+    {past_questions}
+"""))
+
+_SCORING = """
+    Bạn là một chuyên gia phỏng vấn nhân sự. Hãy chấm điểm câu trả lời ở cuối prompt một cách công bằng và chính xác.
+
+    Chấm điểm theo thang điểm 10 cho từng tiêu chí:
+    {criteria}
+
+    Yêu cầu:
+    - Tổng điểm phải là trung bình của 5 tiêu chí (không cộng dồn)
+    - Điểm từ 0-10 cho mỗi tiêu chí
+    - Đánh giá dựa trên chất lượng thực tế của câu trả lời
+
+    Trả về JSON format:
+    {{
+        "criteria_1": điểm_số,
+        "criteria_2": điểm_số,
+        "criteria_3": điểm_số,
+        "criteria_4": điểm_số,
+        "criteria_5": điểm_số,
+        "total": tổng_điểm_trung_bình,
+        "feedback": "Nhận xét chi tiết về câu trả lời"
+    }}
+"""
+_SCORING_INPUT = """
+    Câu hỏi: {question}
+    Loại câu hỏi: {category}
+    Mục đích: {purpose}
+    {context_label}: {context}
+    Câu trả lời: {answer}
+"""
+# Tiêu chí chấm điểm theo loại câu hỏi, mỗi bộ là một prompt tĩnh riêng (cache riêng)
+SCORE_TECHNICAL = register(Prompt("score_technical", "2", textwrap.dedent(_SCORING).format(criteria=textwrap.dedent("""
+    1. Kiến thức chính xác (Knowledge): Mức độ hiểu biết đúng về khái niệm
+    2. Áp dụng thực tế (Application): Khả năng áp dụng kiến thức vào tình huống thực tế
+    3. Phân tích sâu (Analysis): Khả năng phân tích và giải thích chi tiết
+    4. Tư duy phản biện (Critical Thinking): Khả năng đánh giá và so sánh
+    5. Truyền đạt rõ ràng (Communication): Cách trình bày logic và dễ hiểu""").strip()), _SCORING_INPUT))
+SCORE_GENERAL = register(Prompt("score_general", "2", textwrap.dedent(_SCORING).format(criteria=textwrap.dedent("""
+    1. Độ chính xác (Correctness): Mức độ lập luận gắn kết với ý chính
+    2. Độ bao quát (Coverage): Tỷ lệ phần trăm các ý chính được đề cập
+    3. Lý luận (Reasoning): Cách phân tích từng bước, nêu rõ giả định
+    4. Tính sáng tạo (Creativity): Giải pháp mới mẻ nhưng hợp lý
+    5. Truyền đạt (Communication): Ngôn ngữ rõ ràng, có cấu trúc""").strip()), _SCORING_INPUT))
+
+
+def cache_report(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Token prompt và token đọc từ cache theo từng prompt (thuộc tính "prompt" của span llm.* hoặc span cha)"""
+    prompt_of = {span.get("span_id"): span.get("attributes", {}).get("prompt") for span in spans}
+    report: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        attributes = span.get("attributes", {})
+        # Span con không tên do callback mở (lời gọi hedge, trace cũ) được tính cho prompt của span cha
+        prompt_id = attributes.get("prompt") or prompt_of.get(span.get("parent_id"))
+        if not span.get("name", "").startswith("llm.") or not prompt_id:
+            continue
+        entry = report.setdefault(prompt_id, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += int(attributes.get("prompt_tokens", 0) or 0)
+        entry["cached_tokens"] += int(attributes.get("cached_tokens", 0) or 0)
+    for entry in report.values():
+        entry["cached_ratio"] = round(entry["cached_tokens"] / entry["prompt_tokens"], 4) if entry["prompt_tokens"] else 0.0
+        # Phần chi phí token đầu vào tiết kiệm được so với không có cache
+        entry["input_cost_saved"] = round(entry["cached_ratio"] * CACHED_TOKEN_DISCOUNT, 4)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Liệt kê prompt và báo cáo token được cache")
+    parser.add_argument("--trace", help="File span JSONL (interview.py --trace, generate_questions.py --trace)")
+    args = parser.parse_args()
+
+    print(f"{'prompt':26} {'tĩnh (token)':>13}  fingerprint")
+    for versions in REGISTRY.values():
+        for prompt in versions.values():
+            print(f"{prompt.id:26} {prompt.static_tokens:>13}  {prompt.fingerprint}  biến: {', '.join(prompt.fields)}")
+
+    if args.trace:
+        if not Path(args.trace).exists():
+            print(f"❌ Không có file {args.trace}")
+            sys.exit(1)
+        with open(args.trace, encoding="utf-8") as f:
+            spans = [json.loads(line) for line in f if line.strip()]
+        report = cache_report(spans)
+        print(f"\n💾 Token được cache ({args.trace}):")
+        for prompt_id, entry in sorted(report.items()):
+            print(f"{prompt_id:26} {entry['calls']:>5} lần  {entry['cached_tokens']}/{entry['prompt_tokens']} token "
+                  f"({entry['cached_ratio']:.1%}), tiết kiệm ~{entry['input_cost_saved']:.1%} chi phí đầu vào")
+        if not report:
+            print("  (chưa có span nào ghi thuộc tính prompt)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import os
+import json
+import random
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+# Thí sinh "*" dùng cho các bộ câu hỏi chia sẻ giữa mọi ứng viên (vd: câu kỹ thuật)
+SHARED_CANDIDATE = "*"
+
+
+def candidate_hash(cv_text: str = "", candidate_info: Optional[Dict[str, Any]] = None) -> str:
+    """Tạo mã băm ổn định cho thí sinh từ nội dung CV (hoặc thông tin cơ bản nếu không có CV)"""
+    if cv_text.strip():
+        source = " ".join(cv_text.split())
+    else:
+        info = candidate_info or {}
+        source = "|".join(str(info.get(k, "")).strip().lower() for k in ("name", "email", "phone"))
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+def index_version(index_dir: str) -> str:
+    """Phiên bản của vector database, đổi mỗi khi index được build lại"""
+    parts = []
+    for name in ("index.faiss", "index.pkl"):
+        path = Path(index_dir) / name
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12] if parts else "none"
+
+
+class QuestionBank:
+    """Ngân hàng câu hỏi lưu trên đĩa, đánh chỉ mục theo (thí sinh, vị trí, phiên bản knowledge, loại câu hỏi)"""
+
+    def __init__(self, root: str = "question_bank", seed: Optional[int] = None, dedup=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # question_dedup.QuestionDeduplicator: loại câu gần trùng với câu đã có trong cùng khóa
+        self.dedup = dedup
+        self.duplicates_rejected = 0
+
+    def _path(self, candidate: str, position: str, kn_version: str, category: str) -> Path:
+        key = "|".join([candidate, position.strip().lower(), kn_version, category])
+        return self.root / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+    def _load(self, path: Path, candidate: str, position: str, kn_version: str, category: str) -> Dict[str, Any]:
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {
+            "key": {
+                "candidate": candidate,
+                "position": position,
+                "knowledge_version": kn_version,
+                "category": category
+            },
+            "questions": [],
+            "served": {}
+        }
+
+    def _save(self, path: Path, entry: Dict[str, Any]):
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get_pool(self, candidate: str, position: str, kn_version: str, category: str) -> List[Dict[str, Any]]:
+        """Trả về toàn bộ câu hỏi đã lưu cho một khóa"""
+        path = self._path(candidate, position, kn_version, category)
+        return self._load(path, candidate, position, kn_version, category)["questions"]
+
+    def _drop_duplicates(self, path: Path, entry: Dict[str, Any], questions: List[Dict[str, Any]],
+                         vectors) -> List[Dict[str, Any]]:
+        """Bỏ các câu gần trùng với câu đã lưu (hoặc câu trước nó trong lô) và lưu vector của câu được giữ"""
+        import numpy as np
+        from question_dedup import load_vectors, save_vectors
+
+        vectors_path = path.with_suffix(".npy")
+        existing = load_vectors(vectors_path)
+        stored = [q["question"] for q in entry["questions"]]
+        if stored and (existing is None or len(existing) != len(stored)):
+            # Ngân hàng tạo trước khi có vector: embed lại các câu đã lưu
+            existing = self.dedup.embed(stored)
+        keep, _ = self.dedup.select(vectors, existing)
+        self.duplicates_rejected += len(questions) - len(keep)
+        if keep:
+            kept_vectors = vectors[keep]
+            save_vectors(vectors_path, np.vstack([existing, kept_vectors]) if stored else kept_vectors)
+        return [questions[i] for i in keep]
+
+    def add(self, candidate: str, position: str, kn_version: str, category: str,
+            questions: List[Dict[str, Any]]) -> int:
+        """Thêm một lô câu hỏi mới vào ngân hàng, trả về số câu đã thêm (không tính câu trùng nghĩa)"""
+        questions = [q for q in questions if q and q.get("question")]
+        if not questions:
+            return 0
+        # Embed cả lô ngoài lock để các phiên khác không phải chờ model
+        vectors = self.dedup.embed([q["question"] for q in questions]) if self.dedup is not None else None
+        with self._lock:
+            path = self._path(candidate, position, kn_version, category)
+            entry = self._load(path, candidate, position, kn_version, category)
+            if vectors is not None:
+                questions = self._drop_duplicates(path, entry, questions, vectors)
+                if not questions:
+                    return 0
+            batch = max((q.get("batch", 0) for q in entry["questions"]), default=-1) + 1
+            for q in questions:
+                entry["questions"].append(dict(q, batch=batch))
+            self._save(path, entry)
+        return len(questions)
+
+    def sample(self, candidate: str, position: str, kn_version: str, category: str, n: int,
+               served_by: Optional[str] = None, allow_partial: bool = False) -> List[Dict[str, Any]]:
+        """Lấy n câu hỏi chưa từng hỏi thí sinh served_by (không lặp lại), ưu tiên giữ nguyên từng lô"""
+        served_by = served_by or candidate
+        with self._lock:
+            path = self._path(candidate, position, kn_version, category)
+            entry = self._load(path, candidate, position, kn_version, category)
+            served = set(entry["served"].get(served_by, []))
+
+            # Gom các câu chưa hỏi theo lô để giữ tính liên quan giữa các câu
+            batches: Dict[int, List[int]] = {}
+            for idx, q in enumerate(entry["questions"]):
+                if idx not in served:
+                    batches.setdefault(q.get("batch", 0), []).append(idx)
+
+            order = list(batches.keys())
+            self._rng.shuffle(order)
+            # Ưu tiên lô có đủ số câu cần lấy
+            order.sort(key=lambda b: len(batches[b]) < n)
+
+            picked: List[int] = []
+            for b in order:
+                for idx in batches[b]:
+                    if len(picked) >= n:
+                        break
+                    picked.append(idx)
+                if len(picked) >= n:
+                    break
+
+            if not picked or (len(picked) < n and not allow_partial):
+                return []
+
+            entry["served"][served_by] = sorted(served.union(picked))
+            self._save(path, entry)
+            return [dict(entry["questions"][idx]) for idx in picked]
+
+    def take(self, candidate: str, position: str, kn_version: str, category: str, n: int,
+             generate: Callable[[], List[Dict[str, Any]]], served_by: Optional[str] = None,
+             max_generations: int = 2) -> List[Dict[str, Any]]:
+        """Lấy n câu hỏi từ ngân hàng, chỉ gọi generate() khi không còn đủ câu chưa hỏi"""
+        questions = self.sample(candidate, position, kn_version, category, n, served_by)
+        attempts = 0
+        generated: List[Dict[str, Any]] = []
+        while not questions and attempts < max_generations:
+            attempts += 1
+            generated = generate()
+            if not self.add(candidate, position, kn_version, category, generated):
+                continue
+            questions = self.sample(candidate, position, kn_version, category, n, served_by)
+        if not questions:
+            questions = self.sample(candidate, position, kn_version, category, n, served_by, allow_partial=True)
+        if not questions:
+            # Mọi lần tạo đều trùng nghĩa với câu đã có: dùng lô vừa tạo (không lưu) thay vì bỏ trống
+            questions = [dict(q) for q in generated if q and q.get("question")][:n]
+        return questions
@@ -0,0 +1,108 @@
+import json
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Phát hiện câu hỏi trùng nghĩa bằng embedding (cùng model e5 với vector database).
+# Mỗi lô câu hỏi mới được embed một lần (1 batch), so với các câu đã có bằng một phép nhân ma trận;
+# câu có cosine ≥ ngưỡng với câu đã có (hoặc câu đứng trước trong cùng lô) bị loại.
+# Vector của ngân hàng câu hỏi lưu cạnh file JSON (<khóa>.npy) nên không phải embed lại.
+#   python question_dedup.py --scan question_bank --threshold 0.95
+
+DEFAULT_THRESHOLD = 0.95
+
+
+class QuestionDeduplicator:
+    """Lọc câu hỏi gần trùng nhau theo cosine similarity của embedding đã chuẩn hóa"""
+
+    def __init__(self, embeddings, threshold: float = DEFAULT_THRESHOLD):
+        self.embeddings = embeddings
+        self.threshold = threshold
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed cả lô trong một lần gọi, trả về ma trận (n, dim) đã chuẩn hóa L2"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def select(self, new: np.ndarray, existing: Optional[np.ndarray] = None) -> Tuple[List[int], np.ndarray]:
+        """Chỉ số các câu mới được giữ lại và độ tương đồng lớn nhất của từng câu với các câu khác"""
+        n = len(new)
+        if n == 0:
+            return [], np.zeros(0, dtype=np.float32)
+        best = np.full(n, -1.0, dtype=np.float32)
+        if existing is not None and len(existing):
+            best = (new @ existing.T).max(axis=1)
+        within = new @ new.T
+        keep: List[int] = []
+        for j in range(n):
+            # So với các câu đã được giữ lại trước nó trong cùng lô
+            similarity = float(within[keep, j].max()) if keep else -1.0
+            best[j] = max(best[j], similarity)
+            if best[j] < self.threshold:
+                keep.append(j)
+        return keep, best
+
+    def duplicates(self, questions: List[Dict[str, Any]]) -> List[int]:
+        """Chỉ số các câu trùng với một câu đứng trước trong cùng danh sách (vd: một bộ câu hỏi phỏng vấn)"""
+        vectors = self.embed([q.get("question", "") for q in questions])
+        keep, _ = self.select(vectors)
+        return [i for i in range(len(questions)) if i not in keep]
+
+
+def load_vectors(path: Path) -> Optional[np.ndarray]:
+    return np.load(path) if path.exists() else None
+
+
+def save_vectors(path: Path, vectors: np.ndarray):
+    tmp_path = path.with_suffix(".tmp.npy")
+    np.save(tmp_path, vectors)
+    tmp_path.replace(path)
+
+
+def scan(root: str, embeddings, threshold: float) -> List[Dict[str, Any]]:
+    """Liệt kê các cặp câu gần trùng trong từng khóa của ngân hàng câu hỏi (để chọn ngưỡng)"""
+    dedup = QuestionDeduplicator(embeddings, threshold)
+    pairs = []
+    for path in sorted(Path(root).glob("*.json")):
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        texts = [q.get("question", "") for q in entry.get("questions", [])]
+        if len(texts) < 2:
+            continue
+        vectors = load_vectors(path.with_suffix(".npy"))
+        if vectors is None or len(vectors) != len(texts):
+            vectors = dedup.embed(texts)
+        similarity = np.triu(vectors @ vectors.T, k=1)
+        for i, j in zip(*np.nonzero(similarity >= threshold)):
+            pairs.append({"key": entry.get("key", {}), "similarity": round(float(similarity[i, j]), 4),
+                          "first": texts[i], "second": texts[j]})
+    return sorted(pairs, key=lambda p: -p["similarity"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tìm các câu hỏi gần trùng trong ngân hàng câu hỏi")
+    parser.add_argument("--scan", default="question_bank", help="Thư mục ngân hàng câu hỏi")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Ngưỡng cosine (mặc định bằng ngưỡng lọc trùng khi phỏng vấn)")
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    embeddings = HuggingFaceEmbeddings(
+        model_name="intfloat/multilingual-e5-large-instruct",
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True}
+    )
+    pairs = scan(args.scan, embeddings, args.threshold)
+    for pair in pairs:
+        print(f"{pair['similarity']:.3f}  [{pair['key'].get('category', '')}]")
+        print(f"   1. {pair['first']}")
+        print(f"   2. {pair['second']}")
+    print(f"📊 {len(pairs)} cặp câu hỏi có độ tương đồng ≥ {args.threshold}")
+
+
+if __name__ == "__main__":
+    main()
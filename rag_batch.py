@@ -0,0 +1,149 @@
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from RAGtest import prompt, load_db, build_llm
+from retrieval import search_with_ids
+from token_utils import estimate_tokens
+
+# Chạy RAG (truy vấn + sinh câu trả lời) không tương tác trên file JSONL câu hỏi,
+# ghi câu trả lời, id các chunk đã truy vấn, độ trễ và số token ra JSONL.
+# Dùng --llm stub để kiểm tra hồi quy phần truy vấn offline, không gọi Gemini.
+
+
+def load_questions(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Đọc câu hỏi từ JSONL: trường 'question'/'query', hoặc 'title' + 'body' (như requests.jsonl)"""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            question = record.get("question") or record.get("query")
+            if not question:
+                question = "\n".join(p for p in (record.get("title"), record.get("body")) if p)
+            if not question:
+                print(f"⚠️ Bỏ qua dòng {line_no}: không có câu hỏi")
+                continue
+            items.append({
+                "id": record.get("request_id") or record.get("id") or str(line_no),
+                "question": question
+            })
+            if limit and len(items) >= limit:
+                break
+    return items
+
+
+def build_backend(name: str, stub_latency: float = 0.0):
+    """LLM backend: 'gemini' (thật) hoặc 'stub' (FakeLLM, trả lời dựng sẵn)"""
+    if name == "stub":
+        from fake_llm import FakeLLM
+        return FakeLLM(latency=stub_latency)
+    return build_llm()
+
+
+def answer_one(db, llm, item: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """Truy vấn + sinh câu trả lời cho 1 câu hỏi, đo độ trễ từng bước"""
+    result = {"id": item["id"], "question": item["question"]}
+    started = time.perf_counter()
+    try:
+        hits = search_with_ids(db, item["question"], k)
+        retrieved = time.perf_counter()
+
+        context = "\n\n".join(doc.page_content for _, doc, _ in hits)
+        full_prompt = prompt.format(context=context, question=item["question"])
+        answer = str(llm.invoke(full_prompt)).strip()
+        finished = time.perf_counter()
+
+        result.update({
+            "answer": answer,
+            "chunk_ids": [doc_id for doc_id, _, _ in hits],
+            "chunk_scores": [round(score, 4) for _, _, score in hits],
+            "retrieval_ms": round((retrieved - started) * 1000, 2),
+            "generation_ms": round((finished - retrieved) * 1000, 2),
+            "total_ms": round((finished - started) * 1000, 2),
+            # Ước lượng (GoogleGenerativeAI không trả về usage qua invoke)
+            "prompt_tokens": estimate_tokens(full_prompt),
+            "answer_tokens": estimate_tokens(answer),
+            "error": None
+        })
+    except Exception as e:
+        result.update({
+            "answer": None,
+            "chunk_ids": [],
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            "error": f"{type(e).__name__}: {e}"
+        })
+    return result
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+
+
+def summarize(results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    ok = [r for r in results if not r["error"]]
+    totals = [r["total_ms"] for r in ok]
+    retrievals = [r["retrieval_ms"] for r in ok]
+    return {
+        "questions": len(results),
+        "errors": len(results) - len(ok),
+        "wall_time_s": round(wall_time, 3),
+        "questions_per_second": round(len(results) / wall_time, 2) if wall_time else None,
+        "total_ms_p50": _percentile(totals, 0.5),
+        "total_ms_p95": _percentile(totals, 0.95),
+        "retrieval_ms_p50": _percentile(retrievals, 0.5),
+        "retrieval_ms_p95": _percentile(retrievals, 0.95),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in ok),
+        "answer_tokens": sum(r["answer_tokens"] for r in ok)
+    }
+
+
+def run_batch(db, llm, items: List[Dict[str, Any]], output: str, k: int = 5,
+              concurrency: int = 4) -> Dict[str, Any]:
+    """Chạy song song concurrency câu hỏi, ghi kết quả theo đúng thứ tự file đầu vào"""
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    results = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, \
+            open(output, "w", encoding="utf-8") as f:
+        for result in executor.map(lambda item: answer_one(db, llm, item, k), items):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            results.append(result)
+            status = "❌" if result["error"] else "✅"
+            print(f"{status} [{result['id']}] {result['total_ms']:.0f} ms")
+    return summarize(results, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy RAG không tương tác trên file JSONL câu hỏi")
+    parser.add_argument("--input", default="requests.jsonl", help="File JSONL câu hỏi")
+    parser.add_argument("--output", default="outputs/rag_batch_results.jsonl")
+    parser.add_argument("--db", default="vector_db2chunk_nltk", help="Thư mục FAISS database")
+    parser.add_argument("-k", "--k", type=int, default=5, help="Số chunk truy vấn mỗi câu hỏi")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm", choices=["gemini", "stub"], default="gemini")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Độ trễ giả lập (giây) của --llm stub")
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ chạy N câu hỏi đầu")
+    args = parser.parse_args()
+
+    items = load_questions(args.input, args.limit)
+    print(f"📂 {len(items)} câu hỏi từ {args.input}")
+    db = load_db(args.db)
+    llm = build_backend(args.llm, args.stub_latency)
+
+    summary = run_batch(db, llm, items, args.output, k=args.k, concurrency=args.concurrency)
+    print(f"💾 Kết quả: {args.output}")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+import functools
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from question_bank import candidate_hash
+
+# Kho kết quả phỏng vấn dạng SQLite (WAL): mỗi phiên 1 dòng trong `sessions`, mỗi câu trả lời 1 dòng
+# trong `answers`, đánh chỉ mục theo thí sinh, vị trí, ngày và điểm. Thay cho việc ghi mỗi phiên
+# một file JSON thụt lề trong interview_results/. Nhập các file JSON cũ:
+#   python results_store.py migrate
+#   python results_store.py query --position "Intern Marketing" --min-score 6
+#   python results_store.py export 12 --output phien_12.json
+
+DEFAULT_DB = "interview_results/results.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    candidate TEXT NOT NULL,
+    candidate_name TEXT,
+    position TEXT,
+    exported_at TEXT,
+    average_score REAL,
+    total_score REAL,
+    max_possible_score INTEGER,
+    total_questions INTEGER,
+    total_answers INTEGER,
+    interview_status TEXT,
+    system_version TEXT,
+    candidate_info TEXT,
+    trace_summary TEXT,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS answers (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    position_in_session INTEGER NOT NULL,
+    question_id INTEGER,
+    category TEXT,
+    question TEXT,
+    purpose TEXT,
+    related_to TEXT,
+    answer TEXT,
+    score REAL,
+    time_to_first_feedback REAL,
+    scored_by TEXT,
+    scoring_context TEXT,
+    key_points TEXT,
+    PRIMARY KEY (session_id, position_in_session)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_candidate ON sessions(candidate);
+CREATE INDEX IF NOT EXISTS idx_sessions_position ON sessions(position);
+CREATE INDEX IF NOT EXISTS idx_sessions_exported_at ON sessions(exported_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_average_score ON sessions(average_score);
+CREATE INDEX IF NOT EXISTS idx_answers_category_score ON answers(category, score);
+"""
+
+_SESSION_COLUMNS = ("id", "candidate", "candidate_name", "position", "exported_at", "average_score",
+                    "total_score", "max_possible_score", "total_questions", "total_answers", "interview_status")
+_ANSWER_COLUMNS = ("question_id", "category", "question", "purpose", "related_to", "answer", "score",
+                   "time_to_first_feedback", "scored_by", "scoring_context", "key_points")
+# Cột thêm sau phiên bản đầu: kho cũ được ALTER TABLE khi mở
+_ADDED_ANSWER_COLUMNS = {"scored_by": "TEXT", "scoring_context": "TEXT", "key_points": "TEXT"}
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def content_hash(interview_data: Dict[str, Any]) -> str:
+    """Mã băm nội dung phiên, dùng để không nhập trùng khi migrate nhiều lần"""
+    return hashlib.sha1(json.dumps(interview_data, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultsStore:
+    """Kho kết quả phỏng vấn SQLite; an toàn khi nhiều thread dùng chung (server nhiều phiên)"""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # WAL: ghi nối tiếp, đọc không chặn ghi (phân tích trong lúc server vẫn đang lưu phiên)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        for column, kind in _ADDED_ANSWER_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE answers ADD COLUMN {column} {kind}")
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Ghi
+
+    def _insert(self, interview_data: Dict[str, Any], source: Optional[str]) -> Tuple[int, bool]:
+        info = interview_data.get("candidate_info", {})
+        summary = interview_data.get("interview_summary", {})
+        export_info = interview_data.get("export_info", {})
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO sessions (content_hash, candidate, candidate_name, position, exported_at, "
+            "average_score, total_score, max_possible_score, total_questions, total_answers, interview_status, "
+            "system_version, candidate_info, trace_summary, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                content_hash(interview_data),
+                candidate_hash(candidate_info=info),
+                info.get("name", ""),
+                info.get("position", ""),
+                export_info.get("exported_at"),
+                summary.get("average_score"),
+                summary.get("total_score"),
+                summary.get("max_possible_score"),
+                summary.get("total_questions"),
+                summary.get("total_answers"),
+                summary.get("interview_status"),
+                export_info.get("system_version"),
+                _compact(info),
+                _compact(interview_data["trace_summary"]) if "trace_summary" in interview_data else None,
+                source
+            )
+        )
+        if not cursor.rowcount:
+            row = self._conn.execute("SELECT id FROM sessions WHERE content_hash = ?",
+                                     (content_hash(interview_data),)).fetchone()
+            return row["id"], False
+
+        session_id = cursor.lastrowid
+        self._conn.executemany(
+            "INSERT INTO answers (session_id, position_in_session, question_id, category, question, purpose, "
+            "related_to, answer, score, time_to_first_feedback, scored_by, scoring_context, key_points) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (session_id, i, qa.get("question_id"), qa.get("question_category"), qa.get("question"),
+                 qa.get("question_purpose"), qa.get("question_related_to"), qa.get("answer"), qa.get("score"),
+                 qa.get("time_to_first_feedback"), qa.get("scored_by"), qa.get("scoring_context"),
+                 _compact(qa["key_points"]) if qa.get("key_points") else None)
+                for i, qa in enumerate(interview_data.get("questions_and_answers", []))
+            ]
+        )
+        return session_id, True
+
+    def add(self, interview_data: Dict[str, Any], source: Optional[str] = None) -> int:
+        """Lưu một phiên (cấu trúc của interview.build_interview_data), trả về id phiên"""
+        with self._lock, self._conn:
+            return self._insert(interview_data, source)[0]
+
+    def add_many(self, items: Iterable[Tuple[Dict[str, Any], Optional[str]]]) -> Tuple[int, int]:
+        """Lưu nhiều phiên trong một transaction, trả về (số phiên mới, số phiên đã có)"""
+        added = skipped = 0
+        with self._lock, self._conn:
+            for interview_data, source in items:
+                _, inserted = self._insert(interview_data, source)
+                added += inserted
+                skipped += not inserted
+        return added, skipped
+
+    # ------------------------------------------------------------------
+    # Đọc
+
+    def get(self, session_id: int) -> Optional[Dict[str, Any]]:
+        """Dựng lại kết quả một phiên theo đúng định dạng file JSON xuất trước đây"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            answers = self._conn.execute(
+                "SELECT * FROM answers WHERE session_id = ? ORDER BY position_in_session", (session_id,)
+            ).fetchall()
+
+        info = json.loads(row["candidate_info"] or "{}")
+        data = {
+            "candidate_info": info,
+            "interview_summary": {
+                "total_questions": row["total_questions"],
+                "total_answers": row["total_answers"],
+                "total_score": row["total_score"],
+                "max_possible_score": row["max_possible_score"],
+                "total_possible_score_all_questions": (row["total_questions"] or 0) * 10,
+                "average_score": row["average_score"],
+                "interview_status": row["interview_status"],
+                "candidate_education": info.get("education", ""),
+                "candidate_skills": info.get("skills", []),
+                "candidate_summary": info.get("summary", "")
+            },
+            "questions_and_answers": [],
+            "detailed_scores": [],
+            "export_info": {"exported_at": row["exported_at"], "system_version": row["system_version"]}
+        }
+        if row["trace_summary"]:
+            data["trace_summary"] = json.loads(row["trace_summary"])
+        for answer in answers:
+            qa_detail = {
+                "question_id": answer["question_id"],
+                "question_category": answer["category"],
+                "question": answer["question"],
+                "question_purpose": answer["purpose"],
+                "question_related_to": answer["related_to"] or "",
+                "answer": answer["answer"],
+                "score": answer["score"],
+                "max_score": 10
+            }
+            if answer["time_to_first_feedback"] is not None:
+                qa_detail["time_to_first_feedback"] = answer["time_to_first_feedback"]
+            if answer["scored_by"] is not None:
+                qa_detail["scored_by"] = answer["scored_by"]
+            if answer["scoring_context"] is not None:
+                qa_detail["scoring_context"] = answer["scoring_context"]
+            if answer["key_points"]:
+                qa_detail["key_points"] = json.loads(answer["key_points"])
+            data["questions_and_answers"].append(qa_detail)
+            data["detailed_scores"].append({
+                "question_id": answer["question_id"],
+                "score": answer["score"],
+                "percentage": round((answer["score"] / 10) * 100, 1)
+            })
+        return data
+
+    def export(self, session_id: int, path: str) -> Path:
+        """Ghi một phiên ra file JSON (định dạng cũ, dễ đọc)"""
+        data = self.get(session_id)
+        if data is None:
+            raise KeyError(f"Không có phiên {session_id}")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+    @staticmethod
+    def _filters(candidate: Optional[str] = None, position: Optional[str] = None, since: Optional[str] = None,
+                 until: Optional[str] = None, min_score: Optional[float] = None,
+                 max_score: Optional[float] = None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if candidate:
+            # Mã thí sinh (candidate_hash) hoặc tên
+            clauses.append("(s.candidate = ? OR s.candidate_name = ?)")
+            params += [candidate, candidate]
+        if position:
+            clauses.append("s.position = ?")
+            params.append(position)
+        if since:
+            clauses.append("s.exported_at >= ?")
+            params.append(since)
+        if until:
+            # Ngày không kèm giờ: tính hết ngày đó
+            clauses.append("s.exported_at <= ?")
+            params.append(until if len(until) > 10 else until + " 23:59:59")
+        if min_score is not None:
+            clauses.append("s.average_score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("s.average_score <= ?")
+            params.append(max_score)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: Optional[int] = None, **filters) -> List[Dict[str, Any]]:
+        """Tóm tắt các phiên khớp bộ lọc (candidate, position, since, until, min_score, max_score), mới nhất trước"""
+        where, params = self._filters(**filters)
+        sql = f"SELECT {', '.join('s.' + c for c in _SESSION_COLUMNS)} FROM sessions s{where} ORDER BY s.exported_at DESC, s.id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def query_answers(self, **filters) -> List[Dict[str, Any]]:
+        """Từng câu trả lời (kèm id phiên, vị trí, ngày) của các phiên khớp bộ lọc, cho phân tích hàng loạt"""
+        where, params = self._filters(**filters)
+        sql = (f"SELECT a.session_id, s.position, s.exported_at, {', '.join('a.' + c for c in _ANSWER_COLUMNS)} "
+               f"FROM answers a JOIN sessions s ON s.id = a.session_id{where} "
+               f"ORDER BY a.session_id, a.position_in_session")
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def answer_columns(self, columns: Tuple[str, ...] = ("session_id", "position", "category", "question", "score"),
+                       **filters) -> Dict[str, tuple]:
+        """Các câu trả lời dạng cột {tên cột: tuple giá trị}, nhanh hơn query_answers với hàng trăm nghìn dòng"""
+        allowed = {"session_id": "a.session_id", "position": "s.position", "exported_at": "s.exported_at",
+                   **{c: "a." + c for c in _ANSWER_COLUMNS}}
+        where, params = self._filters(**filters)
+        sql = (f"SELECT {', '.join(allowed[c] for c in columns)} FROM answers a "
+               f"JOIN sessions s ON s.id = a.session_id{where} ORDER BY a.session_id, a.position_in_session")
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            cursor.row_factory = None
+            rows = cursor.fetchall()
+        values = tuple(zip(*rows)) if rows else tuple(() for _ in columns)
+        return dict(zip(columns, values))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+@functools.lru_cache(maxsize=None)
+def open_store(path: str = DEFAULT_DB) -> ResultsStore:
+    """Một kết nối dùng chung cho mỗi file trong tiến trình"""
+    return ResultsStore(path)
+
+
+def legacy_files(results_dir: str = "interview_results", legacy_file: str = "interview_results.json") -> List[Path]:
+    """Các file JSON kết quả cũ: interview_results/*.json và interview_results.json"""
+    files = sorted(Path(results_dir).glob("*.json")) if Path(results_dir).is_dir() else []
+    if legacy_file and Path(legacy_file).is_file():
+        files.append(Path(legacy_file))
+    return files
+
+
+def migrate(store: ResultsStore, files: List[Path]) -> Tuple[int, int, int]:
+    """Nhập các file JSON cũ vào kho, trả về (mới, đã có, lỗi); chạy lại nhiều lần không nhập trùng"""
+    items, failed = [], 0
+    for path in files:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if "questions_and_answers" not in data:
+                raise ValueError("không phải file kết quả phỏng vấn")
+            items.append((data, str(path)))
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Bỏ qua {path}: {e}")
+            failed += 1
+    added, skipped = store.add_many(items)
+    return added, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kho kết quả phỏng vấn (SQLite)")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Nhập các file JSON kết quả cũ")
+    migrate_parser.add_argument("--results-dir", default="interview_results")
+    migrate_parser.add_argument("--legacy-file", default="interview_results.json")
+
+    query_parser = commands.add_parser("query", help="Liệt kê các phiên theo bộ lọc")
+    query_parser.add_argument("--candidate", help="Mã thí sinh hoặc tên")
+    query_parser.add_argument("--position")
+    query_parser.add_argument("--since", help="YYYY-MM-DD")
+    query_parser.add_argument("--until", help="YYYY-MM-DD")
+    query_parser.add_argument("--min-score", type=float)
+    query_parser.add_argument("--max-score", type=float)
+    query_parser.add_argument("--limit", type=int, default=50)
+
+    export_parser = commands.add_parser("export", help="Xuất một phiên ra JSON")
+    export_parser.add_argument("session_id", type=int)
+    export_parser.add_argument("--output", help="File JSON (mặc định in ra màn hình)")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.command == "migrate":
+        files = legacy_files(args.results_dir, args.legacy_file)
+        added, skipped, failed = migrate(store, files)
+        print(f"✅ {len(files)} file: {added} phiên mới, {skipped} đã có, {failed} lỗi ({store.count()} phiên trong {args.db})")
+        sys.exit(1 if failed else 0)
+
+    if args.command == "query":
+        rows = store.query(candidate=args.candidate, position=args.position, since=args.since, until=args.until,
+                           min_score=args.min_score, max_score=args.max_score, limit=args.limit)
+        for row in rows:
+            print(f"#{row['id']:<6} {row['exported_at'] or '':19}  {row['average_score'] or 0:5.2f}  "
+                  f"{row['candidate_name'] or row['candidate']} | {row['position'] or '-'} | {row['interview_status']}")
+        print(f"📊 {len(rows)} phiên")
+        return
+
+    if args.output:
+        print(f"💾 {store.export(args.session_id, args.output)}")
+    else:
+        data = store.get(args.session_id)
+        if data is None:
+            print(f"❌ Không có phiên {args.session_id}")
+            sys.exit(1)
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
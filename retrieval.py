@@ -0,0 +1,21 @@
+from typing import List, Tuple, Any
+
+import numpy as np
+
+
+def search_with_ids(db, query: str, k: int = 5) -> List[Tuple[str, Any, float]]:
+    """Tìm kiếm trên FAISS store, trả về (docstore id, Document, score) để truy vết chunk đã dùng"""
+    vector = np.array([db._embed_query(query)], dtype=np.float32)
+    if getattr(db, "_normalize_L2", False):
+        import faiss
+        faiss.normalize_L2(vector)
+
+    scores, indices = db.index.search(vector, k)
+    results = []
+    for score, i in zip(scores[0], indices[0]):
+        if i == -1:
+            # FAISS trả về -1 khi index có ít hơn k vector
+            continue
+        doc_id = db.index_to_docstore_id[i]
+        results.append((doc_id, db.docstore.search(doc_id), float(score)))
+    return results
@@ -0,0 +1,122 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Optional
+
+from pydantic import PrivateAttr
+from langchain.schema import BaseMemory
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+
+from token_utils import estimate_tokens
+
+# Từ tham chiếu đến nội dung trước đó: câu hỏi chứa các từ này cần viết lại theo lịch sử hội thoại
+_FOLLOW_UP_PATTERN = re.compile(
+    r"\b(nó|đó|này|kia|ấy|họ|trên|vừa rồi|vừa nãy|tiếp|tiếp theo|còn|vậy|thế|"
+    r"it|its|that|this|these|those|they|them|above|previous|more)\b",
+    re.IGNORECASE
+)
+
+SUMMARY_PROMPT = """
+Tóm tắt ngắn gọn cuộc hội thoại giữa người dùng và trợ lý AI.
+Giữ lại các chủ đề, thuật ngữ và thông tin quan trọng để hiểu các câu hỏi tiếp theo.
+Tóm tắt tối đa {max_words} từ.
+
+Tóm tắt hiện tại:
+{summary}
+
+Các lượt hội thoại mới cần gộp vào tóm tắt:
+{new_lines}
+
+Tóm tắt mới:
+"""
+
+
+def is_self_contained(question: str, min_words: int = 4) -> bool:
+    """Câu hỏi có tự đủ nghĩa (không tham chiếu đến lượt trước) hay không"""
+    words = question.split()
+    if len(words) < min_words:
+        return False
+    return _FOLLOW_UP_PATTERN.search(question) is None
+
+
+class RollingSummaryMemory(BaseMemory):
+    """Memory có giới hạn token: cửa sổ trượt các lượt gần nhất + bản tóm tắt cập nhật dần ở luồng nền"""
+
+    llm: Any
+    memory_key: str = "chat_history"
+    input_key: str = "question"
+    output_key: str = "answer"
+    max_token_limit: int = 800
+    max_summary_tokens: int = 300
+    skip_condense: bool = True
+    summary: str = ""
+    buffer: List[BaseMessage] = []
+
+    _buffer_tokens: List[int] = PrivateAttr(default_factory=list)
+    _executor: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    _pending: Optional[Future] = PrivateAttr(default=None)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        question = str(inputs.get(self.input_key, ""))
+        # Lịch sử rỗng => chain bỏ qua lời gọi LLM viết lại câu hỏi (condense question)
+        if self.skip_condense and (not (self.buffer or self.summary) or is_self_contained(question)):
+            return {self.memory_key: []}
+
+        messages: List[BaseMessage] = []
+        if self.summary:
+            messages.append(SystemMessage(content=f"Tóm tắt hội thoại trước: {self.summary}"))
+        messages.extend(self.buffer)
+        return {self.memory_key: messages}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        for message in (HumanMessage(content=str(inputs.get(self.input_key, ""))),
+                        AIMessage(content=str(outputs.get(self.output_key, "")))):
+            self.buffer.append(message)
+            self._buffer_tokens.append(estimate_tokens(message.content))
+
+        # Đẩy các lượt cũ nhất ra khỏi cửa sổ cho đến khi dưới giới hạn token
+        evicted: List[BaseMessage] = []
+        while len(self.buffer) > 2 and sum(self._buffer_tokens) > self.max_token_limit:
+            evicted.append(self.buffer.pop(0))
+            self._buffer_tokens.pop(0)
+        if evicted:
+            self._schedule_summary(evicted)
+
+    def _schedule_summary(self, evicted: List[BaseMessage]):
+        """Gộp các lượt bị đẩy ra vào bản tóm tắt ở luồng nền (không làm chậm lượt hiện tại)"""
+        if self._executor is None:
+            # 1 thread để các lần cập nhật tóm tắt chạy tuần tự đúng thứ tự
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+        self._pending = self._executor.submit(self._update_summary, evicted)
+
+    def _update_summary(self, evicted: List[BaseMessage]):
+        new_lines = "\n".join(
+            f"{'Người dùng' if m.type == 'human' else 'Trợ lý'}: {m.content}" for m in evicted
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.max_summary_tokens * 0.75),
+            summary=self.summary or "(chưa có)",
+            new_lines=new_lines
+        )
+        try:
+            summary = str(self.llm.invoke(prompt)).strip()
+        except Exception as e:
+            print(f"⚠️ Lỗi khi tóm tắt hội thoại: {e}")
+            return
+        # Chặn độ dài tóm tắt phòng khi LLM trả về dài hơn yêu cầu
+        max_chars = int(self.max_summary_tokens * 3)
+        self.summary = summary[:max_chars]
+
+    def wait_for_summary(self, timeout: Optional[float] = None):
+        """Chờ lần cập nhật tóm tắt đang chạy (dùng khi cần trạng thái đầy đủ, vd: lưu phiên)"""
+        if self._pending is not None:
+            self._pending.result(timeout)
+
+    def clear(self) -> None:
+        self.wait_for_summary()
+        self.summary = ""
+        self.buffer = []
+        self._buffer_tokens = []
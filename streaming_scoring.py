@@ -0,0 +1,195 @@
+import re
+import json
+import time
+import threading
+from typing import Callable, Dict, Any, Optional
+
+# Một trường số chỉ được coi là hoàn chỉnh khi đã có ký tự kết thúc phía sau
+_NUMBER_FIELD = r'"{name}"\s*:\s*(-?\d+(?:\.\d+)?)\s*[,}}\n]'
+_FEEDBACK_START = re.compile(r'"feedback"\s*:\s*"')
+
+
+def score_from_fields(score_data: Dict[str, Any]) -> Optional[float]:
+    """Tính điểm từ các trường JSON: ưu tiên 'total', nếu không hợp lệ thì lấy trung bình các tiêu chí"""
+    try:
+        total_score = float(score_data.get('total', 0))
+    except (TypeError, ValueError):
+        total_score = -1
+
+    # Đảm bảo điểm số trong khoảng hợp lệ (0-10)
+    if 0 <= total_score <= 10:
+        return total_score
+
+    # Nếu điểm không hợp lệ, tính trung bình từ các tiêu chí
+    criteria_scores = [score_data.get(f'criteria_{i}', 0) for i in range(1, 6)]
+    valid_scores = [float(s) for s in criteria_scores if isinstance(s, (int, float)) and 0 <= s <= 10]
+    if valid_scores:
+        return sum(valid_scores) / len(valid_scores)
+    return None
+
+
+def _decodable_prefix(raw: str) -> str:
+    """Cắt phần chuỗi JSON còn dở (escape chưa đủ ký tự) ở cuối để có thể decode an toàn"""
+    i = 0
+    end = 0
+    while i < len(raw):
+        ch = raw[i]
+        if ch == '\\':
+            step = 6 if raw[i + 1:i + 2] == 'u' else 2
+            if i + step > len(raw):
+                break
+            i += step
+        elif ch == '"':
+            break
+        else:
+            i += 1
+        end = i
+    return raw[:end]
+
+
+class ScoreStream:
+    """Chấm điểm dạng streaming: lấy điểm ngay khi các trường số hoàn chỉnh, nhận xét tiếp tục chạy nền"""
+
+    def __init__(self, llm, prompt: str, default_score: float = 5.0):
+        self.llm = llm
+        self.prompt = prompt
+        self.default_score = default_score
+
+        self.text = ""
+        self.score: Optional[float] = None
+        self.feedback = ""
+        self.error: Optional[Exception] = None
+
+        # Mốc thời gian (giây, tính từ lúc gửi yêu cầu); phản hồi đầu tiên là điểm hoặc nhận xét
+        self.started_at = time.perf_counter()
+        self.time_to_first_token: Optional[float] = None
+        self.time_to_score: Optional[float] = None
+        self.time_to_first_feedback: Optional[float] = None
+        self.total_time: Optional[float] = None
+
+        self._on_feedback: Optional[Callable[[str], None]] = None
+        self._emitted = 0
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._score_ready = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _elapsed(self) -> float:
+        return round(time.perf_counter() - self.started_at, 3)
+
+    def _run(self):
+        try:
+            for chunk in self.llm.stream(self.prompt):
+                if not chunk:
+                    continue
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = self._elapsed()
+                self.text += chunk
+                if self.score is None:
+                    self._try_parse_score()
+                self._update_feedback()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._finish()
+
+    def _try_parse_score(self):
+        fields = {}
+        for name in ['criteria_1', 'criteria_2', 'criteria_3', 'criteria_4', 'criteria_5', 'total']:
+            match = re.search(_NUMBER_FIELD.format(name=name), self.text)
+            if match:
+                fields[name] = float(match.group(1))
+        # Chờ đủ 'total'; nếu total ngoài khoảng 0-10 thì các tiêu chí đã có sẵn phía trước
+        if 'total' in fields:
+            self.score = score_from_fields(fields)
+            if self.score is not None:
+                self.time_to_score = self._elapsed()
+                if self.time_to_first_feedback is None:
+                    self.time_to_first_feedback = self.time_to_score
+                self._score_ready.set()
+
+    def _update_feedback(self):
+        match = _FEEDBACK_START.search(self.text)
+        if not match:
+            return
+        decoded = self._decode(_decodable_prefix(self.text[match.end():]))
+        if decoded is None or len(decoded) <= len(self.feedback):
+            return
+        if self.time_to_first_feedback is None:
+            self.time_to_first_feedback = self._elapsed()
+        self.feedback = decoded
+        self._emit()
+
+    @staticmethod
+    def _decode(raw: str) -> Optional[str]:
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return None
+
+    def _emit(self):
+        # Luồng stream và luồng gọi follow_feedback đều phát: giữ _emit_lock cả lúc gọi callback
+        # để các đoạn nhận xét đến đúng thứ tự và không lặp
+        with self._emit_lock:
+            with self._lock:
+                callback = self._on_feedback
+                if callback is None:
+                    return
+                delta = self.feedback[self._emitted:]
+                self._emitted = len(self.feedback)
+            if delta:
+                callback(delta)
+
+    def _finish(self):
+        self.total_time = self._elapsed()
+        if self.score is None:
+            # Stream kết thúc mà chưa bắt được điểm: parse toàn bộ phản hồi như chế độ thường
+            match = re.search(r'\{.*\}', self.text, re.DOTALL)
+            if match:
+                try:
+                    score_data = json.loads(match.group())
+                    self.score = score_from_fields(score_data)
+                    self.feedback = score_data.get('feedback', self.feedback) or self.feedback
+                except json.JSONDecodeError:
+                    pass
+            if self.score is not None:
+                self.time_to_score = self.total_time
+                self.time_to_first_feedback = self.time_to_first_feedback or self.total_time
+        self._score_ready.set()
+        self._done.set()
+        self._emit()
+
+    def wait_score(self, timeout: Optional[float] = None) -> float:
+        """Chờ đến khi parse được điểm (không cần chờ phần nhận xét)"""
+        self._score_ready.wait(timeout)
+        if self.scored_by == "default":
+            reason = self.error or "không đọc được điểm từ phản hồi"
+            print(f"⚠️ Không chấm được bằng LLM ({reason}), dùng điểm mặc định")
+        return self.score if self.score is not None else self.default_score
+
+    @property
+    def scored_by(self) -> str:
+        """"default" nếu không có điểm từ LLM (lỗi hoặc phản hồi không parse được, wait_score trả default_score),
+        ngược lại "llm" như InterviewSystem._score_answer"""
+        return "default" if self.score is None else "llm"
+
+    def follow_feedback(self, callback: Callable[[str], None]):
+        """Đăng ký callback nhận từng đoạn nhận xét (kể cả phần đã nhận trước đó)"""
+        with self._lock:
+            self._on_feedback = callback
+        self._emit()
+
+    def wait_done(self, timeout: Optional[float] = None) -> bool:
+        """Chờ stream hoàn tất"""
+        return self._done.wait(timeout)
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """Các mốc thời gian của lần chấm điểm"""
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "time_to_score": self.time_to_score,
+            "time_to_first_feedback": self.time_to_first_feedback,
+            "total_time": self.total_time
+        }
@@ -0,0 +1,12 @@
+import math
+
+# Ước lượng số token không cần gọi API đếm token của Gemini.
+# Tiếng Việt có dấu trung bình khoảng 3 ký tự/token với tokenizer của Gemini.
+CHARS_PER_TOKEN = 3.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng nhanh số token của một đoạn text"""
+    if not text:
+        return 0
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
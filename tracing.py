@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextvars import ContextVar
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from token_utils import estimate_tokens
+
+# Tracing nhẹ cho pipeline phỏng vấn: mỗi bước (truy vấn, gọi LLM, parse, export) là một span
+# có thời lượng, số token prompt/phản hồi, cache hit và số lần retry.
+# Span được xuất ra JSONL hoặc file OTLP/JSON (mở được bằng các công cụ OpenTelemetry).
+
+# Các thuộc tính số được cộng dồn trong bản tóm tắt theo tên span
+_SUMMED_ATTRIBUTES = ("prompt_tokens", "response_tokens", "cached_tokens", "retries", "hedges", "documents")
+
+# Các span đang mở (tracer, span) theo context chứ không theo thread: thread chạy qua
+# contextvars.copy_context().run (vd: ResilientLLM) vẫn thấy span của nơi gọi
+_OPEN_SPANS: ContextVar[tuple] = ContextVar("tracing_open_spans", default=())
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+class Span:
+    """Một bước được đo: thời gian bắt đầu/kết thúc (ns) và các thuộc tính"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    @property
+    def key(self) -> str:
+        """Tên dùng để gom nhóm trong bản tóm tắt (vd: 'llm.invoke:score')"""
+        operation = self.attributes.get("operation")
+        return f"{self.name}:{operation}" if operation else self.name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class Tracer:
+    """Thu thập span của một phiên (hoặc một tiến trình); bản tóm tắt được cộng dồn khi span kết thúc"""
+
+    def __init__(self, service: str = "interview", max_spans: int = 10000):
+        self.service = service
+        self.trace_id = _new_id(16)
+        # Giới hạn số span giữ lại để server chạy lâu không tăng bộ nhớ; tóm tắt vẫn tính đủ
+        self.spans: "deque[Span]" = deque(maxlen=max_spans)
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def current_span(self) -> Optional[Span]:
+        for tracer, span in reversed(_OPEN_SPANS.get()):
+            if tracer is self:
+                return span
+        return None
+
+    def start_span(self, name: str, **attributes) -> Span:
+        """Tạo span mới (con của span hiện tại trong context này); phải gọi end_span để ghi lại"""
+        parent = self.current_span()
+        return Span(name, self.trace_id, parent.span_id if parent else None, attributes)
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        with self._lock:
+            self.spans.append(span)
+            stats = self._stats.setdefault(span.key, {"count": 0, "errors": 0, "total_ms": 0.0,
+                                                      "max_ms": 0.0, "cache_hits": 0})
+            stats["count"] += 1
+            stats["errors"] += span.status != "ok"
+            stats["total_ms"] += span.duration_ms
+            stats["max_ms"] = max(stats["max_ms"], span.duration_ms)
+            stats["cache_hits"] += bool(span.attributes.get("cache_hit"))
+            for attribute in _SUMMED_ATTRIBUTES:
+                if isinstance(span.attributes.get(attribute), (int, float)):
+                    stats[attribute] = stats.get(attribute, 0) + span.attributes[attribute]
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """with tracer.span("retriever", operation="technical") as span: ..."""
+        span = self.start_span(name, **attributes)
+        _OPEN_SPANS.set(_OPEN_SPANS.get() + ((self, span),))
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _OPEN_SPANS.set(tuple(item for item in _OPEN_SPANS.get() if item[1] is not span))
+            self.end_span(span)
+
+    def record(self, name: str, duration_s: float, **attributes) -> Span:
+        """Ghi lại một bước đã đo ở nơi khác (vd: luồng streaming chạy nền)"""
+        span = self.start_span(name, **attributes)
+        span.start_ns -= int(duration_s * 1e9)
+        self.end_span(span)
+        return span
+
+    def callback_handler(self) -> "TracingCallbackHandler":
+        return TracingCallbackHandler(self)
+
+    def summary(self) -> Dict[str, Any]:
+        """Tóm tắt theo tên span: số lần, tổng/TB/max thời gian, token, cache hit, retry"""
+        with self._lock:
+            steps = {}
+            for key, stats in sorted(self._stats.items()):
+                step = {k: (round(v, 3) if isinstance(v, float) else v) for k, v in stats.items()}
+                step["mean_ms"] = round(stats["total_ms"] / stats["count"], 3)
+                steps[key] = step
+        return {
+            "trace_id": self.trace_id,
+            "steps": steps,
+            "llm_calls": sum(s["count"] for k, s in steps.items() if k.startswith("llm.")),
+            "llm_ms": round(sum(s["total_ms"] for k, s in steps.items() if k.startswith("llm.")), 3),
+            "retrieval_ms": round(sum(s["total_ms"] for k, s in steps.items() if k.startswith("retriever")), 3),
+            "prompt_tokens": sum(s.get("prompt_tokens", 0) for s in steps.values()),
+            # Token đầu vào Gemini đọc từ cache tiền tố (phần tĩnh của prompts.py)
+            "cached_tokens": sum(s.get("cached_tokens", 0) for s in steps.values()),
+            "response_tokens": sum(s.get("response_tokens", 0) for s in steps.values())
+        }
+
+    def export_jsonl(self, path: str) -> Path:
+        """Ghi nối các span vào file JSONL (mỗi dòng 1 span)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps({"service": self.service, **span.to_dict()}, ensure_ascii=False) + "\n")
+        return path
+
+    def export_otel(self, path: str) -> Path:
+        """Ghi các span theo định dạng OTLP/JSON (resourceSpans) của OpenTelemetry"""
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        with self._lock:
+            spans = list(self.spans)
+        otel_spans = []
+        for span in spans:
+            item = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [attribute(k, v) for k, v in span.attributes.items()],
+                "status": {"code": 1 if span.status == "ok" else 2}
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            otel_spans.append(item)
+
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", self.service)]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otel_spans}]
+        }]}
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        return path
+
+    def export(self, path: str) -> Path:
+        """Xuất span: đuôi .jsonl => JSONL, còn lại => OTLP/JSON"""
+        if str(path).endswith(".jsonl"):
+            return self.export_jsonl(path)
+        return self.export_otel(path)
+
+
+def active_span() -> Optional[Span]:
+    """Span trong cùng nhất đang mở ở context hiện tại (của bất kỳ tracer nào)"""
+    spans = _OPEN_SPANS.get()
+    return spans[-1][1] if spans else None
+
+
+def _usage_from_result(response) -> Dict[str, int]:
+    """Lấy số token thật từ usage_metadata của Gemini (nếu có)"""
+    for generations in getattr(response, "generations", []) or []:
+        for generation in generations:
+            usage = (generation.generation_info or {}).get("usage_metadata")
+            if usage:
+                return {
+                    "prompt_tokens": int(usage.get("prompt_token_count", 0)),
+                    "response_tokens": int(usage.get("candidates_token_count", 0)),
+                    "cached_tokens": int(usage.get("cached_content_token_count", 0))
+                }
+    return {}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Callback LangChain: ghi span cho LLM và retriever, đếm retry, lấy token thật từ Gemini"""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._runs: Dict[UUID, tuple] = {}
+
+    def _attach(self, run_id: UUID, name: str, **attributes) -> Span:
+        # Nếu code đã mở span cùng loại (vd: InterviewSystem._invoke_llm) thì ghi vào span đó
+        current = self.tracer.current_span()
+        if current is not None and current.name == name and not any(s is current for s, _ in self._runs.values()):
+            self._runs[run_id] = (current, False)
+            return current
+        span = self.tracer.start_span(name, **attributes)
+        self._runs[run_id] = (span, True)
+        return span
+
+    def _finish(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        span, owned = self._runs.pop(run_id, (None, False))
+        if span is None:
+            return None
+        if error is not None:
+            # Span của nơi gọi: lần gọi lỗi có thể được retry thành công, trạng thái do nơi gọi quyết định
+            if owned:
+                span.status = "error"
+            span.set("error", f"{type(error).__name__}: {error}")
+        if owned:
+            self.tracer.end_span(span)
+        return span
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs):
+        model = (serialized or {}).get("kwargs", {}).get("model", "")
+        span = self._attach(run_id, "llm.invoke", model=model)
+        span.attributes.setdefault("prompt_tokens", sum(estimate_tokens(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        span = self._runs.get(run_id, (None,))[0]
+        if span is not None:
+            usage = _usage_from_result(response)
+            if usage:
+                span.attributes.update(usage)
+                span.set("token_source", "usage_metadata")
+                span.set("cache_hit", usage["cached_tokens"] > 0)
+            else:
+                text = "".join(g.text for gens in response.generations for g in gens)
+                span.attributes.setdefault("response_tokens", estimate_tokens(text))
+        self._finish(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error)
+
+    def on_retry(self, retry_state, *, run_id: UUID, **kwargs):
+        span = self._runs.get(run_id, (None,))[0]
+        if span is not None:
+            span.add("retries")
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs):
+        self._attach(run_id, "retriever", query_tokens=estimate_tokens(query))
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs):
+        span = self._runs.get(run_id, (None,))[0]
+        if span is not None:
+            span.set("documents", len(documents))
+        self._finish(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error)
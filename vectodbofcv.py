@@ -1,24 +1,28 @@
 import os
+import argparse
 from pathlib import Path
 from typing import List
 
 from PIL import Image
 import pytesseract
-import nltk
 import fitz  # PyMuPDF for PDF processing
 
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitter import NLTKTextSplitter
-from langchain.schema import Document
+from nltk_resources import ensure_punkt
+from ocr_preprocess import OCRPreprocessor, format_report
 
 
-def extract_text_from_images(image_paths: List[Path]) -> str:
+def extract_text_from_images(image_paths: List[Path], preprocess: bool = False, regions: bool = False) -> str:
+    """OCR các ảnh; preprocess=True: chỉnh nghiêng, thu nhỏ, nhị phân hóa (ocr_preprocess.py), regions=True: OCR theo vùng chữ"""
+    preprocessor = OCRPreprocessor(regions=regions) if preprocess or regions else None
     parts = []
     for p in image_paths:
         try:
-            img = Image.open(p).convert("RGB")
-            txt = pytesseract.image_to_string(img)
+            if preprocessor is not None:
+                txt, report = preprocessor.ocr_file(p)
+                print(f"🖼️ {format_report(report)}")
+            else:
+                img = Image.open(p).convert("RGB")
+                txt = pytesseract.image_to_string(img)
             parts.append(f"\n\n--- {p.name} ---\n\n" + txt)
         except Exception as e:
             print(f"Warning: could not OCR {p}: {e}")
@@ -71,13 +75,19 @@ def main(
     cv_dir: str = "CV",
     save_path: str = "vector_db_cv2",
     model_name: str = "intfloat/multilingual-e5-large-instruct",
+    preprocess: bool = False,
+    force: bool = False,
+    regions: bool = False,
 ):
-    # Ensure NLTK tokenizer available
-    nltk.download("punkt", quiet=True)
-    try:
-        nltk.download("punkt_tab", quiet=True)
-    except Exception:
-        pass
+    # Heavy imports (torch, transformers, langchain) only when actually building the index
+    from langchain_community.vectorstores import FAISS
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain.schema import Document
+    from chunking import ParallelNLTKTextSplitter
+    from index_health import finalize_build
+
+    # Ensure NLTK tokenizer available (local data only, no network)
+    ensure_punkt()
 
     cv_folder = Path(cv_dir)
     if not cv_folder.exists():
@@ -96,7 +106,7 @@ def main(
     
     if images:
         print(f"🔍 Running OCR on {len(images)} images...")
-        image_text = extract_text_from_images(images)
+        image_text = extract_text_from_images(images, preprocess, regions)
         if image_text.strip():
             full_text_parts.append(image_text)
     
@@ -120,7 +130,7 @@ def main(
     print(f"Extracted text saved to {txt_file}")
 
     # Split text into chunks
-    splitter = NLTKTextSplitter(chunk_size=1200, chunk_overlap=200, separator="\n\n")
+    splitter = ParallelNLTKTextSplitter(chunk_size=1200, chunk_overlap=200, separator="\n\n")
     chunks = splitter.split_text(full_text)
     docs = [Document(page_content=c) for c in chunks]
     print(f"Split into {len(docs)} chunks")
@@ -137,11 +147,16 @@ def main(
     metadatas = [{"source": f"cv_chunk_{i+1}"} for i in range(len(docs))]
     vectorstore = FAISS.from_texts(texts, embeddings, metadatas=metadatas)
 
-    # Save
-    save_dir = Path(save_path)
-    save_dir.mkdir(parents=True, exist_ok=True)
-    vectorstore.save_local(str(save_dir))
-    print(f"Saved FAISS vector DB to {save_dir.resolve()}")
+    # Save: kiểm tra index mới (số chiều, chuẩn hóa, độ trễ, recall) so với lần build trước rồi mới thay thế
+    finalize_build(vectorstore, save_path, embeddings, {
+        "model": model_name,
+        "normalize": True,
+        "chunk_size": 1200,
+        "chunk_overlap": 200,
+        "sources": [p.name for p in images + pdfs],
+        "chunks": len(docs)
+    }, force=force)
+    print(f"Saved FAISS vector DB to {Path(save_path).resolve()}")
 
 
 if __name__ == "__main__":
@@ -150,4 +165,14 @@ if __name__ == "__main__":
     if tcmd:
         pytesseract.pytesseract.tesseract_cmd = tcmd
 
-    main()
+    parser = argparse.ArgumentParser(description="Build the CV vector database from images and PDFs")
+    parser.add_argument("--cv-dir", default="CV")
+    parser.add_argument("--output", default="vector_db_cv2")
+    parser.add_argument("--model", default="intfloat/multilingual-e5-large-instruct")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Tiền xử lý ảnh trước OCR (so trước bằng: python ocr_preprocess.py CV/*.png --compare)")
+    parser.add_argument("--ocr-regions", action="store_true", help="OCR từng vùng chữ (kèm tiền xử lý)")
+    parser.add_argument("--force", action="store_true", help="Thay index cũ kể cả khi kiểm tra sức khỏe thất bại")
+    args = parser.parse_args()
+
+    main(args.cv_dir, args.output, args.model, args.preprocess, args.force, args.ocr_regions)
@@ -1,87 +1,90 @@
 import os
-from dotenv import load_dotenv
-import nltk
+import argparse
 
-# ======================
-# 1. Chuẩn bị NLTK
-# ======================
-nltk.download("punkt")
-try:
-    nltk.download("punkt_tab")  # cần cho NLTK >=3.8.1
-except:
-    pass
+from nltk_resources import ensure_punkt
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import NLTKTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
 
-from langchain.schema import Document
+def main():
+    parser = argparse.ArgumentParser(description="Tạo knowledge vector database từ file PDF")
+    parser.add_argument("--pdf", default="marketing.pdf", help="File PDF nguồn")
+    parser.add_argument("--output", default="vector_db2chunk_nltk", help="Thư mục lưu FAISS index")
+    parser.add_argument("--chunk-size", type=int, default=1600)
+    parser.add_argument("--chunk-overlap", type=int, default=400)
+    parser.add_argument("--model", default="intfloat/multilingual-e5-large-instruct")
+    parser.add_argument("--force", action="store_true", help="Thay index cũ kể cả khi kiểm tra sức khỏe thất bại")
+    args = parser.parse_args()
 
-# Load PDF
-loader = PyPDFLoader("marketing.pdf")
-pages = loader.load()
+    # Thư viện nặng (torch, transformers, langchain) chỉ import khi thật sự build index
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_community.vectorstores import FAISS
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain.schema import Document
+    from chunking import ParallelNLTKTextSplitter
+    from index_health import finalize_build
 
-# Gộp toàn bộ text thành 1 Document duy nhất
-full_text = "\n".join([p.page_content for p in pages])
-full_doc = [Document(page_content=full_text)]
+    # ======================
+    # 1. Chuẩn bị NLTK (dữ liệu Punkt có sẵn ở máy, không tải qua mạng)
+    # ======================
+    ensure_punkt()
 
-# ======================
-# 3. Chia nhỏ văn bản bằng NLTK
-# ======================
-text_splitter= NLTKTextSplitter(
-    chunk_size=1600,       # độ dài tối đa mỗi chunk (số ký tự)
-    chunk_overlap=400,     # số ký tự overlap giữa 2 chunk
-    separator="\n\n"       # ký tự tách đoạn (mặc định theo NLTK sentence tokenizer)
-)
-splitted_docs = []
+    # Load PDF
+    loader = PyPDFLoader(args.pdf)
+    pages = loader.load()
 
-for doc in full_doc:
-    chunks = text_splitter.split_text(doc.page_content)
-    for chunk in chunks:
-        splitted_docs.append(
-            {
-                "page_content": chunk,
-                "metadata": doc.metadata,  # giữ metadata (trang số, v.v.)
-            }
-        )
+    # Gộp toàn bộ text thành 1 Document duy nhất
+    full_text = "\n".join([p.page_content for p in pages])
+    full_doc = [Document(page_content=full_text)]
 
-print(f"✂️ Sau khi chia chunk: {len(splitted_docs)} đoạn")
+    # ======================
+    # 3. Chia nhỏ văn bản bằng NLTK
+    # ======================
+    text_splitter= ParallelNLTKTextSplitter(
+        chunk_size=args.chunk_size,        # độ dài tối đa mỗi chunk (số ký tự)
+        chunk_overlap=args.chunk_overlap,  # số ký tự overlap giữa 2 chunk
+        separator="\n\n"       # ký tự tách đoạn (mặc định theo NLTK sentence tokenizer)
+    )
+    splitted_docs = []
 
-# ======================
-# 4. Khởi tạo Embeddings
-# ======================
-device = "cuda" if os.environ.get("USE_GPU", "1") == "1" else "cpu"
-embeddings = HuggingFaceEmbeddings(
-    model_name="intfloat/multilingual-e5-large-instruct",
-    model_kwargs={"device": "cpu"},
-    encode_kwargs={"normalize_embeddings": True},
-)
+    for doc in full_doc:
+        chunks = text_splitter.split_text(doc.page_content)
+        for chunk in chunks:
+            splitted_docs.append(
+                {
+                    "page_content": chunk,
+                    "metadata": doc.metadata,  # giữ metadata (trang số, v.v.)
+                }
+            )
 
-# ======================
-# 5. Tạo vector store từ text
-# ======================
-vectorstore = FAISS.from_texts(
-    [d["page_content"] for d in splitted_docs],
-    embeddings,
-    metadatas=[d["metadata"] for d in splitted_docs],
-)
+    print(f"✂️ Sau khi chia chunk: {len(splitted_docs)} đoạn")
 
-# Save to disk (create folder if not exists)
-save_path = "vector_db2chunk_nltk"
-os.makedirs(save_path, exist_ok=True)
-vectorstore.save_local(save_path)
+    # ======================
+    # 4. Khởi tạo Embeddings
+    # ======================
+    embeddings = HuggingFaceEmbeddings(
+        model_name=args.model,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True},
+    )
 
+    # ======================
+    # 5. Tạo vector store từ text
+    # ======================
+    vectorstore = FAISS.from_texts(
+        [d["page_content"] for d in splitted_docs],
+        embeddings,
+        metadatas=[d["metadata"] for d in splitted_docs],
+    )
 
+    # Save to disk: kiểm tra index mới so với lần build trước (index_health.py), hồi quy thì giữ index cũ
+    finalize_build(vectorstore, args.output, embeddings, {
+        "model": args.model,
+        "normalize": True,
+        "chunk_size": args.chunk_size,
+        "chunk_overlap": args.chunk_overlap,
+        "sources": [os.path.basename(args.pdf)],
+        "chunks": len(splitted_docs)
+    }, force=args.force)
 
-# # ======================
-# # 6. Truy vấn thử
-# # ======================
-# query = "Đặt tên trong java"
-# retriever = vectorstore.as_retriever()
-# results = retriever.get_relevant_documents(query)
-#
-# print("🔍 Kết quả truy vấn:")
-# for i, d in enumerate(results, 1):
-#     print(f"\n--- Kết quả {i} (Trang {d.metadata.get('page', 'N/A')}) ---")
-#     print(d.page_content)
+
+if __name__ == "__main__":
+    main()
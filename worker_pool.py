@@ -0,0 +1,136 @@
+import gc
+import os
+import multiprocessing
+from typing import List, Dict, Any, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+# Tài nguyên chỉ đọc được load 1 lần ở tiến trình cha trước khi fork.
+# Sau khi fork, các worker dùng chung bộ nhớ của model và FAISS index theo cơ chế copy-on-write:
+# buffer vector của FAISS và tensor trọng số của model nằm ngoài heap Python nên không bị
+# refcount chạm vào và không bị sao chép.
+_SHARED: Dict[str, Any] = {}
+
+
+def _init_worker(threads_per_worker: int):
+    """Giới hạn số thread của mỗi worker để N worker dùng đúng N core"""
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    try:
+        import faiss
+        faiss.omp_set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+
+def _embed_documents(texts: List[str]) -> List[List[float]]:
+    return _SHARED["embeddings"].embed_documents(texts)
+
+
+def _embed_query(text: str) -> List[float]:
+    return _SHARED["embeddings"].embed_query(text)
+
+
+def _search(store: str, query: str, k: int) -> List[Tuple[str, Dict[str, Any], float]]:
+    db = _SHARED["stores"][store]
+    results = db.similarity_search_with_score(query, k=k)
+    # Chỉ trả về dữ liệu thuần để pickle nhẹ khi gửi về tiến trình cha
+    return [(doc.page_content, doc.metadata, float(score)) for doc, score in results]
+
+
+class PoolRetriever:
+    """Retriever chuyển việc embed + search sang worker pool (cùng interface get_relevant_documents)"""
+
+    def __init__(self, pool: "SharedIndexPool", store: str, k: int = 3):
+        self.pool = pool
+        self.store = store
+        self.k = k
+
+    def get_relevant_documents(self, query: str, *args, **kwargs):
+        return self.pool.search(self.store, query, self.k)
+
+    invoke = get_relevant_documents
+
+    def similarity_search_with_score(self, query: str, k: int = 3):
+        """[(Document, khoảng cách)] như FAISS.similarity_search_with_score (dùng cho federated_retriever)"""
+        from langchain.schema import Document
+        return [(Document(page_content=text, metadata=metadata), score)
+                for text, metadata, score in self.pool.search_with_scores(self.store, query, k)]
+
+
+class PoolEmbeddings(Embeddings):
+    """Embedding chạy trong worker pool; dùng thay model ở tiến trình cha (chấm sơ bộ, lọc trùng, FAISS store)"""
+
+    def __init__(self, pool: "SharedIndexPool"):
+        self.pool = pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.pool.embed_documents(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.pool.embed_query(text)
+
+
+class SharedIndexPool:
+    """Pool tiến trình pre-fork dùng chung embedding model và FAISS index chỉ đọc với tiến trình cha"""
+
+    def __init__(self, embeddings, stores: Dict[str, Any], workers: Optional[int] = None,
+                 threads_per_worker: int = 1):
+        """
+        Phải được tạo trước khi tiến trình cha chạy inference hoặc mở thread pool
+        (fork sau khi OpenMP/thread đã chạy có thể gây treo worker).
+        """
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("SharedIndexPool cần start method 'fork' (Linux/macOS)")
+
+        _SHARED["embeddings"] = embeddings
+        _SHARED["stores"] = stores
+        self.workers = workers or os.cpu_count() or 1
+
+        # Đưa toàn bộ object hiện có vào vùng permanent để GC không ghi vào trang nhớ dùng chung
+        gc.collect()
+        gc.freeze()
+        ctx = multiprocessing.get_context("fork")
+        self._pool = ctx.Pool(self.workers, initializer=_init_worker, initargs=(threads_per_worker,))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._pool.apply(_embed_query, (text,))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._pool.apply(_embed_documents, (texts,))
+
+    def search_with_scores(self, store: str, query: str, k: int = 3) -> List[Tuple[str, Dict[str, Any], float]]:
+        return self._pool.apply(_search, (store, query, k))
+
+    def search(self, store: str, query: str, k: int = 3):
+        """Tìm kiếm trong worker, trả về danh sách Document như retriever của LangChain"""
+        from langchain.schema import Document
+        return [Document(page_content=text, metadata=metadata)
+                for text, metadata, _ in self.search_with_scores(store, query, k)]
+
+    def as_retriever(self, store: str, k: int = 3) -> PoolRetriever:
+        return PoolRetriever(self, store, k)
+
+    def as_embeddings(self) -> PoolEmbeddings:
+        return PoolEmbeddings(self)
+
+    def attach(self, resources, k: int = 3):
+        """Chuyển mọi lệnh embed/search của InterviewResources sang worker: retriever, resources.embeddings
+        và embedding_function của các FAISS store ở tiến trình cha (truy vấn kèm id chunk, shard kiến thức)"""
+        resources.cv_retriever = self.as_retriever("cv", k=k)
+        resources.knowledge_retriever = self.as_retriever("knowledge", k=k)
+        resources.embeddings = self.as_embeddings()
+        stores = [resources.cv_db, resources.knowledge_db, *getattr(resources, "knowledge_shards", {}).values()]
+        for db in stores:
+            if db is not None and hasattr(db, "embedding_function"):
+                # Chỉ đổi ở tiến trình cha: worker đã fork giữ model thật
+                db.embedding_function = resources.embeddings
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        gc.unfreeze()